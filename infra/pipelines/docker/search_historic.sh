@@ -4,10 +4,16 @@ set -ex
 DOMINO_JOB_NAME=${JOB_NAME:-historic_pfas_1}
 DOMINO_SEARCH=${SEARCH:-"pfas"}
 DOMINO_FETCH_PROFILES=${FETCH_PROFILES:-"false"}
+DOMINO_PROFILE_TTL_DAYS=${PROFILE_TTL_DAYS:-7}
+DOMINO_PROFILE_WORKERS=${PROFILE_WORKERS:-4}
 DOMINO_START_DATE=${START_DATE:-2022-01-01 00:00:00}
 DOMINO_STRIDE_SEC=${STRIDE_SEC:-30}
 DOMINO_HISTORIC_STRIDE_SEC=${HISTORIC_STRIDE_SEC:-86400}
 DOMINO_TWINT_STRIDE_SEC=${TWINT_STRIDE_SEC:-28800}
+DOMINO_TWINT_CONCURRENCY=${TWINT_CONCURRENCY:-1}
+DOMINO_TWINT_PER_PROXY=${TWINT_PER_PROXY:-}
+DOMINO_TWINT_ADAPTIVE_STRIDE=${TWINT_ADAPTIVE_STRIDE:-false}
+DOMINO_TWINT_WINDOW_TWEETS=${TWINT_WINDOW_TWEETS:-10000}
 DOMINO_WRITE_FORMAT=${WRITE_FORMAT:-parquet}
 DOMINO_S3_FILEPATH=${S3_FILEPATH:-dt-phase1}
 DOMINO_COMPRESSION=${COMPRESSION:-snappy}
@@ -20,10 +26,16 @@ JOB_FILE="search_historic.py" \
     DOMINO_JOB_NAME=$DOMINO_JOB_NAME \
     DOMINO_SEARCH=$DOMINO_SEARCH \
     DOMINO_FETCH_PROFILES=$DOMINO_FETCH_PROFILES \
+    DOMINO_PROFILE_TTL_DAYS=$DOMINO_PROFILE_TTL_DAYS \
+    DOMINO_PROFILE_WORKERS=$DOMINO_PROFILE_WORKERS \
     DOMINO_START_DATE=$DOMINO_START_DATE \
     DOMINO_STRIDE_SEC=$DOMINO_STRIDE_SEC \
     DOMINO_HISTORIC_STRIDE_SEC=$DOMINO_HISTORIC_STRIDE_SEC \
     DOMINO_TWINT_STRIDE_SEC=$TWINT_STRIDE_SEC \
+    DOMINO_TWINT_CONCURRENCY=$DOMINO_TWINT_CONCURRENCY \
+    DOMINO_TWINT_PER_PROXY=$DOMINO_TWINT_PER_PROXY \
+    DOMINO_TWINT_ADAPTIVE_STRIDE=$DOMINO_TWINT_ADAPTIVE_STRIDE \
+    DOMINO_TWINT_WINDOW_TWEETS=$DOMINO_TWINT_WINDOW_TWEETS \
     DOMINO_WRITE_FORMAT=$DOMINO_WRITE_FORMAT \
     DOMINO_S3_FILEPATH=$DOMINO_S3_FILEPATH \
     DOMINO_COMPRESSION=$DOMINO_COMPRESSION \
@@ -4,6 +4,8 @@ set -ex
 DOMINO_JOB_NAME=${JOB_NAME:-historic_pfas_1}
 DOMINO_USERNAMES=${USERNAMES:-"a,b,c"}
 DOMINO_FETCH_PROFILES=${FETCH_PROFILES:-"false"}
+DOMINO_PROFILE_TTL_DAYS=${PROFILE_TTL_DAYS:-7}
+DOMINO_PROFILE_WORKERS=${PROFILE_WORKERS:-4}
 DOMINO_STRIDE_SEC=${STRIDE_SEC:-30}
 DOMINO_WRITE_FORMAT=${WRITE_FORMAT:-parquet}
 DOMINO_S3_FILEPATH=${S3_FILEPATH:-dt-phase1}
@@ -19,6 +21,8 @@ JOB_FILE="search_timelines.py" \
     DOMINO_JOB_NAME=$DOMINO_JOB_NAME \
     DOMINO_USERNAMES=$DOMINO_USERNAMES \
     DOMINO_FETCH_PROFILES=$DOMINO_FETCH_PROFILES \
+    DOMINO_PROFILE_TTL_DAYS=$DOMINO_PROFILE_TTL_DAYS \
+    DOMINO_PROFILE_WORKERS=$DOMINO_PROFILE_WORKERS \
     DOMINO_STRIDE_SEC=$DOMINO_STRIDE_SEC \
     DOMINO_WRITE_FORMAT=$DOMINO_WRITE_FORMAT \
     DOMINO_S3_FILEPATH=$DOMINO_S3_FILEPATH \
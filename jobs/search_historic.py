@@ -10,6 +10,7 @@ logger.setLevel(logging.INFO) #DEBUG, INFO, WARNING, ERROR, CRITICAL
 
 import json, os, pandas as pd, pendulum
 from ProjectDomino.Neo4jDataAccess import Neo4jDataAccess
+from ProjectDomino.CheckpointStore import CheckpointStore
 from ProjectDomino.FirehoseJob import FirehoseJob
 from ProjectDomino.TwintPool import TwintPool
 from prefect.environments.storage import S3
@@ -40,12 +41,18 @@ def str_to_bool (x: str):
 stride_sec = int(os.environ['DOMINO_STRIDE_SEC']) if env_non_empty('DOMINO_STRIDE_SEC') else 30
 historic_stride_sec = int(os.environ['DOMINO_HISTORIC_STRIDE_SEC']) if env_non_empty('DOMINO_HISTORIC_STRIDE_SEC') else 60 * 60 * 24
 twint_stride_sec = int(os.environ['DOMINO_TWINT_STRIDE_SEC']) if env_non_empty('DOMINO_TWINT_STRIDE_SEC') else round(historic_stride_sec/2)
+twint_concurrency = int(os.environ['DOMINO_TWINT_CONCURRENCY']) if env_non_empty('DOMINO_TWINT_CONCURRENCY') else 1
+twint_per_proxy = int(os.environ['DOMINO_TWINT_PER_PROXY']) if env_non_empty('DOMINO_TWINT_PER_PROXY') else None
+twint_adaptive_stride = str_to_bool(os.environ['DOMINO_TWINT_ADAPTIVE_STRIDE']) if env_non_empty('DOMINO_TWINT_ADAPTIVE_STRIDE') else False
+twint_window_tweets = int(os.environ['DOMINO_TWINT_WINDOW_TWEETS']) if env_non_empty('DOMINO_TWINT_WINDOW_TWEETS') else 10000
 delay_sec = int(os.environ['DOMINO_DELAY_SEC']) if env_non_empty('DOMINO_DELAY_SEC') else 60
 job_name = os.environ['DOMINO_JOB_NAME'] if env_non_empty('DOMINO_JOB_NAME') else "covid"
 start_date = pendulum.parse(os.environ['DOMINO_START_DATE']) if env_non_empty('DOMINO_START_DATE') else datetime.datetime.now() - datetime.timedelta(days=365)
 search = os.environ['DOMINO_SEARCH'] if env_non_empty('DOMINO_SEARCH') else "covid OR corona OR virus OR pandemic"
 write_format = os.environ['DOMINO_WRITE_FORMAT'] if env_non_empty('DOMINO_WRITE_FORMAT') else None
 fetch_profiles = str_to_bool(os.environ['DOMINO_FETCH_PROFILES']) if env_non_empty('DOMINO_FETCH_PROFILES') else False
+profile_ttl_days = float(os.environ['DOMINO_PROFILE_TTL_DAYS']) if env_non_empty('DOMINO_PROFILE_TTL_DAYS') else 7
+profile_workers = int(os.environ['DOMINO_PROFILE_WORKERS']) if env_non_empty('DOMINO_PROFILE_WORKERS') else 4
 
 if write_format == 'parquet_s3':
     s3_filepath = os.environ['DOMINO_S3_FILEPATH'] if env_non_empty('DOMINO_S3_FILEPATH') else None
@@ -58,14 +65,15 @@ os.makedirs(f'{output_path}/tweets', exist_ok=True)
 os.makedirs(f'{output_path}/profiles', exist_ok=True)
 
 
-# FIXME unsafe when distributed
-task_num = -1
+# Shared by every worker on this host: tasks claim the next unfinished historic window,
+# and finished twint windows are skipped on restart
+checkpoint_path = f'{output_path}/checkpoints.sqlite'
+checkpoints = CheckpointStore(checkpoint_path)
 
 @task(log_stdout=True, skip_on_upstream_skip=True, max_retries=3, retry_delay=timedelta(seconds=30))
 def run_stream():
 
-    global task_num
-    task_num = task_num + 1
+    task_num = checkpoints.claim_task(job_name)
 
     start = start_date + timedelta(seconds=task_num * historic_stride_sec)
     current = start + timedelta(seconds=historic_stride_sec)
@@ -80,11 +88,14 @@ def run_stream():
     #2020-10-05 17:00:30-2020-10-05 17:01:00
     # 2020-10-06 22:10:00 to 2020-10-06 22:10:30:
     tp = TwintPool(is_tor=True)
-    fh = FirehoseJob(
+    with FirehoseJob(
         PARQUET_SAMPLE_RATE_TIME_S=30,
         save_to_neo=False,
         tp=tp,
         writers={},
+        checkpoint_path=checkpoint_path,
+        profile_ttl_days=profile_ttl_days,
+        profile_workers=profile_workers,
         write_to_disk=write_format,
         write_opts=(
             {
@@ -98,22 +109,28 @@ def run_stream():
             if write_format == 'parquet_s3' else
             {}
         )
-    )
+    ) as fh:
     
-    try:
-        for df in fh.search_time_range(
-            Search=search,
-            Since=datetime.strftime(start, "%Y-%m-%d %H:%M:%S"),
-            Until=datetime.strftime(current, "%Y-%m-%d %H:%M:%S"),
-            job_name=job_name,
-            Limit=10000000,
-            stride_sec=twint_stride_sec,
-            fetch_profiles = fetch_profiles
-        ):
-            print('got: %s', df.shape if df is not None else 'None')
-    except Exception as e:
-        logger.error("job exception", exc_info=True)
-        raise e
+        try:
+            for df in fh.search_time_range(
+                Search=search,
+                Since=datetime.strftime(start, "%Y-%m-%d %H:%M:%S"),
+                Until=datetime.strftime(current, "%Y-%m-%d %H:%M:%S"),
+                job_name=job_name,
+                Limit=10000000,
+                stride_sec=twint_stride_sec,
+                concurrency=twint_concurrency,
+                per_proxy=twint_per_proxy,
+                adaptive_stride=twint_adaptive_stride,
+                window_tweets=twint_window_tweets,
+                fetch_profiles = fetch_profiles
+            ):
+                print('got: %s', df.shape if df is not None else 'None')
+        except Exception as e:
+            logger.error("job exception", exc_info=True)
+            checkpoints.release_task(job_name, task_num)
+            raise e
+    checkpoints.complete_task(job_name, task_num)
     print("task finished")
 
 
@@ -125,6 +142,7 @@ logger.info(f'Schedule options: {schedule_opts}')
 logger.info(f'Task settings: stride_sec={stride_sec}, \
         historic_stride_sec={historic_stride_sec}, \
         twint_stride_sec={twint_stride_sec} \
+        twint_concurrency={twint_concurrency} \
         start_date={start_date}, \
         search={search}')
 
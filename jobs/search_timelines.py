@@ -41,6 +41,8 @@ stride_sec = int(os.environ['DOMINO_STRIDE_SEC']) if env_non_empty('DOMINO_STRID
 job_name = os.environ['DOMINO_JOB_NAME'] if env_non_empty('DOMINO_JOB_NAME') else "covid"
 write_format = os.environ['DOMINO_WRITE_FORMAT'] if env_non_empty('DOMINO_WRITE_FORMAT') else None
 fetch_profiles = str_to_bool(os.environ['DOMINO_FETCH_PROFILES']) if env_non_empty('DOMINO_FETCH_PROFILES') else False
+profile_ttl_days = float(os.environ['DOMINO_PROFILE_TTL_DAYS']) if env_non_empty('DOMINO_PROFILE_TTL_DAYS') else 7
+profile_workers = int(os.environ['DOMINO_PROFILE_WORKERS']) if env_non_empty('DOMINO_PROFILE_WORKERS') else 4
 usernames_raw = os.environ['DOMINO_USERNAMES'] if env_non_empty('DOMINO_USERNAMES') else None
 if usernames_raw is None:
     raise ValueError('DOMINO_USERNAMES is not set, expected comma-delimited str')
@@ -82,11 +84,14 @@ def run_stream():
     try:
 
         tp = TwintPool(is_tor=True)
-        fh = FirehoseJob(
+        with FirehoseJob(
             PARQUET_SAMPLE_RATE_TIME_S=30,
             save_to_neo=False,
             tp=tp,
             writers={},
+            checkpoint_path=f'{output_path}/checkpoints.sqlite',
+            profile_ttl_days=profile_ttl_days,
+            profile_workers=profile_workers,
             write_to_disk=write_format,
             write_opts=(
                 {
@@ -100,18 +105,18 @@ def run_stream():
                 if write_format == 'parquet_s3' else
                 {}
             )
-        )
+        ) as fh:
         
-        try:
-            for df in fh.get_timelines(
-                usernames=[username],
-                job_name=job_name,
-                fetch_profiles = fetch_profiles
-            ):
-                print('got: %s', df.shape if df is not None else 'None')
-        except Exception as e:
-            logger.error("job exception", exc_info=True)
-            raise e
+            try:
+                for df in fh.get_timelines(
+                    usernames=[username],
+                    job_name=job_name,
+                    fetch_profiles = fetch_profiles
+                ):
+                    print('got: %s', df.shape if df is not None else 'None')
+            except Exception as e:
+                logger.error("job exception", exc_info=True)
+                raise e
     except:
         logger.error("task exception, reinserting user", exc_info=True)
         usernames_queue.insert(0, username)
@@ -0,0 +1,90 @@
+import logging
+logger = logging.getLogger('AdaptiveStride')
+
+WEEK_S = 7 * 24 * 60 * 60
+
+
+# Sizes time-range search windows from what earlier windows returned, vs. a budget of tweets per window:
+# the smaller of limit (twint's Limit per search, which truncates it, None for no cap) and window_tweets
+# (a window holding more is split even when twint would return it whole, e.g. under a huge Limit)
+#   a window with fill * budget or more tweets is too big or may have been truncated: search its halves
+#   instead, and continue at half the stride
+#   widen_after sparse windows in a row (under sparse * budget tweets each): aim for target * budget tweets
+#   at the density seen over that run, growing at least 2x and at most 8x
+#   other windows: aim for target * budget tweets at the density just seen, growing at most 2x at a time
+# density (tweets / s over everything searched) picks the first stride of the next run the same way,
+# e.g. from CheckpointStore.get_density
+class AdaptiveStride:
+
+    def __init__(self, limit, stride_sec=600, density=None, window_tweets=None, min_stride_sec=1,
+                 max_stride_sec=WEEK_S, fill=0.9, target=0.6, sparse=0.1, widen_after=3):
+        budgets = [n for n in [limit, window_tweets] if not (n is None)]
+        if len(budgets) == 0:
+            raise ValueError('AdaptiveStride needs a limit or window_tweets to size windows against')
+        self.search_limit = limit
+        self.limit = min(budgets)
+        self.min_stride_sec = min_stride_sec
+        self.max_stride_sec = max_stride_sec
+        self.fill = fill
+        self.target = target
+        self.sparse = sparse
+        self.widen_after = widen_after
+        self.tweets = 0
+        self.seconds = 0.0
+        self.windows = 0
+        self.splits = 0
+        self.sparse_run = 0
+        self.sparse_tweets = 0
+        self.sparse_seconds = 0.0
+        if not (density is None) and density > 0:
+            stride_sec = self.limit * target / density
+        self.stride_sec = self.__clamp(stride_sec)
+        logger.debug('first stride %ss (density %s)', self.stride_sec, density)
+
+    def __clamp(self, stride_sec):
+        return max(self.min_stride_sec, min(self.max_stride_sec, int(stride_sec)))
+
+    @property
+    def density(self):
+        return self.tweets / self.seconds if self.seconds > 0 else None
+
+    # Whether a window of window_sec seconds returning count tweets should be searched again as two halves
+    def should_split(self, count, window_sec, half=False):
+        if count >= self.fill * self.limit and window_sec >= 2 * self.min_stride_sec:
+            self.splits += 1
+            if not half:
+                self.stride_sec = self.__clamp(window_sec / 2)
+            return True
+        return False
+
+    # Record a finished window, adjusting the stride of windows to come
+    # Halves of split windows only count toward density: they lag behind the windows being planned,
+    # so only windows from the plan itself resize it
+    def observe(self, count, window_sec, half=False):
+        self.tweets += count
+        self.seconds += window_sec
+        self.windows += 1
+        if half:
+            return
+        if count < self.sparse * self.limit:
+            self.sparse_run += 1
+            self.sparse_tweets += count
+            self.sparse_seconds += window_sec
+            if self.sparse_run >= self.widen_after:
+                wanted = self.limit * self.target * self.sparse_seconds / max(self.sparse_tweets, 1)
+                self.stride_sec = self.__clamp(min(self.stride_sec * 8, max(self.stride_sec * 2, wanted)))
+                self.__reset_sparse()
+        else:
+            self.__reset_sparse()
+            self.stride_sec = self.__clamp(min(self.stride_sec * 2, self.limit * self.target * window_sec / count))
+
+    def __reset_sparse(self):
+        self.sparse_run = 0
+        self.sparse_tweets = 0
+        self.sparse_seconds = 0.0
+
+    def stats(self):
+        return {
+            'budget': self.limit, 'windows': self.windows, 'splits': self.splits, 'tweets': self.tweets,
+            'density': self.density, 'stride_sec': self.stride_sec
+        }
@@ -0,0 +1,71 @@
+import queue, threading
+
+import logging
+logger = logging.getLogger('BackgroundWriter')
+
+_STOP = object()
+
+
+# Runs each sink on its own thread, fed by a bounded queue
+#   sinks: {name: fn(table, job_name)}
+# submit() blocks while a sink's queue is full, so a slow sink throttles the producer.
+# Sink failures are kept and re-raised by the next check() / drain()
+class BackgroundWriter:
+
+    def __init__(self, sinks, queue_size=4):
+        self.sinks = sinks
+        self.__errors = []
+        self.__errors_lock = threading.Lock()
+        self.__queues = {}
+        self.__threads = {}
+        for name, sink in sinks.items():
+            q = queue.Queue(maxsize=queue_size)
+            t = threading.Thread(target=self.__run, args=(name, sink, q), name='sink_%s' % name, daemon=True)
+            self.__queues[name] = q
+            self.__threads[name] = t
+            t.start()
+
+    def __run(self, name, sink, q):
+        while True:
+            item = q.get()
+            try:
+                if item is _STOP:
+                    return
+                table, job_name = item
+                sink(table, job_name)
+            except Exception as e:
+                logger.error('Sink %s failed', name, exc_info=True)
+                with self.__errors_lock:
+                    self.__errors.append(e)
+            finally:
+                q.task_done()
+
+    def submit(self, table, job_name):
+        self.check()
+        for name, q in self.__queues.items():
+            q.put((table, job_name))
+
+    # Raise the first sink failure since the last check, if any
+    def check(self):
+        with self.__errors_lock:
+            errors = self.__errors
+            self.__errors = []
+        if len(errors) > 0:
+            if len(errors) > 1:
+                logger.error('%s more sink failures suppressed', len(errors) - 1)
+            raise errors[0]
+
+    # Block until every submitted table went through every sink
+    def drain(self):
+        for q in self.__queues.values():
+            q.join()
+        self.check()
+
+    def close(self):
+        try:
+            self.drain()
+        finally:
+            for name, q in self.__queues.items():
+                q.put(_STOP)
+            for t in self.__threads.values():
+                t.join()
@@ -0,0 +1,60 @@
+import pyarrow as pa
+
+import logging
+logger = logging.getLogger('BatchBuffer')
+
+
+# Accumulates arrow record batches between flushes
+# Appends are O(1): chunks are only combined once, when drained
+class BatchBuffer:
+
+    def __init__(self, schema=None):
+        self.schema = schema
+        self.batches = []
+        self.num_rows = 0
+        self.nbytes = 0
+
+    def __len__(self):
+        return self.num_rows
+
+    def append(self, table):
+        batches = table.to_batches() if isinstance(table, pa.Table) else [table]
+        for batch in batches:
+            if self.schema is None:
+                self.schema = batch.schema
+            elif not batch.schema.equals(self.schema):
+                logger.error('=========================')
+                logger.error('Error buffering arrow batch, likely new batch mismatches old')
+                for i in range(0, len(self.schema)):
+                    if i >= len(batch.schema):
+                        logger.error('new batch does not have enough columns to handle %i' % i)
+                    elif not self.schema[i].equals(batch.schema[i]):
+                        logger.error(('ith col mismatch', i, 'old', self.schema[i], 'vs new', batch.schema[i]))
+                raise ValueError('Schema mismatch appending batch to buffer')
+            if batch.num_rows == 0:
+                continue
+            self.batches.append(batch)
+            self.num_rows += batch.num_rows
+            self.nbytes += self.__batch_size(batch)
+
+    # RecordBatch.nbytes dedups shared buffers and is slow on small batches,
+    # so prefer the raw buffer total when this pyarrow has it
+    def __batch_size(self, batch):
+        if hasattr(batch, 'get_total_buffer_size'):
+            return batch.get_total_buffer_size()
+        return batch.nbytes
+
+    # Zero-copy view over the buffered chunks
+    def to_table(self):
+        return pa.Table.from_batches(self.batches, schema=self.schema)
+
+    # Buffered rows as one contiguous table, leaving the buffer empty
+    def drain(self):
+        table = self.to_table().combine_chunks()
+        self.clear()
+        return table
+
+    def clear(self):
+        self.batches = []
+        self.num_rows = 0
+        self.nbytes = 0
@@ -0,0 +1,166 @@
+from contextlib import closing, contextmanager
+from datetime import datetime
+import os, sqlite3, time
+
+import logging
+logger = logging.getLogger('CheckpointStore')
+
+
+# Records how far ingest jobs got, so restarts and retries skip finished work
+#   windows:  completed (job_name, t0, t1) search windows
+#   offsets:  last fully flushed byte offset / line of an id file
+#   users:    usernames whose timelines finished
+#   tasks:    scheduler task numbers claimed by concurrent/retried runs
+#   densities: tweets per second seen for a search query, to size the first window of the next run
+# Every call is its own SQLite transaction, so a checkpoint is either fully recorded or absent.
+# Connections are opened per call: safe across threads and forked workers on one host.
+class CheckpointStore:
+
+    def __init__(self, path, timeout_s=60):
+        self.path = path
+        self.timeout_s = timeout_s
+        folder = os.path.dirname(path)
+        if folder != '':
+            os.makedirs(folder, exist_ok=True)
+        with self.__transaction() as conn:
+            for statement in [
+                """CREATE TABLE IF NOT EXISTS windows (
+                    job_name TEXT, t0 TEXT, t1 TEXT, num_rows INTEGER, completed_at REAL,
+                    PRIMARY KEY (job_name, t0, t1))""",
+                """CREATE TABLE IF NOT EXISTS offsets (
+                    job_name TEXT, path TEXT, byte_offset INTEGER, line INTEGER, updated_at REAL,
+                    PRIMARY KEY (job_name, path))""",
+                """CREATE TABLE IF NOT EXISTS users (
+                    job_name TEXT, username TEXT, completed_at REAL,
+                    PRIMARY KEY (job_name, username))""",
+                """CREATE TABLE IF NOT EXISTS tasks (
+                    job_name TEXT, task_num INTEGER, status TEXT, updated_at REAL,
+                    PRIMARY KEY (job_name, task_num))""",
+                """CREATE TABLE IF NOT EXISTS densities (
+                    job_name TEXT, query TEXT, tweets_per_s REAL, updated_at REAL,
+                    PRIMARY KEY (job_name, query))"""
+            ]:
+                conn.execute(statement)
+
+    @contextmanager
+    def __transaction(self):
+        with closing(sqlite3.connect(self.path, timeout=self.timeout_s, isolation_level=None)) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+
+    ### Search windows
+
+    def window_done(self, job_name, t0, t1):
+        with self.__transaction() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM windows WHERE job_name=? AND t0=? AND t1=?',
+                (job_name, str(t0), str(t1))).fetchone()
+        return not (row is None)
+
+    def complete_window(self, job_name, t0, t1, num_rows=None):
+        with self.__transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?)',
+                (job_name, str(t0), str(t1), num_rows, time.time()))
+
+    def completed_windows(self, job_name):
+        with self.__transaction() as conn:
+            return conn.execute(
+                'SELECT t0, t1, num_rows FROM windows WHERE job_name=? ORDER BY t0', (job_name, )).fetchall()
+
+    # Completed windows merged into disjoint [t0, t1) ranges in time order, so a window split into halves
+    # counts as done only once both are, whatever windows the next run plans
+    def completed_ranges(self, job_name):
+        ranges = []
+        for t0, t1, num_rows in self.completed_windows(job_name):
+            if len(ranges) > 0 and t0 <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], t1)
+            else:
+                ranges.append([t0, t1])
+        return [(t0, t1) for t0, t1 in ranges]
+
+    # Tweets per second over completed windows, or None
+    def completed_density(self, job_name):
+        tweets, seconds = 0, 0.0
+        for t0, t1, num_rows in self.completed_windows(job_name):
+            tweets += num_rows or 0
+            seconds += (datetime.fromisoformat(t1) - datetime.fromisoformat(t0)).total_seconds()
+        return tweets / seconds if seconds > 0 and tweets > 0 else None
+
+    ### Id files
+
+    # (byte offset, line) to resume from, or (0, 0) when new
+    def get_offset(self, job_name, path):
+        with self.__transaction() as conn:
+            row = conn.execute(
+                'SELECT byte_offset, line FROM offsets WHERE job_name=? AND path=?', (job_name, path)).fetchone()
+        return (0, 0) if row is None else (row[0], row[1])
+
+    def save_offset(self, job_name, path, offset, line=None):
+        with self.__transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO offsets VALUES (?, ?, ?, ?, ?)',
+                (job_name, path, offset, line, time.time()))
+
+    ### Timelines
+
+    def user_done(self, job_name, username):
+        with self.__transaction() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM users WHERE job_name=? AND username=?', (job_name, username)).fetchone()
+        return not (row is None)
+
+    def complete_user(self, job_name, username):
+        with self.__transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO users VALUES (?, ?, ?)', (job_name, username, time.time()))
+
+    ### Scheduled tasks
+
+    # Lowest task number that is neither done nor held by a live claim, marked running
+    # Claims older than lease_s are assumed dead and handed out again
+    def claim_task(self, job_name, lease_s=60 * 60):
+        now = time.time()
+        with self.__transaction() as conn:
+            row = conn.execute(
+                """SELECT MIN(task_num) FROM tasks WHERE job_name=? AND status != 'done'
+                   AND (status != 'running' OR updated_at < ?)""",
+                (job_name, now - lease_s)).fetchone()
+            task_num = row[0]
+            if task_num is None:
+                row = conn.execute('SELECT MAX(task_num) FROM tasks WHERE job_name=?', (job_name, )).fetchone()
+                task_num = 0 if row[0] is None else row[0] + 1
+            conn.execute(
+                'INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)', (job_name, task_num, 'running', now))
+        logger.debug('claimed task %s of %s', task_num, job_name)
+        return task_num
+
+    def complete_task(self, job_name, task_num):
+        self.__set_task(job_name, task_num, 'done')
+
+    # Lets the next claim retry this task right away
+    def release_task(self, job_name, task_num):
+        self.__set_task(job_name, task_num, 'failed')
+
+    def __set_task(self, job_name, task_num, status):
+        with self.__transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)', (job_name, task_num, status, time.time()))
+
+    ### Search densities
+
+    def get_density(self, job_name, query):
+        with self.__transaction() as conn:
+            row = conn.execute(
+                'SELECT tweets_per_s FROM densities WHERE job_name=? AND query=?', (job_name, query)).fetchone()
+        return None if row is None else row[0]
+
+    def save_density(self, job_name, query, tweets_per_s):
+        with self.__transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO densities VALUES (?, ?, ?, ?)', (job_name, query, tweets_per_s, time.time()))
@@ -1,11 +1,27 @@
-import ast
+import ast, json
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime
 import time
 
+from . import Timestamps
+from .StatusType import parquet_status_types
+
 import logging
 logger = logging.getLogger('DfHelper')
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except:
+    logger.debug('Warning: no orjson, using json')
+    json_loads = json.loads
+
+# How empty nested columns come out of the writers: json, legacy str() repr, or pandas nan
+NULL_STRINGS = frozenset(['null', 'None', 'nan', ''])
+
 
 class DfHelper:
     def __init__(self):
@@ -30,12 +46,22 @@ class DfHelper:
             .pipe(self.__flatten_entities)
         return pdf
 
+    # normalize_parquet_dataframe over a stream of pa.RecordBatch / pa.Table, one at most max_rows
+    # slice at a time, so memory stays bounded by the batch size rather than the input size
+    def normalize_parquet_batches(self, batches, max_rows=None):
+        for batch in batches:
+            table = batch if isinstance(batch, pa.Table) else pa.Table.from_batches([batch])
+            for chunk in table.to_batches(max_chunksize=max_rows):
+                if chunk.num_rows > 0:
+                    yield self.normalize_parquet_dataframe(chunk.to_pandas())
+
     def __clean_datetimes(self, pdf):
         logger.debug('cleaning datetimes...')
         try:
-            pdf = pdf.assign(created_at=pd.to_datetime(pdf['created_at']))
-            pdf = pdf.assign(created_date=pdf['created_at'].apply(
-                lambda dt: dt.timestamp()))
+            created_at = Timestamps.created_at_epoch_ms(pdf['created_at'], pdf['status_id'])
+            pdf = pdf.assign(
+                created_at=Timestamps.epoch_ms_to_datetimes(created_at).set_axis(pdf.index),
+                created_date=Timestamps.epoch_ms_to_seconds(created_at))
         except Exception as e:
             logger.error('Error __clean_datetimes', e)
             logger.error(pdf)
@@ -46,110 +72,93 @@ class DfHelper:
     # some reason always False
     # this seems to match full_text[:2] == 'RT'
     def __clean_retweeted(self, pdf):
-        return pdf.assign(retweeted=pdf['retweeted_status'] != 'None')
-
-    def __update_to_type(self, row):
-        if row['is_quote_status']:
-            return 'retweet_quote'
-        if row['retweeted']:
-            return 'retweet'
-        if row['in_reply_to_status_id'] > 0:
-            return 'reply'
-        return 'original'
+        retweeted_status = pdf['retweeted_status']
+        return pdf.assign(retweeted=~(retweeted_status.isna() | retweeted_status.isin(NULL_STRINGS)))
 
     def __tag_status_type(self, pdf):
         # only materialize required fields..
         logger.debug('tagging status...')
         pdf2 = pdf\
-            .assign(status_type=pdf[['is_quote_status', 'retweeted', 'in_reply_to_status_id']].apply(self.__update_to_type, axis=1))
+            .assign(status_type=parquet_status_types(pdf))
         logger.debug('   ...tagged')
         return pdf2
 
-    def __flatten_status_col(self, pdf, col, status_type, prefix):
-        debug_retweets_flattened = None
-        debug_retweets = None
-        try:
-            logger.debug('flattening %s...', col)
-            logger.debug('    %s x %s: %s', len(pdf),
-                         len(pdf.columns), pdf.columns)
-            if len(pdf) == 0:
-                logger.debug(
-                    'Warning: did not add mt case col output addition - pdf')
-                return pdf
-            # retweet_status -> hash -> lookup json for hash -> pull out id/created_at/user_id
-            pdf_hashed = pdf.assign(hashed=pdf[col].apply(hash))
-            retweets = pdf_hashed[pdf_hashed['status_type'] == status_type][['hashed', col]]\
-                .drop_duplicates('hashed').reset_index(drop=True)
-            if len(retweets) == 0:
-                logger.debug(
-                    'Warning: did not add mt case col output addition - retweets')
-                return pdf
-            #print('sample', retweets[col].head(10), retweets[col].apply(type))
-            retweets_flattened = pd.io.json.json_normalize(
-                retweets[col].replace("(").replace(")")
-                .apply(self.__try_load))
-            if len(retweets_flattened.columns) == 0:
-                logger.debug('No tweets of type %s, early exit', status_type)
-                return pdf
-            debug_retweets_flattened = retweets_flattened
-            debug_retweets = retweets
-            logger.debug('   ... fixing dates')
-            logger.debug('avail cols of %s x %s: %s', len(retweets_flattened), len(
-                retweets_flattened.columns), retweets_flattened.columns)
-            logger.debug(retweets_flattened)
-            if 'created_at' in retweets_flattened:
-                retweets_flattened = retweets_flattened.assign(
-                    created_at=pd.to_datetime(retweets_flattened['created_at']).apply(lambda dt: dt.timestamp))
-            if 'user.id' in retweets_flattened:
-                retweets_flattened = retweets_flattened.assign(
-                    user_id=retweets_flattened['user.id'])
-            logger.debug('   ... fixing dates')
-            retweets = retweets[['hashed']]\
-                .assign(**{
-                    prefix + c: retweets_flattened[c]
-                    for c in retweets_flattened if c in ['id', 'created_at', 'user_id']
-                })
-            logger.debug('   ... remerging')
-            pdf_with_flat_retweets = pdf_hashed.merge(
-                retweets, on='hashed', how='left').drop(columns='hashed')
-            logger.debug('   ...flattened: %s', pdf_with_flat_retweets.shape)
-            return pdf_with_flat_retweets
-        except Exception as e:
-            logger.error(('Exception __flatten_status_col', e))
-            logger.error(('params', col, status_type, prefix))
-            # print(pdf[:10])
-            logger.error('cols debug_retweets %s x %s : %s',
-                         len(debug_retweets), len(debug_retweets.columns), debug_retweets.columns)
-            logger.error('--------')
-            logger.error(debug_retweets[:3])
-            logger.error('--------')
-            logger.error('cols debug_retweets_flattened %s x %s : %s',
-                         len(debug_retweets_flattened), len(debug_retweets_flattened.columns), debug_retweets_flattened.columns)
-            logger.error('--------')
-            logger.error(debug_retweets_flattened[:3])
-            logger.error('--------')
-            logger.error(debug_retweets_flattened['created_at'])
-            logger.error('--------')
-            raise e
+    # Adds prefix + id / created_at / user_id columns from the embedded status col of status_type rows
+    # Rows are dictionary encoded first, so each distinct embedded status is parsed once,
+    # and only the three fields are pulled out of it
+    def flatten_status_col(self, pdf, col, status_type, prefix):
+        logger.debug('flattening %s...', col)
+        if len(pdf) == 0:
+            logger.debug('Warning: did not add mt case col output addition - pdf')
+            return pdf
+        rows = np.flatnonzero((pdf['status_type'] == status_type).to_numpy())
+        if len(rows) == 0:
+            logger.debug('No tweets of type %s, early exit', status_type)
+            return pdf
+        codes, first = self.dictionary_encode(pdf[col].to_numpy(dtype=object)[rows])
+        logger.debug('    %s rows -> %s distinct statuses', len(rows), len(first))
+        fields = self.extract_status_fields(pdf[col].to_numpy(dtype=object)[rows[first]])
+        row_codes = np.full(len(pdf), -1, dtype=np.int64)
+        row_codes[rows] = codes
+        logger.debug('   ...flattened')
+        return pdf.assign(**{
+            prefix + c: pd.Series(values).infer_objects().reindex(row_codes).set_axis(pdf.index)
+            for c, values in fields.items()
+        })
+
+    # Embedded status values -> (codes, first): values[first[code]] is the distinct status of each row,
+    # code -1 when empty. Strings (json or legacy repr) are keyed by hash(), as the row-wise version
+    # did, and struct dicts by status id; only the int64 keys get factorized
+    def dictionary_encode(self, values):
+        values = np.asarray(values, dtype=object)
+        if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+            values = pd.Series([self.__status_key(v) for v in values], dtype=object).to_numpy()
+        rows = np.flatnonzero(~pd.isna(values))
+        keys = np.fromiter(map(hash, values[rows]), dtype=np.int64, count=len(rows))
+        row_codes, uniques = pd.factorize(keys)
+        first = rows[np.unique(row_codes, return_index=True)[1]]
+        keep = np.array([not (type(v) == str and v in NULL_STRINGS) for v in values[first]], dtype=bool)
+        remap = np.where(keep, np.cumsum(keep) - 1, -1)
+        codes = np.full(len(values), -1, dtype=np.int64)
+        codes[rows] = remap[row_codes]
+        return codes, first[keep]
+
+    def __status_key(self, v):
+        if type(v) == dict:
+            return v.get('id')
+        if type(v) == str:
+            return v
+        return None
+
+    # id, created_at (epoch seconds) and user_id of each status, None / nan when absent
+    def extract_status_fields(self, values):
+        statuses = self.load_json_column(pd.Series(values, dtype=object))
+        users = [s.get('user') for s in statuses]
+        ids = [s.get('id') for s in statuses]
+        created_at = Timestamps.created_at_epoch_ms(pd.Series([s.get('created_at') for s in statuses], dtype=object), ids)
+        return {
+            'id': ids,
+            'created_at': Timestamps.epoch_ms_to_seconds(created_at),
+            'user_id': [u.get('id') if type(u) == dict else None for u in users]
+        }
 
     def __flatten_retweets(self, pdf):
         logger.debug('flattening retweets...')
-        pdf2 = self.__flatten_status_col(
+        pdf2 = self.flatten_status_col(
             pdf, 'retweeted_status', 'retweet', 'retweet_')
         logger.debug('   ...flattened', pdf2.shape)
         return pdf2
 
     def __flatten_quotes(self, pdf):
         logger.debug('flattening quotes...')
-        pdf2 = self.__flatten_status_col(
+        pdf2 = self.flatten_status_col(
             pdf, 'quoted_status', 'retweet_quote', 'quote_')
         logger.debug('   ...flattened', pdf2.shape)
         return pdf2
 
     def __flatten_users(self, pdf):
         logger.debug('flattening users')
-        pdf_user_cols = pd.io.json.json_normalize(
-            pdf['user'].replace("(").replace(")").apply(ast.literal_eval))
+        pdf_user_cols = pd.io.json.json_normalize(self.load_json_column(pdf['user']))
         pdf2 = pdf.assign(**{
             'user_' + c: pdf_user_cols[c]
             for c in pdf_user_cols if c in [
@@ -158,28 +167,73 @@ class DfHelper:
                 'name', 'description'
             ]})
         logger.debug('   ... fixing dates')
-        pdf2 = pdf2.assign(user_created_at=pd.to_datetime(
-            pdf2['user_created_at']).apply(lambda dt: dt.timestamp()))
+        pdf2 = pdf2.assign(user_created_at=Timestamps.epoch_ms_to_seconds(
+            Timestamps.created_at_epoch_ms(pdf2['user_created_at'])))
         logger.debug('   ...flattened')
         return pdf2
 
     def __flatten_entities(self, pdf):
         logger.debug('flattening urls')
-        pdf_entities = pd.io.json.json_normalize(
-            pdf['entities'].replace("(").replace(")").apply(ast.literal_eval))
+        pdf_entities = pd.io.json.json_normalize(self.load_json_column(pdf['entities']))
         pdf['urls'] = pdf_entities['urls']
         pdf['hashtags'] = pdf_entities['hashtags']
         pdf['user_mentions'] = pdf_entities['user_mentions']
         return pdf
 
+    # Nested status/user/entities column -> list of dicts ({} when empty or unparseable)
+    # Values are json, or already dicts when read from arrow structs. The whole column decodes
+    # as one json array; only if that fails, rows go one by one, with ast.literal_eval for
+    # parquet written before these columns were json (python repr strings)
+    def load_json_column(self, series):
+        values = series.tolist()
+        if all([type(v) == str for v in values]):
+            try:
+                out = json_loads('[' + ','.join([
+                    'null' if v in NULL_STRINGS else v
+                    for v in values
+                ]) + ']')
+                if len(out) == len(values):
+                    return [self.__as_dict(v) for v in out]
+            except:
+                logger.debug('Column %s not all json, decoding per row', series.name)
+        return [self.__try_load(v) for v in values]
+
+    def __as_dict(self, out):
+        if type(out) != dict:
+            return {}
+        return {
+            k if type(k) == str else str(k): out[k]
+            for k in out.keys()
+        }
+
+    # arrow struct -> pandas leaves nested lists as numpy arrays
+    def __to_python(self, v):
+        if isinstance(v, np.ndarray):
+            return [self.__to_python(x) for x in v]
+        if type(v) == dict:
+            return {k: self.__to_python(x) for k, x in v.items()}
+        return v
+
     def __try_load(self, s):
+        if type(s) == dict:
+            return self.__as_dict(self.__to_python(s))
+        if type(s) != str or s in NULL_STRINGS:
+            return {}
+        try:
+            return self.__as_dict(json_loads(s))
+        except:
+            pass
         try:
-            out = ast.literal_eval(s)
-            return {
-                k if type(k) == str else str(k): out[k]
-                for k in out.keys()
-            }
+            return self.__as_dict(ast.literal_eval(s))
         except:
-            if s != 0.0:
-                logger.debug('bad s', s)
+            logger.debug('bad s: %s', s)
             return {}
+
+
+# Record batches of parquet files, read batch_size rows at a time: pairs with normalize_parquet_batches
+# for backfills whose memory use does not grow with the number or size of files
+def read_parquet_batches(paths, batch_size=10000, columns=None):
+    for path in ([paths] if isinstance(paths, str) else paths):
+        logger.debug('reading batches of %s', path)
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+            yield batch
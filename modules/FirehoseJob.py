@@ -3,7 +3,8 @@
 from asyncore import write
 from codecs import ignore_errors
 from collections import deque, defaultdict
-import datetime, gc, os, string, sys, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+import datetime, gc, itertools, os, string, sys, time, uuid
 from datetime import date
 from typing import Any, Literal, Optional
 import numpy as np
@@ -16,10 +17,21 @@ import simplejson as json  # nan serialization
 from twarc import Twarc
 from twint.user import SuspendedUser
 
+from .AdaptiveStride import AdaptiveStride
+from .BackgroundWriter import BackgroundWriter
+from .BatchBuffer import BatchBuffer
+from .CheckpointStore import CheckpointStore
+from .HydratedIdCache import HydratedIdCache
+from .IdFileReader import IdFileReader, rechunk_ids
+from . import Snowflake
+from .SnowflakeProber import fixed_plan_blocks
+from .StagePipeline import StagePipeline
 from .Timer import Timer
 from .TwarcPool import TwarcPool
 from .Neo4jDataAccess import Neo4jDataAccess
-from .StatusArrow import KNOWN_FIELDS
+from .ParquetDatasetWriter import ParquetDatasetWriter
+from .ProfileEnricher import ProfileEnricher
+from .StatusArrow import KNOWN_FIELDS, coerce_value, is_nested, known_fields, tweets_to_record_batch
 from .TwintPool import TwintPool
 
 import logging
@@ -161,31 +173,51 @@ class FirehoseJob:
     ###################
 
     MACHINE_IDS = (375, 382, 361, 372, 364, 381, 376, 365, 363, 362, 350, 325, 335, 333, 342, 326, 327, 336, 347, 332)
-    SNOWFLAKE_EPOCH = 1288834974657
+    SNOWFLAKE_EPOCH = Snowflake.SNOWFLAKE_EPOCH
 
     EXPECTED_COLS = EXPECTED_COLS
     KNOWN_FIELDS = KNOWN_FIELDS
     DROP_COLS = DROP_COLS
 
+    WRITER_COMPRESSION = {'snappy': 'SNAPPY', 'vanilla': 'NONE'}
+    MAX_OPEN_FILES = 16
+
     def __init__(self, creds=[], neo4j_creds=None, TWEETS_PER_PROCESS=100, TWEETS_PER_ROWGROUP=5000, save_to_neo=False,
                  PARQUET_SAMPLE_RATE_TIME_S=None, debug=False, BATCH_LEN=100, writers={'snappy': None},
+                 STATUS_BLOCK_LEN=50000, hydrated_ids_path: Optional[str] = None,
+                 checkpoint_path: Optional[str] = None,
+                 CHECKPOINT_BLOCKS: int = 8,
+                 profile_cache_path: Optional[str] = None,
+                 profile_ttl_days: float = 7,
+                 profile_workers: int = 4,
                  tp = None,
                  write_to_disk: Optional[Literal['csv', 'json', 'parquet', 'parquet_s3']] = None,
-                 write_opts: Optional[Any] = None
+                 write_opts: Optional[Any] = None,
+                 engine: Literal['pandas', 'arrow'] = 'pandas',
+                 write_queue_size: Optional[int] = None,
+                 schema_version: Literal[1, 2] = 1
     ):
         self.queue = deque()
-        self.writers = writers
-        self.last_write_epoch = ''
+        self.writers = dict(writers)  # holds this job's open dataset writers
+        self.last_job_name = 'generic_job'
         self.tp = tp
-        self.current_table = None
+        # 1: nested fields as json strings, 2: as arrow structs/lists
+        self.schema_version = schema_version
         self.schema = pa.schema([
             (name, t)
-            for (i, name, t) in KNOWN_FIELDS
+            for (i, name, t) in known_fields(schema_version)
         ])
+        self.buffer = BatchBuffer(self.schema)
         self.timer = Timer()
         self.debug = debug
         self.write_to_disk = write_to_disk
         self.write_opts = write_opts
+        if not (engine in ['pandas', 'arrow']):
+            raise ValueError(f'unknown engine: {engine}')
+        self.engine = engine
+        # None: flush() writes inline; n: flush() hands tables to per-sink writer threads, n deep
+        self.write_queue_size = write_queue_size
+        self.__background_writer = None
 
         self.twarc_pool = TwarcPool([
             Twarc(o['consumer_key'], o['consumer_secret'], o['access_token'], o['access_token_secret'])
@@ -201,49 +233,94 @@ class FirehoseJob:
         self.last_writes_arr = []
 
         self.neo4j_creds = neo4j_creds
-
-        self.BATCH_LEN = BATCH_LEN
+        self.__neo4j = None
+
+        self.BATCH_LEN = BATCH_LEN  # ids per hydration request
+        self.STATUS_BLOCK_LEN = STATUS_BLOCK_LEN  # ids per neo4j hydration status query
+        self.hydration_stats = {'checked': 0, 'skipped': 0, 'missing': 0, 'cached': 0}
+        # local set of ids known hydrated, consulted before neo4j
+        self.hydrated_ids = None if hydrated_ids_path is None else HydratedIdCache(hydrated_ids_path)
+        # finished windows / id file offsets / timelines, so restarts skip them
+        self.checkpoints = None if checkpoint_path is None else CheckpointStore(checkpoint_path)
+        # id file blocks (~16MB of ids each) per checkpoint; each one closes the open part files
+        # and rewrites the job's _metadata, so fewer means fewer, bigger files
+        self.CHECKPOINT_BLOCKS = CHECKPOINT_BLOCKS
+        # fetched twint profiles, kept with the checkpoints unless given a file of their own,
+        # else shared in memory by every job of this process
+        self.profiles = ProfileEnricher(
+            profile_cache_path or checkpoint_path, ttl_days=profile_ttl_days, max_workers=profile_workers)
 
         self.needs_to_flush = False
 
         self.__file_names = []
 
-    def __del__(self):
+    # Drivers are pooled process-wide by Neo4jDriverPool, so one accessor serves every batch
+    def neo4j(self):
+        if self.__neo4j is None:
+            self.__neo4j = Neo4jDataAccess(self.debug, self.neo4j_creds)
+        return self.__neo4j
 
-        logger.debug('__del__')
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
         self.destroy()
+        return False
+
+    def __del__(self):
+        logger.debug('__del__')
+        try:
+            self.destroy()
+        except Exception as e:
+            logger.error('Failed destroy in __del__: %s', e)
+
+    # Flushes pending rows, drains background writes, closes (fsyncs) parquet files,
+    # and persists the hydrated id cache
+    # Safe to call repeatedly; writers reopen lazily if the job keeps processing
+    def destroy(self, job_name=None):
+        if job_name is None:
+            job_name = getattr(self, 'last_job_name', 'generic_job')
 
-    def destroy(self, job_name='generic_job'):
         logger.debug('flush before destroying..')
         self.flush(job_name)
 
-        logger.debug('destroy %s' % self.writers.keys())
+        background_writer = getattr(self, '_FirehoseJob__background_writer', None)
+        if not (background_writer is None):
+            logger.debug('draining background writes..')
+            self.__background_writer = None
+            background_writer.close()
+
+        self.close_writers()
+
+        hydrated_ids = getattr(self, 'hydrated_ids', None)
+        if not (hydrated_ids is None):
+            hydrated_ids.save()
 
-        for k in self.writers.keys():
-            if not (self.writers[k] is None):
+    # Closes (fsyncs) every open parquet part file and updates the job's _metadata;
+    # the next write opens fresh part files
+    def close_writers(self):
+        writers = getattr(self, 'writers', {})
+        for k in writers.keys():
+            if not (writers[k] is None):
                 logger.debug('Closing parquet writer %s' % k)
-                writer = self.writers[k]
+                writer = writers[k]
+                writers[k] = None
                 writer.close()
-                logger.debug('... sleep 1s...')
-                time.sleep(1)
-                self.writers[k] = None
-                logger.debug('... sleep 1s...')
-                time.sleep(1)
                 logger.debug('... Safely closed %s' % k)
             else:
-
                 logger.debug('Nothing to close for writer %s' % k)
 
     ###################
 
+    # Accept a single id or an int64 array
     def get_creation_time(self, id):
-        return ((id >> 22) + 1288834974657)
+        return Snowflake.creation_time_ms(id)
 
     def machine_id(self, id):
-        return (id >> 12) & 0b1111111111
+        return Snowflake.machine_id(id)
 
     def sequence_id(self, id):
-        return id & 0b111111111111
+        return Snowflake.sequence_id(id)
 
     ###################
 
@@ -271,9 +348,17 @@ class FirehoseJob:
                 'in_reply_to_user_id': (lambda series: series.fillna(0).astype('int64')),
                 'scopes': series_to_json_string,
                 'followers': series_to_json_string,
-                'withheld_in_countries': series_to_json_string
+                'withheld_in_countries': series_to_json_string,
+                # nested statuses stay json so DfHelper decodes them in bulk
+                'user': series_to_json_string,
+                'entities': series_to_json_string,
+                'retweeted_status': series_to_json_string,
+                'quoted_status': series_to_json_string
             }
-            if series.name in coercions.keys():
+            field_type = self.schema.field(series.name).type if series.name in self.schema.names else None
+            if not (field_type is None) and is_nested(field_type):
+                return series.apply(lambda v: coerce_value(v, field_type))
+            elif series.name in coercions.keys():
                 return coercions[series.name](series)
             elif series.dtype.name == 'object':
                 return series.values.astype('unicode')
@@ -304,88 +389,51 @@ class FirehoseJob:
         finally:
             self.timer.toc('clean')
 
+    # Rows buffered since the last flush (zero-copy view), or None
+    @property
+    def current_table(self):
+        if getattr(self, 'buffer', None) is None or self.buffer.num_rows == 0:
+            return None
+        return self.buffer.to_table()
+
     def folder_last(self):
         return self.__folder_last
 
     def files(self):
         return self.__file_names.copy()
 
-    # TODO <topic>/<year>/<mo>/<day>/<24hour_utc>_<nth>.parquet (don't clobber..)
+    # One hive-partitioned dataset per writer flavor, see ParquetDatasetWriter:
+    #   firehose_data/<flavor>/job=<job>/year=/month=/day=/hour=/part-<uuid>.parquet
     def pq_writer(self, table, job_name='generic_job'):
         try:
             self.timer.tic('write', 1000)
 
             job_name = self.clean_file_name(job_name)
 
-            folder = "firehose_data/%s" % job_name
-            logger.debug('make folder if not exists: %s' % folder)
-            os.makedirs(folder, exist_ok=True)
-            self.__folder_last = folder
-
-            vanilla_file_suffix = 'vanilla2.parquet'
-            snappy_file_suffix = 'snappy2.parquet'
-            time_prefix = datetime.datetime.now().strftime("%Y_%m_%d_%H")
-            run = 0
-            file_prefix = ""
-            while (file_prefix == "") \
-                    or os.path.exists(file_prefix + vanilla_file_suffix) \
-                    or os.path.exists(file_prefix + snappy_file_suffix):
-                run = run + 1
-                file_prefix = "%s/%s_b%s." % (folder, time_prefix, run)
-            if run > 1:
-                logger.debug('Starting new batch for existing hour')
-            vanilla_file_name = file_prefix + vanilla_file_suffix
-            snappy_file_name = file_prefix + snappy_file_suffix
-
-            #########################################################
-
-            #########################################################
-            if ('vanilla' in self.writers) and (
-                    (self.writers['vanilla'] is None) or self.last_write_epoch != file_prefix):
-                logger.debug('Creating vanilla writer: %s', vanilla_file_name)
-                try:
-                    # first write
-                    # os.remove(vanilla_file_name)
-                    1
-                except Exception as exn:
-                    logger.debug(('Could not rm vanilla parquet', exn))
-                self.writers['vanilla'] = pq.ParquetWriter(
-                    vanilla_file_name,
-                    schema=table.schema,
-                    compression='NONE')
-                self.__file_names.append(vanilla_file_name)
-
-            if ('snappy' in self.writers) and (
-                    (self.writers['snappy'] is None) or self.last_write_epoch != file_prefix):
-                logger.debug('Creating snappy writer: %s', snappy_file_name)
-                try:
-                    # os.remove(snappy_file_name)
-                    1
-                except Exception as exn:
-                    logger.error(('Could not rm snappy parquet', exn))
-                self.writers['snappy'] = pq.ParquetWriter(
-                    snappy_file_name,
-                    schema=table.schema,
-                    compression={
-                        field.name.encode(): 'SNAPPY'
-                        for field in table.schema
-                    })
-                self.__file_names.append(snappy_file_name)
-
-            self.last_write_epoch = file_prefix
-            ######################################################
-
             for name in self.writers.keys():
+                writer = self.writers[name]
+                if (writer is None) or writer.job_name != job_name:
+                    if not (writer is None):
+                        writer.close()
+                    logger.debug('Creating %s dataset writer for job %s', name, job_name)
+                    writer = ParquetDatasetWriter(
+                        "firehose_data/%s" % name,
+                        job_name,
+                        table.schema,
+                        compression=FirehoseJob.WRITER_COMPRESSION.get(name, 'SNAPPY'),
+                        max_open_files=self.MAX_OPEN_FILES)
+                    self.writers[name] = writer
+                self.__folder_last = writer.job_folder
                 try:
                     logger.debug('Writing %s (%s x %s)' % (
                         name, table.num_rows, table.num_columns))
                     self.timer.tic('writing_%s' % name, 20, 1)
-                    writer = self.writers[name]
-                    writer.write_table(table)
+                    self.__file_names.extend(
+                        writer.write_table(table, row_group_size=self.TWEETS_PER_ROWGROUP))
                     logger.debug('========')
                     logger.debug(table.schema)
                     logger.debug('--------')
-                    logger.debug(table.to_pandas()[:10])
+                    logger.debug(table.slice(0, 10).to_pandas())
                     logger.debug('--------')
                     self.timer.toc('writing_%s' % name, table.num_rows)
                     #########
@@ -402,31 +450,67 @@ class FirehoseJob:
         finally:
             self.timer.toc('write')
 
-    def flush(self, job_name="generic_job"):
-        try:
-            if not hasattr(self, 'current_table') or self.current_table is None or self.current_table.num_rows == 0:
-                return
-            logger.debug('writing to parquet then clearing current_table..')
-            deferred_pq_exn = None
-            try:
-                self.pq_writer(self.current_table, job_name)
-            except Exception as e:
-                deferred_pq_exn = e
+    def neo4j_sink(self, table, job_name):
+        logger.debug('Writing to Neo4j')
+        self.neo4j().save_parquet_batches_to_graph(table.to_batches(), job_name, max_rows=self.TWEETS_PER_ROWGROUP)
+        if not (self.hydrated_ids is None):
+            self.hydrated_ids.add(table.column('id').to_numpy())
+
+    def disk_sink(self, table, job_name):
+        ids = table.column('id').to_numpy()
+        self._maybe_write_batch(
+            table.to_pandas(),
+            self.write_to_disk,
+            f'{job_name}/tweets/{ids.min()}_{ids.max()}',
+            write_opts=self.write_opts or {})
+
+    def sinks(self):
+        sinks = {'parquet': self.pq_writer}
+        if self.save_to_neo:
+            sinks['neo4j'] = self.neo4j_sink
+        else:
+            logger.debug('Skipping Neo4j write')
+        if not (self.write_to_disk is None):
+            sinks['disk'] = self.disk_sink
+        return sinks
+
+    # Runs every sink even if one fails, then raises the first failure
+    def write_sinks(self, table, job_name):
+        deferred_exn = None
+        for name, sink in self.sinks().items():
             try:
-                if self.save_to_neo:
-                    logger.debug('Writing to Neo4j')
-                    Neo4jDataAccess(self.debug, self.neo4j_creds).save_parquet_df_to_graph(
-                        self.current_table.to_pandas(), job_name)
-                else:
-                    logger.debug('Skipping Neo4j write')
+                sink(table, job_name)
             except Exception as e:
-                logger.error('Neo4j write exn', e)
-                raise e
-            if not (deferred_pq_exn is None):
-                raise deferred_pq_exn
-        finally:
-            logger.debug('flush clearing self.current_table')
-            self.current_table = None
+                logger.error('%s write exn: %s', name, e)
+                if deferred_exn is None:
+                    deferred_exn = e
+        if not (deferred_exn is None):
+            raise deferred_exn
+
+    # Re-raise failures from background sink threads, if any
+    def check_writes(self):
+        if not (self.__background_writer is None):
+            self.__background_writer.check()
+
+    # Block until queued tables are written by every sink
+    def drain(self):
+        if not (self.__background_writer is None):
+            self.__background_writer.drain()
+
+    # Writes out and clears the buffered rows, returning them as one table (None if nothing buffered)
+    # With write_queue_size set, writing continues in the background; see drain()
+    def flush(self, job_name="generic_job"):
+        if getattr(self, 'buffer', None) is None or self.buffer.num_rows == 0:
+            return None
+        logger.debug('writing to sinks then clearing buffer..')
+        table = self.buffer.drain()
+        if self.write_queue_size is None:
+            self.write_sinks(table, job_name)
+        else:
+            if self.__background_writer is None:
+                self.__background_writer = BackgroundWriter(self.sinks(), self.write_queue_size)
+            self.__background_writer.submit(table, job_name)
+        return table
 
     def tweets_to_df(self, tweets):
         try:
@@ -442,6 +526,22 @@ class FirehoseJob:
         finally:
             self.timer.toc('to_pandas')
 
+    # engine='arrow': raw tweets -> record batch in KNOWN_FIELDS schema, without the pandas round trip
+    def tweets_to_arrow(self, tweets):
+        try:
+            self.timer.tic('to_arrow', 1000)
+            batch = tweets_to_record_batch(
+                tweets, self.schema,
+                defaults={c: c_default for (c, c_dtype, c_default) in FirehoseJob.EXPECTED_COLS},
+                drop_cols=FirehoseJob.DROP_COLS)
+            return pa.Table.from_batches([batch], schema=self.schema)
+        except Exception as exn:
+            logger.error('Failed tweets->arrow')
+            logger.error(exn)
+            raise exn
+        finally:
+            self.timer.toc('to_arrow')
+
     def df_with_schema_to_arrow(self, df, schema):
         try:
             self.timer.tic('df_with_schema_to_arrow', 1000)
@@ -481,12 +581,13 @@ class FirehoseJob:
                     logger.error('arrow')
                     logger.error([schema[k] for k in range(0, len(schema))])
                     logger.error('~~~~~~~~')
-                    if not (self.current_table is None):
+                    current_table = self.current_table
+                    if not (current_table is None):
                         try:
-                            logger.error(self.current_table.to_pandas()[:3])
+                            logger.error(current_table.slice(0, 3).to_pandas())
                             logger.error('----')
                             logger.error(
-                                [self.current_table.schema[k] for k in range(0, self.current_table.num_columns)])
+                                [current_table.schema[k] for k in range(0, current_table.num_columns)])
                         except Exception as exn2:
                             logger.error(('cannot to_pandas print..', exn2))
                 except:
@@ -530,8 +631,8 @@ class FirehoseJob:
             self.timer.toc('concat_tables')
 
     def process_tweets_notify_hydrating(self):
-        if not (self.current_table is None):
-            self.timer.toc('tweet', self.current_table.num_rows)
+        if self.buffer.num_rows > 0:
+            self.timer.toc('tweet', self.buffer.num_rows)
         self.timer.tic('tweet', 40, 40)
 
         self.timer.tic('hydrate', 40, 40)
@@ -541,14 +642,19 @@ class FirehoseJob:
 
         self.timer.toc('hydrate')
 
-        self.timer.tic('overall_compute', 40, 40)
+        self.last_job_name = job_name
+        self.check_writes()
 
-        raw_df = self.tweets_to_df(tweets)
-        df = self.clean_df(raw_df)
+        self.timer.tic('overall_compute', 40, 40)
 
         table = None
         try:
-            table = self.df_with_schema_to_arrow(df, self.schema)
+            if self.engine == 'arrow':
+                table = self.tweets_to_arrow(tweets)
+            else:
+                raw_df = self.tweets_to_df(tweets)
+                df = self.clean_df(raw_df)
+                table = self.df_with_schema_to_arrow(df, self.schema)
         except Exception as e:
             # logger.error('conversion failed, skipping batch...')
             self.timer.toc('overall_compute')
@@ -556,23 +662,17 @@ class FirehoseJob:
 
         self.last_arr = table
 
-        if self.current_table is None:
-            self.current_table = table
-        else:
-            self.current_table = self.concat_tables(self.current_table, table)
+        self.timer.tic('buffer', 1000)
+        self.buffer.append(table)
+        self.timer.toc('buffer')
 
-        out = self.current_table  # or just table (without intermediate concats since last flush?)
+        # the flushed rows when this batch triggered a flush, else just this batch
+        out = table
 
-        if not (self.current_table is None) \
-                and ((self.current_table.num_rows > self.TWEETS_PER_ROWGROUP) or self.needs_to_flush) \
-                and self.current_table.num_rows > 0:
-            self.flush(job_name)
+        if ((self.buffer.num_rows > self.TWEETS_PER_ROWGROUP) or self.needs_to_flush) \
+                and self.buffer.num_rows > 0:
+            out = self.flush(job_name)
             self.needs_to_flush = False
-        else:
-            1
-            # print('skipping, has table ? %s, num rows %s' % (
-            #    not (self.current_table is None),
-            #    0 if self.current_table is None else self.current_table.num_rows))
 
         self.timer.toc('overall_compute')
 
@@ -622,49 +722,148 @@ class FirehoseJob:
 
     ################################################################################
 
-    def process_ids(self, ids_to_process, job_name=None):
+    def __chunk_ids(self, ids):
+        ids = iter(ids)
+        while True:
+            chunk = np.fromiter(itertools.islice(ids, self.STATUS_BLOCK_LEN), dtype='int64')
+            if len(chunk) == 0:
+                return
+            yield chunk
+
+    # Yields the ids not yet fully hydrated in neo4j
+    # Status is checked STATUS_BLOCK_LEN ids per query, with the next look_ahead blocks
+    # queried in the background while the caller hydrates the current one
+    # Running totals are kept in self.hydration_stats
+    # ids: any iterable of ids, or id_chunks: an iterable of int64 arrays (e.g. an IdFileReader)
+    def missing_ids(self, ids=(), look_ahead=2, id_chunks=None):
+        if id_chunks is None:
+            id_chunks = self.__chunk_ids(ids)
+        blocks = rechunk_ids(id_chunks, self.STATUS_BLOCK_LEN)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=look_ahead, thread_name_prefix='hydration_status') as executor:
+
+            def check(block):
+                uncertain = block
+                if not (self.hydrated_ids is None):
+                    uncertain = self.hydrated_ids.uncertain(block)
+                hydrated = self.neo4j().get_fully_hydrated_tweet_ids(uncertain)
+                if not (self.hydrated_ids is None):
+                    self.hydrated_ids.add(hydrated)
+                return uncertain[~np.isin(uncertain, hydrated)], len(block) - len(uncertain)
+
+            def submit_next():
+                block = next(blocks, None)
+                if block is None:
+                    return False
+                pending.append((block, executor.submit(check, block)))
+                return True
+
+            exhausted = False
+            try:
+                while True:
+                    while not exhausted and len(pending) <= look_ahead:
+                        exhausted = not submit_next()
+                    if len(pending) == 0:
+                        break
+                    block, future = pending.popleft()
+                    self.timer.tic('hydration_status', 20, 1)
+                    missing, cached = future.result()
+                    self.timer.toc('hydration_status')
+
+                    self.hydration_stats['checked'] += len(block)
+                    self.hydration_stats['skipped'] += len(block) - len(missing)
+                    self.hydration_stats['missing'] += len(missing)
+                    self.hydration_stats['cached'] += cached
+                    logger.info('Skipping hydrated %s (%s cached locally), fetching %s, of requested %s (total skipped %s of %s)' % (
+                        len(block) - len(missing),
+                        cached,
+                        len(missing),
+                        len(block),
+                        self.hydration_stats['skipped'],
+                        self.hydration_stats['checked']))
+
+                    for id in missing.tolist():
+                        yield id
+            finally:
+                for block, future in pending:
+                    future.cancel()
 
-        self.process_tweets_notify_hydrating()
+    def process_ids(self, ids_to_process, job_name=None):
 
         if job_name is None:
             job_name = "process_ids_%s" % (ids_to_process[0] if len(ids_to_process) > 0 else "none")
 
-        for i in range(0, len(ids_to_process), self.BATCH_LEN):
-            ids_to_process_batch = ids_to_process[i: (i + self.BATCH_LEN)]
-
-            logger.info('Starting batch offset %s ( + %s) of %s', i, self.BATCH_LEN, len(ids_to_process))
+        for arr in self.process_id_chunks([np.asarray(ids_to_process, dtype='int64')], job_name):
+            yield arr
 
-            hydration_statuses_df = Neo4jDataAccess(self.debug, self.neo4j_creds) \
-                .get_tweet_hydrated_status_by_id(pd.DataFrame({'id': ids_to_process_batch}))
-            missing_ids = hydration_statuses_df[hydration_statuses_df['hydrated'] != 'FULL']['id'].tolist()
+    # id_chunks: iterable of int64 arrays, consumed incrementally
+    # prober: optional SnowflakeProber told which ids went to twitter and which came back
+    def process_id_chunks(self, id_chunks, job_name='generic_job', prober=None):
 
-            logger.debug('Skipping cached %s, fetching %s, of requested %s' % (
-                len(ids_to_process_batch) - len(missing_ids),
-                len(missing_ids),
-                len(ids_to_process_batch)))
+        self.process_tweets_notify_hydrating()
 
-            tweets = (tweet for tweet in self.twarc_pool.next_twarc().hydrate(missing_ids))
+        ids = self.missing_ids(id_chunks=id_chunks)
+        if not (prober is None):
+            ids = self.__observe_batches(ids, lambda batch: prober.observe(probed_ids=batch))
 
-            for arr in self.process_tweets_generator(tweets, job_name):
-                yield arr
+        # every credential hydrates in parallel, each within its own rate limit
+        tweets = self.twarc_pool.hydrate(ids, lookup_size=self.BATCH_LEN)
+        if not (prober is None):
+            tweets = self.__observe_batches(
+                tweets, lambda batch: prober.observe(hit_ids=[tweet['id'] for tweet in batch]))
 
-    def process_id_file(self, path, job_name=None):
+        for arr in self.process_tweets_generator(tweets, job_name):
+            yield arr
 
-        pdf = None
-        lst = None
-        try:
-            pdf = cudf.read_csv(path, header=None).to_pandas()
-            lst = pdf['0'].to_list()
-        except:
-            pdf = pd.read_csv(path, header=None)
-            lst = pdf[0].to_list()
+    # Passes items through, reporting them to observe in batches
+    def __observe_batches(self, items, observe, batch_len=10000):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_len:
+                observe(batch)
+                batch = []
+            yield item
+        if len(batch) > 0:
+            observe(batch)
+
+    # Streams the file in bounded blocks instead of loading every id
+    # Resume with a byte offset or line number from an earlier run's self.id_file_reader,
+    # or, with checkpoints on, from the last block whose tweets were fully written
+    def process_id_file(self, path, job_name=None, offset=None, line=None):
 
         if job_name is None:
             job_name = "id_file_%s" % path
-        logger.debug('loaded %s ids, hydrating..' % len(lst))
 
-        for arr in self.process_ids(lst, job_name):
-            yield arr
+        if offset is None and line is None:
+            offset, line = (0, 0) if self.checkpoints is None else self.checkpoints.get_offset(job_name, path)
+
+        reader = IdFileReader(path, offset=offset or 0, line=line)
+        self.id_file_reader = reader
+        logger.debug('streaming ids from %s (byte %s, line %s), hydrating..' % (path, offset, line))
+
+        if self.checkpoints is None:
+            for arr in self.process_id_chunks(reader, job_name):
+                yield arr
+            return
+
+        # one block at a time, so a checkpoint only covers ids whose tweets reached every sink
+        blocks = 0
+        for ids in reader:
+            for arr in self.process_id_chunks([ids], job_name):
+                yield arr
+            blocks += 1
+            if blocks % self.CHECKPOINT_BLOCKS == 0:
+                self.__checkpoint_id_file(job_name, path, reader)
+        if blocks % self.CHECKPOINT_BLOCKS != 0:
+            self.__checkpoint_id_file(job_name, path, reader)
+
+    def __checkpoint_id_file(self, job_name, path, reader):
+        self.drain()
+        # part files still open would be lost to a kill, so make them durable first
+        self.close_writers()
+        self.checkpoints.save_offset(job_name, path, reader.offset, reader.line)
+        logger.info('checkpointed %s at byte %s, line %s', path, reader.offset, reader.line)
 
     def search(self, input="", job_name=None):
 
@@ -726,22 +925,27 @@ class FirehoseJob:
             gc.collect()
             logger.debug('Safely exited!')
 
-    def ingest_range(self, begin, end, job_name=None):  # This method is where the magic happens
+    # Hydrates every id Twitter could have minted in ms timestamps [begin, end) on MACHINE_IDS
+    # With a SnowflakeProber, probes its best (machine, sequence) slots first, at most budget ids
+    # (by default as many as the fixed enumeration would), and feeds hits back into it
+    def ingest_range(self, begin, end, job_name=None, sequence_ids=(0, ), prober=None, budget=None):  # This method is where the magic happens
 
         if job_name is None:
             job_name = "ingest_range_%s_to_%s" % (begin, end)
 
-        for epoch in range(begin, end):  # Move through each millisecond
-            time_component = (epoch - FirehoseJob.SNOWFLAKE_EPOCH) << 22
-            for machine_id in FirehoseJob.MACHINE_IDS:  # Iterate over machine ids
-                for sequence_id in [0]:  # Add more sequence ids as needed
-                    twitter_id = time_component + (machine_id << 12) + sequence_id
-                    self.queue.append(twitter_id)
-                    if len(self.queue) >= self.TWEETS_PER_PROCESS:
-                        ids_to_process = []
-                        for i in range(0, self.TWEETS_PER_PROCESS):
-                            ids_to_process.append(self.queue.popleft())
-                        self.process_ids(ids_to_process, job_name)
+        if prober is None:
+            id_blocks = fixed_plan_blocks(
+                begin, end, FirehoseJob.MACHINE_IDS, sequence_ids, budget=budget, block_size=self.STATUS_BLOCK_LEN)
+        else:
+            if budget is None:
+                budget = (end - begin) * len(FirehoseJob.MACHINE_IDS) * len(sequence_ids)
+            id_blocks = prober.plan_blocks(begin, end, budget=budget, block_size=self.STATUS_BLOCK_LEN)
+
+        for arr in self.process_id_chunks(id_blocks, job_name, prober=prober):
+            yield arr
+
+        if not (prober is None):
+            logger.info('ingest_range probe stats: %s', prober.stats())
 
     ###############################
 
@@ -800,10 +1004,10 @@ class FirehoseJob:
             raise ValueError(f'unknown write_to_disk format: {write_to_disk}')
 
 
-    _enriched_users = set()
     def search_user_info_by_name(self, df, tp = None) -> Optional[pd.DataFrame]:
         """
         Where df has col 'user_name' or 'username' (return by search_time_range)
+        Returns profiles of users not already fetched within profile_ttl_days (see ProfileEnricher)
         """
         if df is None or len(df) == 0:
             logger.debug('skipping search_user_info_by_name, df is empty')
@@ -818,29 +1022,10 @@ class FirehoseJob:
             return None
         tp = tp or self.tp or TwintPool(is_tor=True)
         user_names = df[[col]].drop_duplicates()[col].to_list()
-        unseen_user_names = [ user_name for user_name in user_names if user_name not in self._enriched_users ]
 
-        if len(unseen_user_names) == 0:
-            logger.debug('skipping search_user_info_by_name, all user names already enriched: %s / %s',
-                len(unseen_user_names), len(user_names))
-            return None
-
-        lst = [tp._get_user_info(username=user, ignore_errors=True) for user in unseen_user_names]
-        lst = [x for x in lst if x is not None]
-        if len(lst) == 0 or all([len(x) == 0 for x in lst]):
-            logger.debug('ending search_user_info_by_name, no user info found for search of %s of %s users', len(unseen_user_names), len(user_names))
-            return None
+        dfs = self.profiles.enrich(user_names, tp)
 
-        dfs = pd.concat(lst).drop_duplicates(subset=["id"])
-
-        seen_user_names = dfs['username'].to_list()
-        for user in seen_user_names:
-            self._enriched_users.add(user)
-
-        logger.debug('search_user_info_by_name cache hit rate (%s / %s) and twint hydration rate (%s / %s)' % (
-            len(user_names) - len(seen_user_names), len(user_names),
-            len(seen_user_names), len(unseen_user_names)
-        ))
+        logger.debug('search_user_info_by_name profile cache stats: %s', self.profiles.stats())
 
         return dfs
 
@@ -852,54 +1037,96 @@ class FirehoseJob:
                           tp=None,
                           write_to_disk: Optional[Literal['csv', 'json', 'parquet', 'parquet_s3']] = None,
                           fetch_profiles: bool = False,
+                          adaptive_stride: bool = False,
+                          window_tweets: Optional[int] = None,
+                          pipeline_queue_size: int = 2,
                           **kwargs):
         tic = time.perf_counter()
         if job_name is None:
             job_name = "search_%s" % Search
         tp = tp or self.tp or TwintPool(is_tor=True)
         logger.info('start search_time_range: %s -> %s', Since, Until)
-        t_prev = time.perf_counter()
-        for df, t0, t1 in tp._get_term(Search=Search, Since=Since, Until=Until, **kwargs):
-            logger.info('hits %s to %s: %s', t0, t1, len(df))
-            if self.save_to_neo:
-                logger.debug('writing to neo4j')
-                hydratetic = time.perf_counter()
-                chkd = tp.check_hydrate(df)
-                hydratetoc = time.perf_counter()
-                logger.info(f'finished checking for hydrate:  {hydratetoc - hydratetic:0.4f} seconds')
-                logger.info('search step df shape: %s', df.shape)
-                logger.info('chkd shape: %s', chkd.shape)
-
-                res = Neo4jDataAccess(self.neo4j_creds).save_twintdf_to_neo(chkd, job_name, job_id=None)
-                # df3 = Neo4jDataAccess(self.debug, self.neo4j_creds).save_df_to_graph(df2, job_name)
-                logger.info('wrote to neo4j, # %s' % (len(res) if not (res is None) else 0))
-            else:
-                res = df
+        stride = None
+        search_limit = kwargs.get('Limit', tp.config.Limit)
+        if adaptive_stride and search_limit is None and window_tweets is None:
+            logger.warning('adaptive_stride needs a Limit or window_tweets to size windows against, using fixed stride_sec')
+        elif adaptive_stride:
+            # window sizes follow the results, starting from the density the last run of Search saw
+            density = None
+            if not (self.checkpoints is None):
+                # a run that died before saving its density still left windows to estimate it from
+                density = self.checkpoints.get_density(job_name, Search) \
+                    or self.checkpoints.completed_density(job_name)
+            stride = AdaptiveStride(
+                search_limit, stride_sec=kwargs.get('stride_sec', 600), density=density, window_tweets=window_tweets)
+            kwargs['stride'] = stride
+        covered, window_done = None, None
+        if not (self.checkpoints is None):
+            # resume from what earlier runs covered: adaptive windows need not match theirs
+            covered = self.checkpoints.completed_ranges(job_name)
+            window_done = lambda t0, t1: self.checkpoints.complete_window(job_name, t0, t1, 0)
+        write_opts = kwargs.get('write_opts', self.write_opts)
+
+        # Each window goes fetch -> neo4j -> disk -> profiles, every stage on its own thread (see StagePipeline),
+        # so the next window is fetched while this one is written; items are (df, res, t0, t1)
+        def fetch():
+            for df, t0, t1 in tp._get_term(Search=Search, Since=Since, Until=Until,
+                                           covered=covered, window_done=window_done, **kwargs):
+                logger.info('hits %s to %s: %s', t0, t1, len(df))
+                yield (df, df, t0, t1)
+
+        def save_to_neo(item):
+            df, res, t0, t1 = item
+            logger.debug('writing to neo4j')
+            hydratetic = time.perf_counter()
+            chkd = tp.check_hydrate(df, hydrated_ids=self.hydrated_ids)
+            hydratetoc = time.perf_counter()
+            logger.info(f'finished checking for hydrate:  {hydratetoc - hydratetic:0.4f} seconds')
+            logger.info('search step df shape: %s', df.shape)
+            logger.info('chkd shape: %s', chkd.shape)
+
+            res = self.neo4j().save_twintdf_to_neo(chkd, job_name, job_id=None)
+            # df3 = Neo4jDataAccess(self.debug, self.neo4j_creds).save_df_to_graph(df2, job_name)
+            logger.info('wrote to neo4j, # %s' % (len(res) if not (res is None) else 0))
+            return (df, res, t0, t1)
+
+        def write(item):
+            df, res, t0, t1 = item
+            self._maybe_write_batch(res, write_to_disk, f'{job_name}/tweets/{t0}_{t1}', write_opts=write_opts)
+            return item
+
+        def fetch_user_profiles(item):
+            df, res, t0, t1 = item
+            users_df = self.search_user_info_by_name(res, tp)
+            if users_df is not None:
+                self._maybe_write_batch(
+                    users_df, write_to_disk, f'{job_name}/profiles/{t0}_{t1}', write_opts=write_opts)
+            return item
 
-            self._maybe_write_batch(
-                res,
-                write_to_disk,
-                f'{job_name}/tweets/{t0}_{t1}',
-                write_opts=kwargs.get('write_opts', self.write_opts)
-            )
+        stages = []
+        if self.save_to_neo:
+            stages.append(('search_time_range.neo4j', save_to_neo))
+        stages.append(('search_time_range.write', write))
+        if fetch_profiles:
+            stages.append(('search_time_range.profiles', fetch_user_profiles))
+
+        t_prev = time.perf_counter()
+        for df, res, t0, t1 in StagePipeline(
+                fetch(), stages, queue_size=pipeline_queue_size, timer=self.timer,
+                source_name='search_time_range.fetch'):
             t_iter = time.perf_counter()
-            logger.info(f'finished tp.get_term:  {t_iter - t_prev:0.4f} seconds')
+            logger.info(f'finished window {t0}-{t1}:  {t_iter - t_prev:0.4f} seconds')
             t_prev = t_iter
 
-            if fetch_profiles:
-                users_df = self.search_user_info_by_name(res, tp)
-                if users_df is not None:
-                    self._maybe_write_batch(
-                        users_df,
-                        write_to_disk,
-                        f'{job_name}/profiles/{t0}_{t1}',
-                        write_opts=kwargs.get('write_opts', self.write_opts)
-                    )
-                    t_iter = time.perf_counter()
-                    logger.info(f'finished tp.search_user_info_by_name:  {t_iter - t_prev:0.4f} seconds')
-                    t_prev = t_iter
+            if not (self.checkpoints is None):
+                self.checkpoints.complete_window(job_name, t0, t1, len(df))
 
-                yield res
+            yield res
+
+        if not (stride is None):
+            logger.info('adaptive stride: %s', stride.stats())
+            if not (self.checkpoints is None) and not (stride.density is None):
+                self.checkpoints.save_density(job_name, Search, stride.density)
 
         toc = time.perf_counter()
         logger.info(f'finished twint loop in:  {toc - tic:0.4f} seconds')
@@ -917,6 +1144,9 @@ class FirehoseJob:
             job_name = "timeline_%s" % user
         tp = tp or self.tp or TwintPool(is_tor=True)
         for user in usernames:
+            if not (self.checkpoints is None) and self.checkpoints.user_done(job_name, user):
+                logger.info('skipping completed user: %s', user)
+                continue
             logger.info('start user: %s', user)
             t_prev = time.perf_counter()
             now = date.today().strftime('%Y-%m-%d%H:%M:%S')
@@ -957,6 +1187,9 @@ class FirehoseJob:
                     logger.info(f'finished tp.search_user_info_by_name:  {t_iter - t_prev:0.4f} seconds')
                     t_prev = t_iter
 
+            if not (self.checkpoints is None):
+                self.checkpoints.complete_user(job_name, user)
+
             yield df
 
         toc = time.perf_counter()
@@ -0,0 +1,212 @@
+import json, math, os, threading, uuid
+import numpy as np
+
+import logging
+logger = logging.getLogger('HydratedIdCache')
+
+_M1 = np.uint64(0xbf58476d1ce4e5b9)
+_M2 = np.uint64(0x94d049bb133111eb)
+_SALT = np.uint64(0x9e3779b97f4a7c15)
+
+
+def _mix64(x):
+    # splitmix64 finalizer; uint64 arithmetic wraps
+    x = x ^ (x >> np.uint64(30))
+    x = x * _M1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+# Bloom filter over int64 ids, bits packed in a uint8 array
+class IdBloomFilter:
+
+    def __init__(self, bits, num_hashes):
+        self.bits = bits
+        self.num_bits = np.uint64(len(bits) * 8)
+        self.num_hashes = num_hashes
+
+    @staticmethod
+    def sizing(capacity, error_rate=0.01):
+        num_bits = max(64, -capacity * math.log(error_rate) / (math.log(2) ** 2))
+        num_bits = 1 << int(math.ceil(math.log2(num_bits)))
+        num_hashes = max(1, int(round(num_bits / max(capacity, 1) * math.log(2))))
+        return num_bits, num_hashes
+
+    @classmethod
+    def empty(cls, capacity, error_rate=0.01):
+        num_bits, num_hashes = cls.sizing(capacity, error_rate)
+        return cls(np.zeros(num_bits // 8, dtype=np.uint8), num_hashes)
+
+    def __positions(self, ids):
+        x = np.asarray(ids, dtype=np.int64).view(np.uint64)
+        h1 = _mix64(x)
+        h2 = _mix64(x ^ _SALT) | np.uint64(1)
+        mask = self.num_bits - np.uint64(1)
+        for i in range(self.num_hashes):
+            yield (h1 + np.uint64(i) * h2) & mask
+
+    def add(self, ids):
+        for pos in self.__positions(ids):
+            np.bitwise_or.at(self.bits, pos >> np.uint64(3), np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+
+    # False means definitely absent, True means probably present
+    def might_contain(self, ids):
+        out = np.ones(len(ids), dtype=bool)
+        for pos in self.__positions(ids):
+            out &= ((self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1) == 1
+        return out
+
+
+# Local set of tweet ids known to be hydrated='FULL' in neo4j, so repeat runs can skip
+# most hydration status queries:
+#   <path>/ids.npy       sorted unique int64, memory mapped
+#   <path>/bloom.npy     bloom filter bits, memory mapped copy-on-write
+#   <path>/meta.json
+# Lookups hit the bloom filter first, and only probable members get a binary search.
+# New ids stay in memory until save(), which rewrites the files atomically: they are buffered,
+# sorted into a run once RUN_ROWS pile up, and runs of similar size are merged, so each id is
+# re-sorted O(log n) times over a run instead of on every lookup.
+# The bloom filter doubles as soon as the ids outgrow its capacity.
+# Only positive answers are certain: ids not in the cache still need a neo4j check.
+class HydratedIdCache:
+
+    RUN_ROWS = 1 << 16  # buffered ids sorted into a run at a time
+
+    def __init__(self, path, capacity=10000000, error_rate=0.01):
+        self.path = path
+        self.error_rate = error_rate
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.__added = []  # unsorted new ids, none already in the cache
+        self.__added_len = 0
+        self.__runs = []  # sorted unique new ids, largest first, disjoint from each other and self.ids
+        self.__runs_len = 0
+        self.__load(capacity)
+
+    def __file(self, name):
+        return os.path.join(self.path, name)
+
+    def __load(self, capacity):
+        meta_path = self.__file('meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.capacity = meta['capacity']
+            self.ids = np.load(self.__file('ids.npy'), mmap_mode='r')
+            self.bloom = IdBloomFilter(np.load(self.__file('bloom.npy'), mmap_mode='c'), meta['num_hashes'])
+            logger.info('Loaded %s hydrated ids from %s', len(self.ids), self.path)
+        else:
+            self.capacity = capacity
+            self.ids = np.empty(0, dtype=np.int64)
+            self.bloom = IdBloomFilter.empty(capacity, self.error_rate)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.ids) + self.__runs_len + self.__added_len
+
+    # Sorts the buffered ids into a run, then merges runs while the newest is at least half the size
+    # of the one before it, so sizes stay geometric and there are O(log n) of them
+    def __merge_added(self):
+        if self.__added_len > 0:
+            self.__runs.append(np.sort(np.concatenate(self.__added)))
+            self.__runs_len += self.__added_len
+            self.__added = []
+            self.__added_len = 0
+        while len(self.__runs) > 1 and 2 * len(self.__runs[-1]) >= len(self.__runs[-2]):
+            newest = self.__runs.pop()
+            self.__runs[-1] = np.union1d(self.__runs[-1], newest)
+
+    def __in_sorted(self, sorted_ids, ids):
+        if len(sorted_ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        idx = np.searchsorted(sorted_ids, ids)
+        idx[idx == len(sorted_ids)] = 0
+        return sorted_ids[idx] == ids
+
+    def __contains(self, ids):
+        out = self.bloom.might_contain(ids)
+        maybe = np.flatnonzero(out)
+        if len(maybe) > 0:
+            candidates = ids[maybe]
+            found = self.__in_sorted(self.ids, candidates)
+            for run in self.__runs:
+                found |= self.__in_sorted(run, candidates)
+            if self.__added_len > 0:
+                found |= np.isin(candidates, np.concatenate(self.__added))
+            out[maybe] = found
+        return out
+
+    # Rebuilds the bloom filter at double capacity until it fits every id
+    def __grow(self):
+        size = len(self)
+        if size <= self.capacity:
+            return
+        while self.capacity < size:
+            self.capacity *= 2
+        logger.info('Resizing hydrated id bloom filter for %s ids', self.capacity)
+        bloom = IdBloomFilter.empty(self.capacity, self.error_rate)
+        for start in range(0, len(self.ids), self.RUN_ROWS):
+            bloom.add(self.ids[start:start + self.RUN_ROWS])
+        for ids in self.__runs + self.__added:
+            bloom.add(ids)
+        self.bloom = bloom
+
+    # Mark ids as fully hydrated, e.g. after a successful neo4j write
+    def add(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        with self.lock:
+            ids = np.unique(ids)
+            ids = ids[~self.__contains(ids)]
+            if len(ids) == 0:
+                return
+            self.bloom.add(ids)
+            self.__added.append(ids)
+            self.__added_len += len(ids)
+            if self.__added_len >= self.RUN_ROWS:
+                self.__merge_added()
+            self.__grow()
+
+    def contains(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        with self.lock:
+            out = self.__contains(ids)
+            hits = int(out.sum())
+            self.hits += hits
+            self.misses += len(ids) - hits
+        return out
+
+    # ids that may still need hydrating
+    def uncertain(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return ids[~self.contains(ids)]
+
+    def save(self):
+        with self.lock:
+            if self.__runs_len + self.__added_len == 0:
+                return
+            self.__merge_added()
+            ids = self.ids
+            for run in self.__runs:
+                ids = np.union1d(ids, run)
+            os.makedirs(self.path, exist_ok=True)
+            self.__replace('ids.npy', lambda f: np.save(f, ids))
+            self.__replace('bloom.npy', lambda f: np.save(f, np.asarray(self.bloom.bits)))
+            self.__replace('meta.json', lambda f: f.write(
+                json.dumps({'capacity': self.capacity, 'num_hashes': self.bloom.num_hashes}).encode('utf-8')))
+            self.ids = np.load(self.__file('ids.npy'), mmap_mode='r')
+            self.bloom = IdBloomFilter(np.load(self.__file('bloom.npy'), mmap_mode='c'), self.bloom.num_hashes)
+            self.__runs = []
+            self.__runs_len = 0
+            logger.debug('Saved %s hydrated ids to %s', len(ids), self.path)
+
+    def __replace(self, name, write):
+        tmp_path = self.__file('%s.%s.tmp' % (name, uuid.uuid4().hex))
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.__file(name))
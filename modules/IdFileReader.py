@@ -0,0 +1,95 @@
+import io, mmap, os
+import numpy as np
+import pyarrow.csv as csv
+
+import logging
+logger = logging.getLogger('IdFileReader')
+
+
+# Streams a one-id-per-line file as int64 numpy chunks, never holding more than
+# one block_size slice of the file (mmap'd) plus its parsed ids
+#   for ids in reader: ...   # afterwards, reader.offset / reader.line mark the end of ids
+# Resume by passing a saved byte offset, or a line number (found by counting newlines)
+# With both, the offset is where reading starts and the line only numbers what follows
+class IdFileReader:
+
+    def __init__(self, path, block_size=16 * 1024 * 1024, offset=0, line=None):
+        self.path = path
+        self.block_size = block_size
+        self.offset = offset  # bytes consumed so far, always at a line start
+        self.line = line if not (line is None) else 0  # lines consumed so far, when known
+        self.__line_known = (offset == 0) or not (line is None)
+        self.__start_line = line if offset == 0 else None
+
+    def __iter__(self):
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if not (self.__start_line is None):
+                    self.offset = self.__seek_line(mm, self.__start_line)
+                    self.__start_line = None
+                logger.debug('reading ids from %s at byte %s', self.path, self.offset)
+                while self.offset < size:
+                    end = min(self.offset + self.block_size, size)
+                    if end < size:
+                        newline = mm.rfind(b'\n', self.offset, end)
+                        if newline == -1:
+                            # a single line longer than block_size
+                            newline = mm.find(b'\n', end)
+                            end = size if newline == -1 else newline + 1
+                        else:
+                            end = newline + 1
+                    block = mm[self.offset:end]
+                    ids = self.parse(block)
+                    self.offset = end
+                    if self.__line_known:
+                        self.line += block.count(b'\n') + (0 if block.endswith(b'\n') else 1)
+                    if len(ids) > 0:
+                        yield ids
+
+    def __seek_line(self, mm, line):
+        offset = 0
+        remaining = line
+        while remaining > 0 and offset < len(mm):
+            block = mm[offset:offset + self.block_size]
+            count = block.count(b'\n')
+            if count < remaining:
+                remaining -= count
+                offset += len(block)
+                continue
+            pos = -1
+            for i in range(0, remaining):
+                pos = block.index(b'\n', pos + 1)
+            return offset + pos + 1
+        return min(offset, len(mm))
+
+    @staticmethod
+    def parse(block):
+        if len(block.strip()) == 0:
+            return np.empty(0, dtype=np.int64)
+        table = csv.read_csv(
+            io.BytesIO(block),
+            read_options=csv.ReadOptions(column_names=['id']),
+            convert_options=csv.ConvertOptions(column_types={'id': 'int64'}))
+        return table.column('id').to_numpy().astype(np.int64)
+
+
+# Regroups a stream of id arrays into int64 arrays of exactly block_len ids (the last may be shorter)
+def rechunk_ids(id_chunks, block_len):
+    pending = []
+    pending_len = 0
+    for chunk in id_chunks:
+        chunk = np.asarray(chunk, dtype=np.int64)
+        while len(chunk) > 0:
+            take = chunk[:block_len - pending_len]
+            chunk = chunk[len(take):]
+            pending.append(take)
+            pending_len += len(take)
+            if pending_len == block_len:
+                yield pending[0] if len(pending) == 1 else np.concatenate(pending)
+                pending = []
+                pending_len = 0
+    if pending_len > 0:
+        yield np.concatenate(pending)
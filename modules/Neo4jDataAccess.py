@@ -6,11 +6,13 @@ import re
 import enum
 
 from datetime import datetime
+import numpy as np
 import pandas as pd
-from neo4j import GraphDatabase, basic_auth
 from yurl import URL
 import logging
 from .DfHelper import DfHelper
+from .Neo4jDriverPool import Neo4jDriverPool
+from .StatusType import neo4j_tweet_types
 from .TwintPool import TwintPool
 
 logger = logging.getLogger('Neo4jDataAccess')
@@ -181,6 +183,12 @@ class Neo4jDataAccess:
                     RETURN tweet.id, tweet.hydrated
         """
 
+        self.fetch_tweet_ids_hydrated = """UNWIND $ids AS i
+                    MATCH (tweet:Tweet {id:i})
+                    WHERE tweet.hydrated = 'FULL'
+                    RETURN tweet.id AS id
+        """
+
         self.fetch_tweet = """UNWIND $ids AS i
                     MATCH (tweet:Tweet {id:i.id})
                     RETURN tweet
@@ -192,22 +200,9 @@ class Neo4jDataAccess:
         """
 
     def __get_neo4j_graph(self, role_type):
-        creds = None
         logging.debug('role_type: %s', role_type)
-        if not (self.creds is None):
-            creds = self.creds
-        else:
-            with open('/secrets/neo4jcreds.json') as json_file:
-                creds = json.load(json_file)
-        res = list(filter(lambda c: c["type"] == role_type, creds))
-        if len(res):
-            logging.debug("creds %s", res)
-            creds = res[0]["creds"]
-            uri = f'bolt://{creds["host"]}:{creds["port"]}'
-            self.graph = GraphDatabase.driver(
-                uri, auth=basic_auth(creds['user'], creds['password']), encrypted=False)
-        else:
-            self.graph = None
+        creds = self.creds if not (self.creds is None) else Neo4jDriverPool.load_creds()
+        self.graph = Neo4jDriverPool.get_driver(role_type, creds)
         return self.graph
 
     def get_neo4j_graph(self, role_type: RoleType):
@@ -282,6 +277,12 @@ class Neo4jDataAccess:
         logging.info('Saving to Neo4j')
         self.__save_df_to_graph(pdf, job_name)
 
+    # Same as save_parquet_df_to_graph, normalizing and saving one batch of at most max_rows at a time
+    def save_parquet_batches_to_graph(self, batches, job_name: str, job_id=None, max_rows=None):
+        for pdf in DfHelper().normalize_parquet_batches(batches, max_rows=max_rows):
+            logging.info('Saving %s rows to Neo4j', len(pdf))
+            self.__save_df_to_graph(pdf, job_name)
+
     # Get the status of a DataFrame of Tweets by id.  Returns a dataframe with the hydrated status
     def get_tweet_hydrated_status_by_id(self, df: pd.DataFrame):
         df = df.assign(id=df['id'].astype('int64'))
@@ -307,6 +308,19 @@ class Neo4jDataAccess:
             raise Exception(
                 'Parameter df must be a DataFrame with a column named "id" ')
 
+    # Get the subset of ids whose tweets are already fully hydrated, as an int64 array
+    # Sends bare ids and only returns matches, so it suits large (50k+) id blocks
+    def get_fully_hydrated_tweet_ids(self, ids):
+        ids = np.asarray(ids, dtype='int64')
+        if len(ids) == 0:
+            return ids
+        graph = self.__get_neo4j_graph('reader')
+        with graph.session() as session:
+            result = session.run(self.fetch_tweet_ids_hydrated, ids=ids.tolist())
+            hydrated = np.array([record['id'] for record in result], dtype='int64')
+        logging.debug('%s of %s ids already hydrated', len(hydrated), len(ids))
+        return hydrated
+
     # Get the status of a DataFrame of Tweets by id.  Returns a dataframe with the hydrated status
 
     # Get the status of a DataFrame of Account by id.  Returns a dataframe with the hydrated status
@@ -341,17 +355,8 @@ class Neo4jDataAccess:
         url_params = []
         tic = time.perf_counter()
         logging.debug('df columns %s', df.columns)
-        for index, row in df.iterrows():
-            # determine the type of tweet
-            tweet_type = 'TWEET'
-            if row['tweet_type_twint']:
-                tweet_type = row['tweet_type_twint']
-            elif row["in_reply_to_status_id"] is not None and row["in_reply_to_status_id"] > 0:
-                tweet_type = "REPLY"
-            elif "quoted_status_id" in row and row["quoted_status_id"] is not None and row["quoted_status_id"] > 0:
-                tweet_type = "QUOTE_RETWEET"
-            elif "retweet_id" in row and row["retweet_id"] is not None and row["retweet_id"] > 0:
-                tweet_type = "RETWEET"
+        tweet_types = neo4j_tweet_types(df)
+        for (index, row), tweet_type in zip(df.iterrows(), tweet_types):
             try:
                 params.append({'tweet_id': row['status_id'],
                                'text': row['full_text'],
@@ -486,61 +491,13 @@ class Neo4jDataAccess:
         df.drop(df.columns[df.columns.str.contains('unnamed', case=False)], axis=1, inplace=True)
         # df=df.stack().droplevel(level=0)
         global_tic = time.perf_counter()
-        params = []
         tic = time.perf_counter()
         logger.debug('df columns %s', df.columns)
 
         itertic = time.perf_counter()
-        for index, row in df.iterrows():
-            # determine the type of tweet
-            tweet_type = 'TWEET'
-            if row['tweet_type_twint']:
-                tweet_type = row['tweet_type_twint']
-            elif row["in_reply_to_status_id"] is not None and row["in_reply_to_status_id"] > 0:
-                tweet_type = "REPLY"
-            elif "quoted_status_id" in row and row["quoted_status_id"] is not None and row["quoted_status_id"] > 0:
-                tweet_type = "QUOTE_RETWEET"
-            elif "retweet_id" in row and row["retweet_id"] is not None and row["retweet_id"] > 0:
-                tweet_type = "RETWEET"
-            try:
-                params.append(pd.DataFrame([{'tweet_id': int(row['status_id']),
-                                             'text': row['full_text'],
-                                             'created_at': str(pd.to_datetime(row['created_at'])),
-                                             'favorite_count': row['favorite_count'],
-                                             'retweet_count': row['retweet_count'],
-                                             'type': tweet_type,
-                                             'job_id': job_id,
-                                             'job_name': job_name,
-                                             'hashtags': self.__normalize_hashtags(row['hashtags']),
-                                             'user_id': row['user_id'],
-                                             'user_name': row['user_name'],
-                                             'user_location': row['user_location'] if 'user_location' in row else None,
-                                             'user_screen_name': row['user_screen_name'],
-                                             'user_followers_count': row[
-                                                 'user_followers_count'] if 'user_followers_count' in row else None,
-                                             'user_friends_count': row[
-                                                 'user_friends_count'] if 'user_friends_count' in row else None,
-                                             'user_created_at': pd.to_datetime(
-                                                 df['user_created_at']) if 'user_created_at' in row else None,
-                                             'user_profile_image_url': row[
-                                                 'user_profile_image_url'] if 'user_profile_image_url' in row else None,
-                                             'reply_tweet_id': row[
-                                                 'in_reply_to_status_id'] if 'in_reply_to_status_id' in row else None,
-                                             'conversation_id': row[
-                                                 'conversation_id'] if 'conversation_id' in row else None,
-                                             'quoted_status_id': row[
-                                                 'quoted_status_id'] if 'quoted_status_id' in row else None,
-                                             'retweet_id': row['retweet_id'] if 'retweet_id' in row else None,
-                                             'geo': row['geo'] if 'geo' in row else None,
-                                             }]))
-
-            except Exception as e:
-                logger.error('params.append exn', e)
-                logger.error('row', row)
-                raise e
+        params_df = self.__twintdf_to_params_df(df, job_name, job_id)
         itertoc = time.perf_counter()
-        logger.info(f'finished iterating twint df and determining tweet type  {itertoc - itertic:0.4f} seconds')
-
+        logger.info(f'finished building twint tweet params and determining tweet type  {itertoc - itertic:0.4f} seconds')
 
         urltic = time.perf_counter()
         url_df = self.__urldf_to_neodf(self.__parse_urls_twint(df, job_name, job_id))
@@ -561,7 +518,6 @@ class Neo4jDataAccess:
         logger.info(f'finished parsing mentions in:  {menttoc - menttic:0.4f} seconds')
 
         #paramstic = time.perf_counter()
-        params_df = pd.concat(params, ignore_index=True, sort=False)
         params_df["hydrated"] = "PARTIAL"
         #params_df = pd.concat([params_df,acct_df], axis=1, ignore_index=False, sort=False)
         #paramstoc = time.perf_counter()
@@ -584,6 +540,47 @@ class Neo4jDataAccess:
         else:
             return None
 
+    # Same output as str(pd.to_datetime(v)) per value
+    def __datetimes_to_str(self, series):
+        ts = pd.to_datetime(series)
+        if ts.dt.tz is not None:
+            return ts.map(str).to_numpy(dtype=object)
+        out = ts.dt.strftime('%Y-%m-%d %H:%M:%S')
+        micros = ts.dt.microsecond.fillna(0).astype('int64')
+        has_micros = micros > 0
+        if has_micros.any():
+            out = out.where(~has_micros, out + '.' + micros.astype(str).str.zfill(6))
+        return out.fillna('NaT').to_numpy(dtype=object)
+
+    def __twintdf_to_params_df(self, df, job_name, job_id=None):
+        def col(name):
+            return df[name].to_numpy() if name in df else None
+
+        return pd.DataFrame({
+            'tweet_id': df['status_id'].astype('int64').to_numpy(),
+            'text': col('full_text'),
+            'created_at': self.__datetimes_to_str(df['created_at']),
+            'favorite_count': col('favorite_count'),
+            'retweet_count': col('retweet_count'),
+            'type': neo4j_tweet_types(df),
+            'job_id': job_id,
+            'job_name': job_name,
+            'hashtags': pd.Series([self.__normalize_hashtags(v) for v in df['hashtags'].to_numpy()], dtype='object'),
+            'user_id': col('user_id'),
+            'user_name': col('user_name'),
+            'user_location': col('user_location'),
+            'user_screen_name': col('user_screen_name'),
+            'user_followers_count': col('user_followers_count'),
+            'user_friends_count': col('user_friends_count'),
+            'user_created_at': pd.to_datetime(df['user_created_at']).to_numpy() if 'user_created_at' in df else None,
+            'user_profile_image_url': col('user_profile_image_url'),
+            'reply_tweet_id': col('in_reply_to_status_id'),
+            'conversation_id': col('conversation_id'),
+            'quoted_status_id': col('quoted_status_id'),
+            'retweet_id': col('retweet_id'),
+            'geo': col('geo'),
+        }, index=pd.RangeIndex(len(df)))
+
     def __parse_urls_twint(self, df, job_name, job_id):
         counter = 0
         url_params_lst = []
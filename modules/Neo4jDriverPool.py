@@ -0,0 +1,90 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+
+from neo4j import GraphDatabase, basic_auth
+import logging
+
+logger = logging.getLogger('Neo4jDriverPool')
+
+DEFAULT_CREDS_PATH = '/secrets/neo4jcreds.json'
+
+
+# Process-wide neo4j drivers, one per (role, host, port, user, password)
+# Each driver owns a bolt connection pool, so Neo4jDataAccess instances are cheap to create
+class Neo4jDriverPool:
+
+    # Only affect drivers created afterwards
+    max_connection_pool_size = 50
+    connection_acquisition_timeout = 60  # seconds
+
+    _lock = threading.RLock()
+    _drivers = {}
+    _creds_files = {}
+    _pid = os.getpid()
+
+    @classmethod
+    def load_creds(cls, path=DEFAULT_CREDS_PATH):
+        with cls._lock:
+            if not (path in cls._creds_files):
+                with open(path) as json_file:
+                    cls._creds_files[path] = json.load(json_file)
+            return cls._creds_files[path]
+
+    @classmethod
+    def get_driver(cls, role_type, creds=None):
+        if creds is None:
+            creds = cls.load_creds()
+        res = [c for c in creds if c['type'] == role_type]
+        if len(res) == 0:
+            logger.debug('no neo4j creds for role_type %s', role_type)
+            return None
+        role_creds = res[0]['creds']
+        key = (
+            role_type, role_creds['host'], str(role_creds['port']), role_creds['user'],
+            hashlib.sha256(role_creds['password'].encode('utf-8')).hexdigest()
+        )
+        with cls._lock:
+            cls.__check_pid()
+            if not (key in cls._drivers):
+                uri = f'bolt://{role_creds["host"]}:{role_creds["port"]}'
+                logger.debug('creating neo4j driver for %s (%s)', uri, role_type)
+                cls._drivers[key] = GraphDatabase.driver(
+                    uri,
+                    auth=basic_auth(role_creds['user'], role_creds['password']),
+                    encrypted=False,
+                    max_connection_pool_size=cls.max_connection_pool_size,
+                    connection_acquisition_timeout=cls.connection_acquisition_timeout)
+            return cls._drivers[key]
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            cls.__check_pid()
+            drivers = list(cls._drivers.values())
+            cls._drivers = {}
+        for driver in drivers:
+            try:
+                driver.close()
+            except Exception as e:
+                logger.warning('Failed closing neo4j driver: %s', e)
+
+    # Sockets inherited over fork() belong to the parent (Prefect/Dask workers), so a child
+    # forgets them without closing and lazily reconnects
+    @classmethod
+    def _reset_after_fork(cls):
+        cls._lock = threading.RLock()
+        cls._drivers = {}
+        cls._pid = os.getpid()
+
+    @classmethod
+    def __check_pid(cls):
+        if cls._pid != os.getpid():
+            cls._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=Neo4jDriverPool._reset_after_fork)
+atexit.register(Neo4jDriverPool.close)
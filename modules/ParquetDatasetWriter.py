@@ -0,0 +1,122 @@
+from collections import OrderedDict
+import datetime, fcntl, os, uuid
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .Snowflake import creation_time_ms
+
+import logging
+logger = logging.getLogger('ParquetDatasetWriter')
+
+HOUR_MS = 60 * 60 * 1000
+
+
+# Hive-partitioned parquet dataset, bucketed by tweet creation hour (from the snowflake id):
+#   <root>/job=<job>/year=<yyyy>/month=<mm>/day=<dd>/hour=<hh>/part-<uuid>.parquet
+# Every writer opens fresh uniquely named part files, so runs never clobber each other.
+# At most max_open_files partitions stay open; the least recently written one is closed first.
+# Files are fsynced as they close, and close() merges the footers of everything written
+# into <root>/job=<job>/_metadata, under an exclusive lock on _metadata.lock so writers
+# of the same job in other threads or processes never drop each other's row groups
+class ParquetDatasetWriter:
+
+    def __init__(self, root, job_name, schema, compression='SNAPPY', max_open_files=16, id_col='id'):
+        self.root = root
+        self.job_name = job_name
+        self.job_folder = os.path.join(root, 'job=%s' % job_name)
+        self.schema = schema
+        self.compression = compression
+        self.max_open_files = max_open_files
+        self.id_col = id_col
+        self.files = []
+        self.__open = OrderedDict()  # partition folder -> (ParquetWriter, path)
+        self.__metadata = []
+
+    def partition_folder(self, hour_bucket):
+        dt = datetime.datetime.utcfromtimestamp(hour_bucket * HOUR_MS / 1000)
+        return os.path.join(
+            self.job_folder,
+            'year=%04d' % dt.year, 'month=%02d' % dt.month, 'day=%02d' % dt.day, 'hour=%02d' % dt.hour)
+
+    # Returns paths of any part files opened by this write
+    def write_table(self, table, row_group_size=None):
+        if table.num_rows == 0:
+            return []
+        ids = table.column(self.id_col).to_numpy().astype(np.int64)
+        hour_buckets = creation_time_ms(ids) // HOUR_MS
+        buckets, inverse = np.unique(hour_buckets, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        splits = np.cumsum(np.bincount(inverse, minlength=len(buckets)))[:-1]
+        new_files = []
+        for bucket, rows in zip(buckets, np.split(order, splits)):
+            part = table if len(buckets) == 1 else table.take(pa.array(rows))
+            writer, _path = self.__get_writer(self.partition_folder(int(bucket)), new_files)
+            writer.write_table(part, row_group_size=row_group_size)
+        return new_files
+
+    def __get_writer(self, folder, new_files):
+        if folder in self.__open:
+            self.__open.move_to_end(folder)
+            return self.__open[folder]
+        while len(self.__open) >= self.max_open_files:
+            lru_folder, lru = self.__open.popitem(last=False)
+            logger.debug('closing least recently written partition %s', lru_folder)
+            self.__close_writer(*lru)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, 'part-%s.parquet' % uuid.uuid4().hex)
+        logger.debug('Creating parquet writer: %s', path)
+        writer = pq.ParquetWriter(path, schema=self.schema, compression=self.compression)
+        self.__open[folder] = (writer, path)
+        self.files.append(path)
+        new_files.append(path)
+        return self.__open[folder]
+
+    def __fsync(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __close_writer(self, writer, path):
+        writer.close()
+        self.__fsync(path)
+        metadata = pq.read_metadata(path)
+        metadata.set_file_path(os.path.relpath(path, self.job_folder))
+        self.__metadata.append(metadata)
+
+    def close(self):
+        while len(self.__open) > 0:
+            folder, (writer, path) = self.__open.popitem(last=False)
+            self.__close_writer(writer, path)
+        if len(self.__metadata) > 0:
+            self.__write_summary()
+        self.__metadata = []
+
+    # Appends this writer's row groups to the job's _metadata summary file
+    def __write_summary(self):
+        os.makedirs(self.job_folder, exist_ok=True)
+        with open(os.path.join(self.job_folder, '_metadata.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.__merge_summary()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def __merge_summary(self):
+        summary_path = os.path.join(self.job_folder, '_metadata')
+        collected = self.__metadata
+        if os.path.exists(summary_path):
+            collected = [pq.read_metadata(summary_path)] + collected
+        summary = collected[0]
+        try:
+            for metadata in collected[1:]:
+                summary.append_row_groups(metadata)
+        except Exception as e:
+            logger.error('Could not merge %s, schema changed? Leaving it as is: %s', summary_path, e)
+            return
+        tmp_path = '%s.%s.tmp' % (summary_path, uuid.uuid4().hex)
+        summary.write_metadata_file(tmp_path)
+        self.__fsync(tmp_path)
+        os.replace(tmp_path, summary_path)
@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+import json, os, sqlite3, threading, time
+import pandas as pd
+from twint.token import RefreshTokenException
+from twint.user import SuspendedUser
+
+import logging
+logger = logging.getLogger('ProfileEnricher')
+
+DAY_S = 24 * 60 * 60
+
+
+# Profile rows by username, with when they were fetched; found=0 marks users twint had no profile for
+# (suspended, renamed, deleted), so those are not retried until their shorter TTL runs out
+# path=':memory:' keeps one connection for this process; files get a connection per call like
+# CheckpointStore, so one file can be shared with it across threads and forked workers on one host
+# shared() is one in-memory cache for every job of this process without a cache file
+class ProfileCache:
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    QUERY_CHUNK = 500  # usernames per SELECT, under SQLite's bound variable limit
+
+    def __init__(self, path=':memory:', timeout_s=60):
+        self.path = path
+        self.timeout_s = timeout_s
+        self.lock = threading.Lock()
+        self.conn = None
+        if path == ':memory:':
+            self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        else:
+            folder = os.path.dirname(path)
+            if folder != '':
+                os.makedirs(folder, exist_ok=True)
+        with self.__transaction() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS profiles (
+                    username TEXT, found INTEGER, profile TEXT, fetched_at REAL,
+                    PRIMARY KEY (username))""")
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    # A forked child must not use the parent's sqlite connection, so it starts a cache of its own
+    @classmethod
+    def _reset_after_fork(cls):
+        cls._shared_lock = threading.Lock()
+        cls._shared = None
+
+    @contextmanager
+    def __connection(self):
+        if self.conn is None:
+            with closing(sqlite3.connect(self.path, timeout=self.timeout_s, isolation_level=None)) as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                yield conn
+        else:
+            with self.lock:
+                yield self.conn
+
+    @contextmanager
+    def __transaction(self):
+        with self.__connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+
+    # usernames -> {username: profile dict, or None when known missing}, for entries newer than their TTL
+    def get_many(self, usernames, ttl_s, negative_ttl_s):
+        now = time.time()
+        out = {}
+        usernames = list(usernames)
+        with self.__transaction() as conn:
+            for start in range(0, len(usernames), self.QUERY_CHUNK):
+                chunk = usernames[start:start + self.QUERY_CHUNK]
+                rows = conn.execute(
+                    'SELECT username, found, profile, fetched_at FROM profiles WHERE username IN (%s)'
+                    % ','.join('?' * len(chunk)), chunk).fetchall()
+                for username, found, profile, fetched_at in rows:
+                    if found and fetched_at >= now - ttl_s:
+                        out[username] = json.loads(profile)
+                    elif not found and fetched_at >= now - negative_ttl_s:
+                        out[username] = None
+        return out
+
+    # {username: profile dict, or None for missing}
+    def put_many(self, profiles):
+        now = time.time()
+        with self.__transaction() as conn:
+            conn.executemany('INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)', [
+                (username, 0 if profile is None else 1, None if profile is None else json.dumps(profile), now)
+                for username, profile in profiles.items()
+            ])
+
+
+# Looks up twint profiles for usernames, max_workers at a time, skipping ones a ProfileCache saw
+# within ttl_days (negative_ttl_days for missing users)
+# Lookups that fail for other reasons are not cached, so the next call retries them
+# Without cache_path, every enricher of this process shares ProfileCache.shared(); ':memory:' keeps one private
+class ProfileEnricher:
+
+    def __init__(self, cache_path=None, ttl_days=7, negative_ttl_days=1, max_workers=4):
+        self.cache = ProfileCache.shared() if cache_path is None else ProfileCache(cache_path)
+        self.ttl_s = ttl_days * DAY_S
+        self.negative_ttl_s = negative_ttl_days * DAY_S
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.counters = {'requested': 0, 'hits': 0, 'negative_hits': 0, 'fetched': 0, 'missing': 0, 'errors': 0}
+
+    def __count(self, **deltas):
+        with self.lock:
+            for k, v in deltas.items():
+                self.counters[k] += v
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        cached = stats['hits'] + stats['negative_hits']
+        stats['hit_rate'] = cached / stats['requested'] if stats['requested'] > 0 else None
+        return stats
+
+    # username -> profile dict, None when twint has none, or raises
+    @staticmethod
+    def lookup(tp, username):
+        try:
+            df = tp._get_user_info(username=username)
+        except SuspendedUser:
+            logger.info('User %s is suspended', username)
+            return None
+        if df is None or len(df) == 0:
+            return None
+        return json.loads(df.iloc[:1].to_json(orient='records'))[0]
+
+    def __fetch(self, tp, username):
+        try:
+            return username, self.lookup(tp, username)
+        except RefreshTokenException as e:
+            raise e
+        except Exception:
+            logger.error('Error getting user info for %s, retrying on a later call', username, exc_info=True)
+            return username, False
+
+    # Profiles of usernames that were not cached, as one frame, or None when there are none
+    def enrich(self, usernames, tp):
+        usernames = list(dict.fromkeys(usernames))
+        cached = self.cache.get_many(usernames, self.ttl_s, self.negative_ttl_s)
+        todo = [username for username in usernames if not (username in cached)]
+        negative_hits = sum([1 for profile in cached.values() if profile is None])
+        self.__count(requested=len(usernames), hits=len(cached) - negative_hits, negative_hits=negative_hits)
+
+        fetched = {}
+        if len(todo) > 0:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(todo))) as pool:
+                for username, profile in pool.map(lambda username: self.__fetch(tp, username), todo):
+                    if not (profile is False):
+                        fetched[username] = profile
+            self.cache.put_many(fetched)
+        found = [profile for profile in fetched.values() if not (profile is None)]
+        self.__count(
+            fetched=len(found), missing=len(fetched) - len(found), errors=len(todo) - len(fetched))
+
+        logger.debug('profiles: %s cached, %s fetched, %s missing, %s errors (%s)',
+            len(cached), len(found), len(fetched) - len(found), len(todo) - len(fetched), self.stats())
+        if len(found) == 0:
+            return None
+        return pd.DataFrame(found).drop_duplicates(subset=['id'])
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ProfileCache._reset_after_fork)
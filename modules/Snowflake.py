@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+# Twitter snowflake ids: 41 bits ms since SNOWFLAKE_EPOCH | 10 bits machine | 12 bits sequence
+SNOWFLAKE_EPOCH = 1288834974657
+TIMESTAMP_SHIFT = 22
+MACHINE_SHIFT = 12
+MACHINE_MASK = 0b1111111111
+SEQUENCE_MASK = 0b111111111111
+
+# Decoders work on python ints and int64 arrays alike
+
+
+def creation_time_ms(ids):
+    return (ids >> TIMESTAMP_SHIFT) + SNOWFLAKE_EPOCH
+
+
+def machine_id(ids):
+    return (ids >> MACHINE_SHIFT) & MACHINE_MASK
+
+
+def sequence_id(ids):
+    return ids & SEQUENCE_MASK
+
+
+# id, created_at_ms, machine_id, sequence_id columns
+def decode(ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    return pd.DataFrame({
+        'id': ids,
+        'created_at_ms': creation_time_ms(ids),
+        'machine_id': machine_id(ids),
+        'sequence_id': sequence_id(ids)
+    })
+
+
+# All ids for ms timestamps [begin_ms, end_ms), ordered by time, then machine, then sequence
+def generate_ids(begin_ms, end_ms, machine_ids, sequence_ids=(0, )):
+    times = (np.arange(begin_ms, end_ms, dtype=np.int64) - SNOWFLAKE_EPOCH) << TIMESTAMP_SHIFT
+    machines = np.asarray(machine_ids, dtype=np.int64) << MACHINE_SHIFT
+    sequences = np.asarray(sequence_ids, dtype=np.int64)
+    return (times[:, None, None] | machines[None, :, None] | sequences[None, None, :]).ravel()
+
+
+# generate_ids over [begin_ms, end_ms) as arrays of about block_size ids, whole milliseconds each
+def generate_id_blocks(begin_ms, end_ms, machine_ids, sequence_ids=(0, ), block_size=1 << 20):
+    ids_per_ms = len(machine_ids) * len(sequence_ids)
+    if ids_per_ms == 0:
+        return
+    ms_per_block = max(1, block_size // ids_per_ms)
+    for t in range(begin_ms, end_ms, ms_per_block):
+        yield generate_ids(t, min(t + ms_per_block, end_ms), machine_ids, sequence_ids)
@@ -0,0 +1,160 @@
+import threading
+import numpy as np
+
+from . import Snowflake
+
+import logging
+logger = logging.getLogger('SnowflakeProber')
+
+HOUR_MS = 60 * 60 * 1000
+DAY_HOURS = 24
+NUM_MACHINES = Snowflake.MACHINE_MASK + 1
+
+
+# Learns which (machine id, sequence) slots actually mint tweets at each hour of day (UTC),
+# and plans id probes for a time range so the hydration budget goes to the likeliest ids first
+#
+# Each (hour, machine, sequence) slot keeps hits / probes, where a probe is one millisecond
+# of that slot being tried. Scores are smoothed toward prior_rate, so slots never seen rank
+# below ones known to be productive but above ones known to be empty.
+class SnowflakeProber:
+
+    def __init__(self, max_sequence=16, prior_rate=1e-4, prior_weight=100.0):
+        self.max_sequence = max_sequence
+        self.prior_rate = prior_rate
+        self.prior_weight = prior_weight
+        self.hits = np.zeros((DAY_HOURS, NUM_MACHINES, max_sequence), dtype=np.float64)
+        self.probes = np.zeros((DAY_HOURS, NUM_MACHINES, max_sequence), dtype=np.float64)
+        self.probed = 0
+        self.found = 0
+        self.lock = threading.Lock()  # probes and hits arrive from different hydration threads
+
+    def __slots_of(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        seq = Snowflake.sequence_id(ids)
+        keep = seq < self.max_sequence
+        ids = ids[keep]
+        hours = (Snowflake.creation_time_ms(ids) // HOUR_MS) % DAY_HOURS
+        return hours, Snowflake.machine_id(ids), seq[keep]
+
+    # ms of [begin_ms, end_ms) falling in each hour of day
+    @staticmethod
+    def hour_exposure(begin_ms, end_ms):
+        exposure = np.zeros(DAY_HOURS, dtype=np.float64)
+        t = begin_ms
+        while t < end_ms:
+            next_hour = (t // HOUR_MS + 1) * HOUR_MS
+            exposure[(t // HOUR_MS) % DAY_HOURS] += min(next_hour, end_ms) - t
+            t = next_hour
+        return exposure
+
+    # Learn from a complete set of known ids over [begin_ms, end_ms), e.g. previously hydrated ones:
+    # every slot counts as probed on every ms of the span
+    def learn(self, ids, begin_ms=None, end_ms=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        times = Snowflake.creation_time_ms(ids)
+        begin_ms = int(times.min()) if begin_ms is None else begin_ms
+        end_ms = int(times.max()) + 1 if end_ms is None else end_ms
+        with self.lock:
+            self.probes += self.hour_exposure(begin_ms, end_ms)[:, None, None]
+            np.add.at(self.hits, self.__slots_of(ids), 1)
+
+    # Record live probing: ids sent for hydration, and the ones that came back
+    def observe(self, probed_ids=(), hit_ids=()):
+        probed_ids = np.asarray(probed_ids, dtype=np.int64)
+        hit_ids = np.asarray(hit_ids, dtype=np.int64)
+        with self.lock:
+            np.add.at(self.probes, self.__slots_of(probed_ids), 1)
+            np.add.at(self.hits, self.__slots_of(hit_ids), 1)
+            self.probed += len(probed_ids)
+            self.found += len(hit_ids)
+
+    @property
+    def hit_rate(self):
+        return self.found / self.probed if self.probed > 0 else 0.0
+
+    def stats(self):
+        return {'probed': self.probed, 'hits': self.found, 'hit_rate': self.hit_rate}
+
+    # Expected hits per ms, by (hour, machine, sequence)
+    def scores(self):
+        with self.lock:
+            return (self.hits + self.prior_rate * self.prior_weight) / (self.probes + self.prior_weight)
+
+    # Candidate slots active in [begin_ms, end_ms), best first:
+    #   (hour, machine, sequence, expected hits per ms) arrays
+    def ranked_slots(self, begin_ms, end_ms):
+        exposure = self.hour_exposure(begin_ms, end_ms)
+        hours = np.flatnonzero(exposure)
+        scores = self.scores()[hours]
+        order = np.argsort(-scores, axis=None, kind='stable')
+        h, m, s = np.unravel_index(order, scores.shape)
+        return hours[h], m, s, scores.ravel()[order]
+
+    # [lo, hi) ms spans of [begin_ms, end_ms) falling in hour of day hour, one per calendar hour
+    @staticmethod
+    def hour_spans(begin_ms, end_ms, hour):
+        first = begin_ms // HOUR_MS
+        first += (hour - first) % DAY_HOURS
+        for h in range(first, (end_ms - 1) // HOUR_MS + 1, DAY_HOURS):
+            yield max(h * HOUR_MS, begin_ms), min((h + 1) * HOUR_MS, end_ms)
+
+    # Ids to probe over [begin_ms, end_ms), at most budget of them, in blocks of block_size,
+    # highest expected yield first
+    # Ids are generated a block at a time, so memory stays bounded by block_size however long the range
+    def plan_blocks(self, begin_ms, end_ms, budget=None, block_size=1 << 16):
+        hours, machines, sequences, scores = self.ranked_slots(begin_ms, end_ms)
+        remaining = np.inf if budget is None else budget
+        pending = []
+        pending_len = 0
+        for hour, machine, sequence in zip(hours, machines, sequences):
+            slot = np.int64((int(machine) << Snowflake.MACHINE_SHIFT) | int(sequence))
+            for lo, hi in self.hour_spans(begin_ms, end_ms, int(hour)):
+                while lo < hi:
+                    if remaining <= 0:
+                        if pending_len > 0:
+                            yield np.concatenate(pending)
+                        return
+                    n = int(min(hi - lo, block_size - pending_len, remaining))
+                    ids = ((np.arange(lo, lo + n, dtype=np.int64) - Snowflake.SNOWFLAKE_EPOCH)
+                           << Snowflake.TIMESTAMP_SHIFT) | slot
+                    lo += n
+                    remaining -= n
+                    pending.append(ids)
+                    pending_len += n
+                    if pending_len >= block_size:
+                        yield np.concatenate(pending)
+                        pending = []
+                        pending_len = 0
+        if pending_len > 0:
+            yield np.concatenate(pending)
+
+
+# Fixed enumeration as ingest_range did it: every ms x machine_ids x sequence_ids, in time order
+def fixed_plan_blocks(begin_ms, end_ms, machine_ids, sequence_ids=(0, ), budget=None, block_size=1 << 16):
+    remaining = np.inf if budget is None else budget
+    for ids in Snowflake.generate_id_blocks(begin_ms, end_ms, machine_ids, sequence_ids, block_size):
+        if remaining <= 0:
+            return
+        if len(ids) > remaining:
+            ids = ids[:int(remaining)]
+        remaining -= len(ids)
+        yield ids
+
+
+# Replays a probe plan against a recorded set of ids that really exist, without any api calls:
+#   replay(prober.plan_blocks(t0, t1, budget), recorded_ids, prober) -> {'probed', 'hits', 'hit_rate'}
+# With a prober, it also learns from the outcome as live hydration would
+def replay(plan_blocks, recorded_ids, prober=None):
+    recorded_ids = np.unique(np.asarray(recorded_ids, dtype=np.int64))
+    probed = 0
+    hits = 0
+    for ids in plan_blocks:
+        found = ids[np.isin(ids, recorded_ids, assume_unique=True)]
+        probed += len(ids)
+        hits += len(found)
+        if not (prober is None):
+            prober.observe(ids, found)
+    return {'probed': probed, 'hits': hits, 'hit_rate': hits / probed if probed > 0 else 0.0}
@@ -0,0 +1,117 @@
+import queue, threading
+
+import logging
+logger = logging.getLogger('StagePipeline')
+
+_STOP = object()
+POLL_S = 0.1
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+# Runs a source iterator and a chain of stages each on a thread of their own, linked by bounded queues,
+# so item N + 1 is produced while item N is further down the chain:
+#   stages: [(name, fn(item) -> item)], each seeing items in source order
+#   timer: optional Timer, ticked per item as '<name>' for each stage and for the source
+# Yields what comes out of the last stage, in source order. Throughput follows the slowest stage, and a
+# full queue blocks the stage feeding it, so at most queue_size items wait between two stages.
+# The first failure stops every stage and is re-raised by the generator; closing the generator early
+# stops them too, and the source iterator is closed on its own thread.
+class StagePipeline:
+
+    def __init__(self, source, stages, queue_size=2, timer=None, source_name='source'):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.timer = timer
+        self.source_name = source_name
+        self.stopped = threading.Event()
+
+    def __tic(self, name):
+        if not (self.timer is None):
+            self.timer.tic(name, 20, 10)
+
+    def __toc(self, name):
+        if not (self.timer is None):
+            self.timer.toc(name)
+
+    # False when the pipeline stopped before item could be handed on
+    def __put(self, q, item):
+        while not self.stopped.is_set():
+            try:
+                q.put(item, timeout=POLL_S)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __get(self, q):
+        while not self.stopped.is_set():
+            try:
+                return q.get(timeout=POLL_S)
+            except queue.Empty:
+                pass
+        return _STOP
+
+    def __run_source(self, out):
+        items = iter(self.source)
+        try:
+            while True:
+                self.__tic(self.source_name)
+                item = next(items, _STOP)
+                if item is _STOP:
+                    break
+                self.__toc(self.source_name)
+                if not self.__put(out, item):
+                    break
+        except Exception as e:
+            logger.error('Stage %s failed', self.source_name, exc_info=True)
+            item = _Failed(e)
+        finally:
+            close = getattr(items, 'close', None)
+            if not (close is None):
+                close()
+        self.__put(out, item)
+
+    def __run_stage(self, name, fn, inp, out):
+        while True:
+            item = self.__get(inp)
+            if item is _STOP or isinstance(item, _Failed):
+                break
+            try:
+                self.__tic(name)
+                item = fn(item)
+                self.__toc(name)
+            except Exception as e:
+                logger.error('Stage %s failed', name, exc_info=True)
+                item = _Failed(e)
+                break
+            if not self.__put(out, item):
+                return
+        self.__put(out, item)
+
+    def __iter__(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for i in range(len(self.stages) + 1)]
+        threads = [threading.Thread(
+            target=self.__run_source, args=(queues[0], ), name='stage_%s' % self.source_name, daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self.__run_stage, args=(name, fn, queues[i], queues[i + 1]), name='stage_%s' % name,
+                daemon=True))
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = self.__get(queues[-1])
+                if item is _STOP:
+                    return
+                if isinstance(item, _Failed):
+                    raise item.error
+                yield item
+        finally:
+            self.stopped.set()
+            for t in threads:
+                t.join()
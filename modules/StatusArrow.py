@@ -1,4 +1,5 @@
 import pyarrow as pa
+import simplejson as json  # nan serialization, same as FirehoseJob.clean_series
 
 ### When dtype -> arrow ambiguious, override
 KNOWN_FIELDS = [
@@ -47,3 +48,222 @@ KNOWN_FIELDS = [
 
 
 
+### Schema v2 (opt-in): hot nested fields as arrow structs/lists instead of json strings,
+### so readers can project e.g. user.id or entities.hashtags and parquet dictionary-encodes
+### the nested leaves. Fields a tweet carries beyond these are dropped.
+
+INDICES_T = pa.list_(pa.int64())
+
+USER_T = pa.struct([
+    ('id', pa.int64()),
+    ('id_str', pa.string()),
+    ('name', pa.string()),
+    ('screen_name', pa.string()),
+    ('location', pa.string()),
+    ('description', pa.string()),
+    ('url', pa.string()),
+    ('protected', pa.bool_()),
+    ('verified', pa.bool_()),
+    ('followers_count', pa.int64()),
+    ('friends_count', pa.int64()),
+    ('listed_count', pa.int64()),
+    ('favourites_count', pa.int64()),
+    ('statuses_count', pa.int64()),
+    ('created_at', pa.string()),
+    ('utc_offset', pa.int64()),
+    ('time_zone', pa.string()),
+    ('lang', pa.string()),
+    ('profile_image_url', pa.string()),
+    ('profile_image_url_https', pa.string())
+])
+
+HASHTAG_T = pa.struct([('text', pa.string()), ('indices', INDICES_T)])
+
+ENTITIES_T = pa.struct([
+    ('hashtags', pa.list_(HASHTAG_T)),
+    ('symbols', pa.list_(HASHTAG_T)),
+    ('user_mentions', pa.list_(pa.struct([
+        ('id', pa.int64()),
+        ('id_str', pa.string()),
+        ('screen_name', pa.string()),
+        ('name', pa.string()),
+        ('indices', INDICES_T)
+    ]))),
+    ('urls', pa.list_(pa.struct([
+        ('url', pa.string()),
+        ('expanded_url', pa.string()),
+        ('display_url', pa.string()),
+        ('indices', INDICES_T)
+    ])))
+])
+
+# sizes left out: the struct-of-structs is what made the parquet writer barf
+EXTENDED_ENTITIES_T = pa.struct([
+    ('media', pa.list_(pa.struct([
+        ('id', pa.int64()),
+        ('id_str', pa.string()),
+        ('type', pa.string()),
+        ('url', pa.string()),
+        ('display_url', pa.string()),
+        ('expanded_url', pa.string()),
+        ('media_url', pa.string()),
+        ('media_url_https', pa.string()),
+        ('ext_alt_text', pa.string()),
+        ('source_status_id', pa.int64()),
+        ('source_status_id_str', pa.string()),
+        ('source_user_id', pa.int64()),
+        ('source_user_id_str', pa.string()),
+        ('indices', INDICES_T)
+    ])))
+])
+
+# retweeted_status / quoted_status: one level deep, enough to flatten and link them
+EMBEDDED_STATUS_T = pa.struct([
+    ('id', pa.int64()),
+    ('id_str', pa.string()),
+    ('created_at', pa.string()),
+    ('full_text', pa.string()),
+    ('lang', pa.string()),
+    ('in_reply_to_status_id', pa.int64()),
+    ('in_reply_to_user_id', pa.int64()),
+    ('is_quote_status', pa.bool_()),
+    ('quoted_status_id', pa.int64()),
+    ('retweet_count', pa.int64()),
+    ('favorite_count', pa.int64()),
+    ('user', USER_T),
+    ('entities', ENTITIES_T)
+])
+
+KNOWN_FIELDS_V2_TYPES = {
+    'display_text_range': INDICES_T,
+    'user': USER_T,
+    'entities': ENTITIES_T,
+    'extended_entities': EXTENDED_ENTITIES_T,
+    'retweeted_status': EMBEDDED_STATUS_T,
+    'quoted_status': EMBEDDED_STATUS_T,
+    'withheld_in_countries': pa.list_(pa.string())
+}
+
+KNOWN_FIELDS_V2 = [
+    [i, name, KNOWN_FIELDS_V2_TYPES.get(name, t)]
+    for (i, name, t) in KNOWN_FIELDS
+]
+
+SCHEMA_VERSIONS = {1: KNOWN_FIELDS, 2: KNOWN_FIELDS_V2}
+
+
+def known_fields(schema_version=1):
+    if not (schema_version in SCHEMA_VERSIONS):
+        raise ValueError(f'unknown schema_version: {schema_version}')
+    return SCHEMA_VERSIONS[schema_version]
+
+
+### Arrow-native conversion of raw tweet dicts, mirroring FirehoseJob.clean_df + clean_series
+
+# serialized with json.dumps instead of str()
+JSON_FIELDS = frozenset([
+    'display_text_range', 'extended_entities', 'scopes', 'followers', 'withheld_in_countries',
+    'user', 'entities', 'retweeted_status', 'quoted_status'
+])
+
+# missing/None -> 0
+ZERO_FILLED_FIELDS = frozenset(['quoted_status_id', 'in_reply_to_status_id', 'in_reply_to_user_id'])
+
+_MISSING = object()
+
+# same output as json.dumps(v, ignore_nan=True), without building an encoder per value
+_json_encode = json.JSONEncoder(ignore_nan=True).encode
+
+
+def is_nested(arrow_type):
+    return pa.types.is_struct(arrow_type) or pa.types.is_list(arrow_type)
+
+
+# Tolerant value -> python value of arrow_type: unknown struct keys are dropped, missing ones
+# are null, and values of the wrong kind are cast when obvious ('12' -> 12, 12 -> '12',
+# dict -> json string) or nulled otherwise, so one odd tweet never fails a batch
+def coerce_value(v, arrow_type):
+    if v is None or v is _MISSING or (type(v) == float and v != v):
+        return None
+    if pa.types.is_struct(arrow_type):
+        if type(v) == str:
+            try:
+                v = json.loads(v)
+            except:
+                return None
+        if not isinstance(v, dict):
+            return None
+        return {
+            field.name: coerce_value(v.get(field.name), field.type)
+            for field in arrow_type
+        }
+    if pa.types.is_list(arrow_type):
+        if type(v) == str:
+            try:
+                v = json.loads(v)
+            except:
+                return None
+        if not isinstance(v, (list, tuple)):
+            return None
+        return [coerce_value(x, arrow_type.value_type) for x in v]
+    if pa.types.is_string(arrow_type):
+        if isinstance(v, (dict, list)):
+            return _json_encode(v)
+        return str(v)
+    if pa.types.is_boolean(arrow_type):
+        if type(v) == str:
+            return v.lower() == 'true'
+        return bool(v)
+    if pa.types.is_integer(arrow_type):
+        try:
+            return int(v)
+        except:
+            return None
+    if pa.types.is_floating(arrow_type):
+        try:
+            return float(v)
+        except:
+            return None
+    return v
+
+
+def _field_to_pylist(name, arrow_type, values):
+    if is_nested(arrow_type):
+        return [coerce_value(v, arrow_type) for v in values]
+    if name in JSON_FIELDS:
+        return ['null' if (v is _MISSING or v is None) else _json_encode(v) for v in values]
+    if name == 'contributors':
+        return [None if (v is _MISSING or v is None) else _json_encode(v) for v in values]
+    if name == 'possibly_sensitive':
+        return [False if (v is _MISSING or v is None) else bool(v) for v in values]
+    if name in ZERO_FILLED_FIELDS:
+        return [0 if (v is _MISSING or v is None) else int(v) for v in values]
+    if pa.types.is_string(arrow_type):
+        # pandas fills keys missing from some tweets with nan before str coercion
+        return ['nan' if v is _MISSING else str(v) for v in values]
+    if pa.types.is_boolean(arrow_type):
+        return [None if (v is _MISSING or v is None) else bool(v) for v in values]
+    return [None if (v is _MISSING or v is None) else v for v in values]
+
+
+def tweets_to_record_batch(tweets, schema, defaults={}, drop_cols=[]):
+    n = len(tweets)
+    arrays = []
+    for field in schema:
+        name = field.name
+        values = None
+        if not (name in drop_cols):
+            values = [t.get(name, _MISSING) for t in tweets]
+            if values.count(_MISSING) == n:
+                values = None
+        if values is None:
+            # like clean_df, absent columns take their EXPECTED_COLS default
+            default = defaults.get(name, None)
+            if name == 'contributors':
+                values = [None] * n
+            elif pa.types.is_boolean(field.type) and default is None:
+                values = [False] * n  # pd.Series([None], dtype=bool)
+            else:
+                values = [default] * n
+        arrays.append(pa.array(_field_to_pylist(name, field.type, values), type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
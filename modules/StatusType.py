@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# Columnar tweet classification shared by DfHelper, pipelines/Pipeline, TwintPool and Neo4jDataAccess
+# Each classifier is one np.select over boolean masks, listed in precedence order, and matches
+# the per-row if/elif chain it replaced: missing columns and None / nan / non-numeric ids never match
+
+
+# Elementwise bool(v), e.g. nan -> True, None / '' / 0 -> False
+def truthy(values):
+    values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+    return values.astype(bool)
+
+
+# Elementwise v > 0 for numeric-looking v
+def positive(values):
+    values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+    if values.dtype.kind in 'iuf':
+        return values > 0  # nan > 0 is False
+    return (pd.to_numeric(pd.Series(values), errors='coerce').fillna(0) > 0).to_numpy()
+
+
+# Elementwise a == b, comparing as python objects unless both sides are numeric
+def equal(a, b):
+    a = a.to_numpy() if isinstance(a, pd.Series) else np.asarray(a)
+    b = b.to_numpy() if isinstance(b, pd.Series) else np.asarray(b)
+    if a.dtype.kind in 'iuf' and b.dtype.kind in 'iuf':
+        return a == b
+    return a.astype(object) == b.astype(object)
+
+
+def _column(df, col, fn):
+    if col not in df:
+        return np.zeros(len(df), dtype=bool)
+    return fn(df[col])
+
+
+# rules: [(mask, label)] best first -> object array of labels, default where no mask matches
+# Labels may be scalars or per-row arrays
+def classify(rules, default):
+    return np.select(
+        [mask for mask, label in rules],
+        [np.asarray(label, dtype=object) for mask, label in rules],
+        default=np.asarray(default, dtype=object))
+
+
+# Parquet / twarc statuses -> status_type:
+#   is_quote_status > retweeted > in_reply_to_status_id > 0 > 'original'
+def parquet_status_types(df):
+    return classify([
+        (_column(df, 'is_quote_status', truthy), 'retweet_quote'),
+        (_column(df, 'retweeted', truthy), 'retweet'),
+        (_column(df, 'in_reply_to_status_id', positive), 'reply')
+    ], 'original')
+
+
+# Twint tweets -> tweet_type_twint:
+#   missing quote_url > retweet > id == conversation_id > 'REPLY'
+# Note the quote test is inverted upstream (no quote_url means QUOTE_RETWEET); kept as-is
+def twint_tweet_types(df):
+    quote_url = df['quote_url'].to_numpy(dtype=object)
+    return classify([
+        ((quote_url == None) | (quote_url == ''), 'QUOTE_RETWEET'),
+        (_column(df, 'retweet', truthy), 'RETWEET'),
+        (equal(df['id'], df['conversation_id']), 'TWEET')
+    ], 'REPLY')
+
+
+# Neo4j tweet nodes -> type:
+#   tweet_type_twint (if truthy) > REPLY > QUOTE_RETWEET > RETWEET > 'TWEET'
+def neo4j_tweet_types(df):
+    return classify([
+        (truthy(df['tweet_type_twint']), df['tweet_type_twint'].to_numpy(dtype=object)),
+        (_column(df, 'in_reply_to_status_id', positive), 'REPLY'),
+        (_column(df, 'quoted_status_id', positive), 'QUOTE_RETWEET'),
+        (_column(df, 'retweet_id', positive), 'RETWEET')
+    ], 'TWEET')
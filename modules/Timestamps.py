@@ -0,0 +1,124 @@
+import time
+import numpy as np
+import pandas as pd
+
+from . import Snowflake
+
+# Tweet timestamps as int64 epoch ms, with NAT_MS for missing values (datetime64's NaT when viewed as one):
+#   twitter api strings, e.g. 'Wed Oct 10 20:19:24 +0000 2018'
+#   twint epoch ms numbers
+#   snowflake ids, to fill in statuses lacking a created_at
+# Twitter strings are fixed width, so they are parsed as a character matrix in numpy rather than
+# by pd.to_datetime, which falls back to dateutil per row without a format and is still slow with one
+TWITTER_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+NAT_MS = np.iinfo(np.int64).min
+QUARTER_HOUR_MS = 15 * 60 * 1000
+
+BLOCK_LEN = 1 << 16  # rows per character matrix
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+MONTH_KEYS = np.array([(ord(m[0]) << 16) | (ord(m[1]) << 8) | ord(m[2]) for m in MONTHS], dtype=np.int64)
+MONTH_ORDER = np.argsort(MONTH_KEYS)
+
+# 'Www Mmm dd HH:MM:SS +hhmm YYYY' character positions
+TWITTER_LEN = 30
+SPACES = [3, 7, 10, 19, 25]
+COLONS = [13, 16]
+
+
+def _parse_twitter_block(values):
+    chars = values.astype('U%s' % (TWITTER_LEN + 1)).view(np.uint32).reshape(len(values), TWITTER_LEN + 1)
+    ok = (chars[:, TWITTER_LEN] == 0) & (chars[:, TWITTER_LEN - 1] != 0)
+    for pos in SPACES:
+        ok &= chars[:, pos] == ord(' ')
+    for pos in COLONS:
+        ok &= chars[:, pos] == ord(':')
+    ok &= (chars[:, 20] == ord('+')) | (chars[:, 20] == ord('-'))
+
+    def number(first, last):
+        out = np.zeros(len(chars), dtype=np.int64)
+        for pos in range(first, last + 1):
+            digit = chars[:, pos].astype(np.int64) - ord('0')
+            ok[:] &= (digit >= 0) & (digit <= 9)
+            out = out * 10 + digit
+        return out
+
+    keys = (chars[:, 4].astype(np.int64) << 16) | (chars[:, 5].astype(np.int64) << 8) | chars[:, 6]
+    month = MONTH_ORDER[np.minimum(np.searchsorted(MONTH_KEYS[MONTH_ORDER], keys), len(MONTHS) - 1)]
+    year = number(26, 29)
+    day = number(8, 9)
+    hour = number(11, 12)
+    minute = number(14, 15)
+    second = number(17, 18)
+    offset_min = np.where(chars[:, 20] == ord('-'), -1, 1) * (number(21, 22) * 60 + number(23, 24))
+    ok &= (MONTH_KEYS[month] == keys) & (day >= 1) & (day <= 31) & (hour < 24) & (minute < 60) & (second < 61) \
+        & (year >= 1970)
+    days = ((np.where(ok, year, 1970) - 1970) * 12 + month).astype('datetime64[M]').astype('datetime64[D]')\
+        .astype(np.int64) + day - 1
+    ms = (((days * 24 + hour) * 60 + minute - offset_min) * 60 + second) * 1000
+    return np.where(ok, ms, NAT_MS)
+
+
+# Strings in TWITTER_FORMAT -> epoch ms; others (e.g. ISO) are parsed once per distinct value by pandas
+def twitter_epoch_ms(values):
+    values = np.asarray(values, dtype=object)
+    out = np.full(len(values), NAT_MS, dtype=np.int64)
+    present = np.flatnonzero(~pd.isna(values))
+    for start in range(0, len(present), BLOCK_LEN):
+        rows = present[start:start + BLOCK_LEN]
+        out[rows] = _parse_twitter_block(values[rows])
+    rest = present[out[present] == NAT_MS]
+    if len(rest) > 0:
+        parsed = pd.to_datetime(pd.Series(values[rest]), utc=True, errors='coerce', cache=True)
+        out[rest] = datetimes_to_epoch_ms(parsed)
+    return out
+
+
+# datetime64 values, tz-aware or naive UTC -> epoch ms
+def datetimes_to_epoch_ms(values):
+    values = pd.Series(values)
+    if not (values.dt.tz is None):
+        values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+    ns = values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return np.where(values.isna().to_numpy(), NAT_MS, ns // 1000000)
+
+
+def snowflake_epoch_ms(ids):
+    ids = pd.to_numeric(pd.Series(ids), errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    return np.where(ids > 0, Snowflake.creation_time_ms(ids), NAT_MS)
+
+
+# created_at column in any of the supported forms -> epoch ms, taking missing ones from snowflake ids
+def created_at_epoch_ms(created_at, ids=None):
+    created_at = pd.Series(created_at)
+    if pd.api.types.is_datetime64_any_dtype(created_at.dtype):
+        out = datetimes_to_epoch_ms(created_at)
+    elif pd.api.types.is_numeric_dtype(created_at.dtype) and not pd.api.types.is_bool_dtype(created_at.dtype):
+        out = np.where(created_at.isna().to_numpy(), NAT_MS, created_at.fillna(0).to_numpy(dtype=np.int64))
+    else:
+        out = twitter_epoch_ms(created_at.to_numpy(dtype=object))
+    if not (ids is None):
+        missing = out == NAT_MS
+        if missing.any():
+            out[missing] = snowflake_epoch_ms(np.asarray(ids, dtype=object)[missing])
+    return out
+
+
+def epoch_ms_to_datetimes(ms, tz='UTC'):
+    out = pd.Series(np.asarray(ms, dtype=np.int64).view('datetime64[ms]')).astype('datetime64[ns]')
+    return out if tz is None else out.dt.tz_localize(tz)
+
+
+# Naive wall-clock times in this process's time zone, as datetime.fromtimestamp(ms / 1000) gives
+# Zones only change offset on quarter hours, so time.localtime is asked once per distinct quarter hour
+def epoch_ms_to_local_datetimes(ms):
+    ms = np.asarray(ms, dtype=np.int64)
+    missing = ms == NAT_MS
+    quarters, inverse = np.unique(np.where(missing, 0, ms) // QUARTER_HOUR_MS, return_inverse=True)
+    offsets_ms = np.array(
+        [time.localtime(q * QUARTER_HOUR_MS // 1000).tm_gmtoff * 1000 for q in quarters], dtype=np.int64)
+    return epoch_ms_to_datetimes(np.where(missing, NAT_MS, ms + offsets_ms[inverse]), tz=None)
+
+
+def epoch_ms_to_seconds(ms):
+    ms = np.asarray(ms, dtype=np.int64)
+    return np.where(ms == NAT_MS, np.nan, ms / 1000.0)
@@ -1,11 +1,137 @@
+import queue, threading, time
+
+import logging
+logger = logging.getLogger('TwarcPool')
+
+_DONE = object()
+
+
+# Per-credential request budget, refilled continuously over the rate limit window
+# statuses/lookup allows 900 requests / 15 min per user token
+class TokenBucket:
+
+    def __init__(self, capacity=900, window_s=15 * 60, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = capacity
+        self.refill_per_s = capacity / window_s
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.last = clock()
+        self.lock = threading.Lock()
+
+    def __refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.refill_per_s)
+        self.last = now
+
+    # Blocks until a request may be sent, returns seconds spent waiting
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.__refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_s = (1 - self.tokens) / self.refill_per_s
+            logger.debug('rate limit budget spent, waiting %ss', wait_s)
+            self.sleep(wait_s)
+            waited += wait_s
+
+
 class TwarcPool:
 
-    def __init__(self, pool):
+    def __init__(self, pool, requests_per_window=900, window_s=15 * 60, clock=time.monotonic, sleep=time.sleep):
         self.pool = pool
         self.last_idx = 0
-        
+        self.buckets = [
+            TokenBucket(requests_per_window, window_s, clock=clock, sleep=sleep)
+            for t in pool
+        ]
+
     def next_twarc(self):
         idx = (self.last_idx + 1) % len(self.pool)
         self.last_idx = idx
         t = self.pool[ idx ]
-        return t
\ No newline at end of file
+        return t
+
+    # Hydrates ids with every credential at once: one worker per client pulls lookup_size id
+    # requests from a shared queue, pacing itself with that client's token bucket
+    # Tweets are yielded as requests complete, so order follows completion, not input
+    def hydrate(self, ids, lookup_size=100, queue_size=None):
+        if len(self.pool) == 0:
+            raise ValueError('TwarcPool.hydrate needs at least one twarc credential')
+        if queue_size is None:
+            queue_size = 2 * len(self.pool)
+        requests = queue.Queue(maxsize=queue_size)
+        results = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+
+        # Blocking put that gives up once the consumer went away
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def feed():
+            try:
+                chunk = []
+                for id in ids:
+                    chunk.append(id)
+                    if len(chunk) == lookup_size:
+                        if not put(requests, chunk):
+                            return
+                        chunk = []
+                if len(chunk) > 0:
+                    put(requests, chunk)
+            except Exception as e:
+                logger.error('Failed reading ids to hydrate', exc_info=True)
+                put(results, e)
+            finally:
+                for t in self.pool:
+                    put(requests, _DONE)
+
+        def work(twarc, bucket):
+            try:
+                while not stop.is_set():
+                    try:
+                        chunk = requests.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if chunk is _DONE:
+                        return
+                    bucket.acquire()
+                    if not put(results, list(twarc.hydrate(chunk))):
+                        return
+            except Exception as e:
+                logger.error('Failed hydrating', exc_info=True)
+                put(results, e)
+            finally:
+                put(results, _DONE)
+
+        threads = [threading.Thread(target=feed, name='twarc_feed', daemon=True)] + [
+            threading.Thread(target=work, args=(twarc, bucket), name='twarc_%s' % i, daemon=True)
+            for i, (twarc, bucket) in enumerate(zip(self.pool, self.buckets))
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            running = len(self.pool)
+            while running > 0:
+                item = results.get()
+                if item is _DONE:
+                    running -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    for tweet in item:
+                        yield tweet
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
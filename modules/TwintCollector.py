@@ -0,0 +1,204 @@
+import threading, time
+import pyarrow as pa
+
+from .StatusArrow import coerce_value
+
+### Per-call sinks for twint results, replacing the twint.storage.panda globals
+### twint appends tweets / users to config.Store_object_tweets_list / Store_object_users_list
+### when config.Store_object is set; a TwintCollector there turns each into a row of the same
+### columns twint.storage.panda would have made, and packs rows into arrow record batches as
+### they fill, so neither twint objects nor python rows pile up over a long search
+
+REPLY_TO_T = pa.list_(pa.struct([('screen_name', pa.string()), ('name', pa.string()), ('id', pa.string())]))
+
+TWEET_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('conversation_id', pa.string()),
+    ('created_at', pa.int64()),  # epoch ms
+    ('date', pa.string()),
+    ('timezone', pa.string()),
+    ('place', pa.string()),
+    ('tweet', pa.string()),
+    ('hashtags', pa.list_(pa.string())),
+    ('cashtags', pa.list_(pa.string())),
+    ('user_id', pa.int64()),
+    ('user_id_str', pa.string()),
+    ('username', pa.string()),
+    ('name', pa.string()),
+    ('day', pa.int64()),  # 1 = Monday
+    ('hour', pa.string()),
+    ('link', pa.string()),
+    ('retweet', pa.bool_()),
+    ('nlikes', pa.int64()),
+    ('nreplies', pa.int64()),
+    ('nretweets', pa.int64()),
+    ('quote_url', pa.string()),
+    ('search', pa.string()),
+    ('near', pa.string()),
+    ('geo', pa.string()),
+    ('source', pa.string()),
+    ('user_rt_id', pa.string()),
+    ('user_rt', pa.string()),
+    ('retweet_id', pa.string()),
+    ('reply_to', REPLY_TO_T),
+    ('retweet_date', pa.string()),
+    ('translate', pa.string()),
+    ('trans_src', pa.string()),
+    ('trans_dest', pa.string())
+])
+
+USER_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('name', pa.string()),
+    ('username', pa.string()),
+    ('bio', pa.string()),
+    ('url', pa.string()),
+    ('join_datetime', pa.string()),
+    ('join_date', pa.string()),
+    ('join_time', pa.string()),
+    ('tweets', pa.int64()),
+    ('location', pa.string()),
+    ('following', pa.int64()),
+    ('followers', pa.int64()),
+    ('likes', pa.int64()),
+    ('media', pa.int64()),
+    ('private', pa.bool_()),
+    ('verified', pa.bool_()),
+    ('avatar', pa.string()),
+    ('background_image', pa.string())
+])
+
+
+# twint.tweet.tweet -> row as twint.storage.panda.Tweets_df has it
+def tweet_row(tweet, config):
+    local_time = time.localtime(tweet.datetime / 1000)
+    return {
+        "id": str(tweet.id),
+        "conversation_id": tweet.conversation_id,
+        "created_at": tweet.datetime,
+        "date": f"{tweet.datestamp} {tweet.timestamp}",
+        "timezone": tweet.timezone,
+        "place": tweet.place,
+        "tweet": tweet.tweet,
+        "hashtags": tweet.hashtags,
+        "cashtags": tweet.cashtags,
+        "user_id": tweet.user_id,
+        "user_id_str": tweet.user_id_str,
+        "username": tweet.username,
+        "name": tweet.name,
+        "day": int(time.strftime("%u", local_time)),
+        "hour": time.strftime("%H", local_time),
+        "link": tweet.link,
+        "retweet": tweet.retweet,
+        "nlikes": tweet.likes_count,
+        "nreplies": tweet.replies_count,
+        "nretweets": tweet.retweets_count,
+        "quote_url": tweet.quote_url,
+        "search": str(config.Search),
+        "near": tweet.near,
+        "geo": tweet.geo,
+        "source": tweet.source,
+        "user_rt_id": tweet.user_rt_id,
+        "user_rt": tweet.user_rt,
+        "retweet_id": tweet.retweet_id,
+        "reply_to": tweet.reply_to,
+        "retweet_date": tweet.retweet_date,
+        "translate": tweet.translate,
+        "trans_src": tweet.trans_src,
+        "trans_dest": tweet.trans_dest
+    }
+
+
+# twint.user.user -> row as twint.storage.panda.User_df has it
+def user_row(user, config=None):
+    return {
+        "id": user.id,
+        "name": user.name,
+        "username": user.username,
+        "bio": user.bio,
+        "url": user.url,
+        "join_datetime": user.join_date + " " + user.join_time,
+        "join_date": user.join_date,
+        "join_time": user.join_time,
+        "tweets": user.tweets,
+        "location": user.location,
+        "following": user.following,
+        "followers": user.followers,
+        "likes": user.likes,
+        "media": user.media_count,
+        "private": user.is_private,
+        "verified": user.is_verified,
+        "avatar": user.avatar,
+        "background_image": user.background_image
+    }
+
+
+# Values of a column as arrow_type: as-is when they already fit, else each coerced like StatusArrow does,
+# so one odd object never fails a batch
+def _column(values, arrow_type):
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, OverflowError):
+        return pa.array([coerce_value(v, arrow_type) for v in values], type=arrow_type)
+
+
+# List-like stand-in for a twint Store_object_*_list: twint only calls append()
+class TwintCollector:
+
+    def __init__(self, schema, to_row, config=None, batch_rows=1000):
+        self.schema = schema
+        self.to_row = to_row
+        self.config = config
+        self.batch_rows = batch_rows
+        self.rows = []
+        self.batches = []
+        self.count = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def tweets(cls, config, batch_rows=1000):
+        return cls(TWEET_SCHEMA, tweet_row, config, batch_rows)
+
+    @classmethod
+    def users(cls, config=None, batch_rows=1000):
+        return cls(USER_SCHEMA, user_row, config, batch_rows)
+
+    def append(self, obj):
+        row = self.to_row(obj, self.config)
+        with self.lock:
+            self.rows.append(row)
+            self.count += 1
+            if len(self.rows) >= self.batch_rows:
+                self.__flush()
+
+    def __len__(self):
+        return self.count
+
+    def __flush(self):
+        if len(self.rows) == 0:
+            return
+        rows, self.rows = self.rows, []
+        self.batches.append(pa.RecordBatch.from_arrays(
+            [_column([row.get(field.name) for row in rows], field.type) for field in self.schema],
+            schema=self.schema))
+
+    def to_arrow(self):
+        with self.lock:
+            self.__flush()
+            return pa.Table.from_batches(self.batches, schema=self.schema)
+
+    def to_df(self):
+        return self.to_arrow().to_pandas()
+
+    # Point config's twint object stores at this collector, off the twint.storage.panda globals
+    def attach(self, config):
+        config.Pandas = False
+        config.Pandas_clean = False
+        config.Pandas_au = False
+        config.Store_object = True
+        if self.schema is USER_SCHEMA:
+            config.Store_object_follow_list = None  # twint checks it before the users list
+            config.Store_object_users_list = self
+        else:
+            config.Store_object_tweets_list = self
+        return config
@@ -1,3 +1,6 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import copy, itertools, threading
 import pyarrow as pa
 import twint
 from urlextract import URLExtract
@@ -9,6 +12,10 @@ import time
 from twint.token import RefreshTokenException
 from twint.run import Profile
 
+from . import Timestamps
+from .TwintCollector import TwintCollector
+from .StatusType import twint_tweet_types
+
 logger = logging.getLogger()
 
 extractor = URLExtract()
@@ -38,6 +45,14 @@ def reset_config(config, is_tor=False):
     return config
 
 
+# twint.run.Search that collects into a TwintCollector of its own instead of the twint.storage.panda
+# globals, so searches on separate configs can run side by side
+def search_window(config):
+    collector = TwintCollector.tweets(config)
+    twint.run.Search(collector.attach(config))
+    return collector.to_df()
+
+
 class TwintPool:
 
     is_tor = False
@@ -49,7 +64,20 @@ class TwintPool:
     def reset_config(self, is_tor=None):
         self.config = reset_config(self.config, is_tor if is_tor is not None else self.is_tor)
 
-    def twint_loop(self, since, until, stride_sec=600, limit=None):
+    # Searches [since, until) in stride_sec windows, concurrency of them at a time, and yields
+    # (df, t0, t1) for windows with hits, in time order, stopping once limit tweets came back
+    # Each window runs on its own copy of self.config, collecting into its own list (see search_window)
+    #   proxies: [(host, port, type)] for windows to take turns on, default this pool's proxy
+    #   per_proxy: most windows in flight on one proxy at a time
+    #   search_fn(config) -> df: replaces search_window, e.g. for testing
+    #   stride: an AdaptiveStride sizing windows as results come in, in place of stride_sec; windows
+    #           it splits are searched again as halves before anything later is yielded
+    # skip_window(t0, t1) -> bool: windows to not search, e.g. finished in an earlier run
+    # covered: [(t0, t1)] time ranges to not search, e.g. CheckpointStore.completed_ranges; unlike skip_window
+    #          these need not line up with this run's windows, as adaptive ones differ from run to run
+    # window_done(t0, t1): called for searched windows without hits, which are never yielded
+    def twint_loop(self, since, until, stride_sec=600, limit=None, skip_window=None, window_done=None,
+                   concurrency=1, per_proxy=None, proxies=None, search_fn=None, stride=None, covered=None):
         def get_unix_time(time_str):
             if isinstance(time_str, datetime):
                 return time_str
@@ -57,28 +85,92 @@ class TwintPool:
 
         since = get_unix_time(since)
         until = get_unix_time(until)
-        t = since
+        covered = [(get_unix_time(c0), get_unix_time(c1)) for c0, c1 in (covered or [])]
+        search_fn = search_fn or search_window
+        if proxies is None:
+            proxies = [(self.config.Proxy_host, self.config.Proxy_port, self.config.Proxy_type)]
+        proxy_slots = [threading.Semaphore(per_proxy or concurrency) for proxy in proxies]
+
+        logger.info('Start twint_loop', extra={
+            'since': since, 'until': until, 'stride_sec': stride_sec, 'limit': limit, 'concurrency': concurrency})
+
+        # windows are planned as they are submitted, so an adaptive stride applies from the next one on,
+        # resuming after covered ranges and ending where the next one starts
+        def plan():
+            t = since
+            while t < until:
+                done = [c1 for c0, c1 in covered if c0 <= t < c1]
+                if len(done) > 0:
+                    logger.info('Skipping completed search range: %s-%s', t, max(done))
+                    t = max(done)
+                    continue
+                if stride is None:
+                    t1 = t + timedelta(seconds=stride_sec)
+                else:
+                    t1 = min(until, t + timedelta(seconds=stride.stride_sec))
+                t1 = min([t1] + [c0 for c0, c1 in covered if t < c0 < t1])
+                if not (skip_window is None) and skip_window(t, t1):
+                    logger.info('Skipping completed search step: %s-%s', t, t1)
+                else:
+                    yield (t, t1)
+                t = t1
+
+        searches = itertools.count()
+
+        def search(t0, t1):
+            proxy = next(searches) % len(proxies)
+            with proxy_slots[proxy]:
+                config = copy.copy(self.config)
+                config.Proxy_host, config.Proxy_port, config.Proxy_type = proxies[proxy]
+                config.Since = str(t0)
+                config.Until = str(t1)
+                logger.info('Search step: %s-%s', t0, t1)
+                return search_fn(config)
+
         tweets_returned = 0
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        pending = deque()
+        todo = plan()
 
-        logger.info('Start twint_loop', extra={'since': since, 'until': until, 'stride_sec': stride_sec, 'limit': limit})
-        while t < until and (not tweets_returned or tweets_returned < limit):
-            t0 = t
-            t1 = t + timedelta(seconds=stride_sec)
-            self.config.Since = str(t0)
-            self.config.Until = str(t1)
-            logger.info('Search step: %s-%s', t0, t1)
-            twint.run.Search(self.config)
-            tweets_returned += len(twint.storage.panda.Tweets_df)
-            if len(twint.storage.panda.Tweets_df) > 0:
-                logger.info('Search hit, len %s', len(twint.storage.panda.Tweets_df))
-                yield (twint.storage.panda.Tweets_df, t0, t1)
-            else:
-                logger.debug('not hits on %s - %s, continuing', t0, t1)
-            t = t1
+        def submit():
+            for t0, t1 in todo:
+                pending.append((pool.submit(search, t0, t1), t0, t1, False))
+                return
+
+        try:
+            for _ in range(concurrency):
+                submit()
+            while len(pending) > 0 and (limit is None or tweets_returned < limit):
+                future, t0, t1, half = pending.popleft()
+                df = future.result()
+                if not (stride is None):
+                    window_sec = (t1 - t0).total_seconds()
+                    if stride.should_split(len(df), window_sec, half):
+                        mid = t0 + timedelta(seconds=int(window_sec // 2))
+                        logger.info('Window %s-%s hit %s tweets, splitting at %s', t0, t1, len(df), mid)
+                        pending.appendleft((pool.submit(search, mid, t1), mid, t1, True))
+                        pending.appendleft((pool.submit(search, t0, mid), t0, mid, True))
+                        continue
+                    stride.observe(len(df), window_sec, half)
+                submit()
+                tweets_returned += len(df)
+                if len(df) > 0:
+                    logger.info('Search hit, len %s', len(df))
+                    yield (df, t0, t1)
+                else:
+                    logger.debug('not hits on %s - %s, continuing', t0, t1)
+                    if not (window_done is None):
+                        window_done(t0, t1)
+        finally:
+            # shutdown(cancel_futures=True) needs python 3.9
+            for future, t0, t1, half in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
         logger.info('twint_loop done, hits: %s', tweets_returned)
 
     def _get_term(self, Search="IngSoc", Since="1984-04-20 13:00:00", Until="1984-04-20 13:30:00", stride_sec=600,
-                  **kwargs):
+                  skip_window=None, window_done=None, concurrency=1, per_proxy=None, proxies=None, search_fn=None,
+                  stride=None, covered=None, **kwargs):
         tic = time.perf_counter()
         self.config.Search = Search
         self.config.Retweets = True
@@ -86,30 +178,36 @@ class TwintPool:
             setattr(self.config, k, v)
         # self.config.Search = term
         logger.info('Start get_term: %s-%s of %s', Search, Since, Until)
-        for df, t0, t1 in self.twint_loop(Since, Until, stride_sec, self.config.Limit):
+        # Limit caps each search; with a stride, that is what windows are split against rather than a total
+        limit = self.config.Limit if stride is None else None
+        for df, t0, t1 in self.twint_loop(Since, Until, stride_sec, limit, skip_window, window_done,
+                                          concurrency, per_proxy, proxies, search_fn, stride, covered):
             yield (df, t0, t1)
         toc = time.perf_counter()
         logger.info(f'finished get_term searching for tweets in:  {toc - tic:0.4f} seconds')
 
+    # Timeline and user lookups run on a copy of self.config collecting into a TwintCollector of their own,
+    # so results never carry over between calls (see search_window) and calls can run side by side
     def _get_timeline(self, username):
         #self.config.Retweets = True
         #self.config.Search = "from:" + username
         #self.config.Limit = limit
         #twint.run.Search(self.config)
-        self.config.Username = username
-        self.config.Pandas = True
-        twint.run.Profile(self.config)
-        tweets_df = twint.storage.panda.Tweets_df
-        return tweets_df
+        config = copy.copy(self.config)
+        config.Username = username
+        collector = TwintCollector.tweets(config)
+        twint.run.Profile(collector.attach(config))
+        return collector.to_df()
 
 
     def _get_user_info(self, username, ignore_errors=False):
-        self.config.User_full = True
-        self.config.Username = username
-        self.config.Pandas = True
+        config = copy.copy(self.config)
+        config.User_full = True
+        config.Username = username
+        collector = TwintCollector.users(config)
         try:
-            twint.run.Lookup(self.config)
-            return twint.storage.panda.User_df
+            twint.run.Lookup(collector.attach(config))
+            return collector.to_df()
         except RefreshTokenException as e:
             raise e
         except Exception as e:
@@ -118,7 +216,8 @@ class TwintPool:
                 return None
             raise e
 
-    def check_hydrate(self, df):
+    # hydrated_ids: optional HydratedIdCache; ids it knows are FULL skip the neo4j lookup
+    def check_hydrate(self, df, hydrated_ids=None):
 
         df = df.assign(id=df['id'].astype('int64'))
 
@@ -127,15 +226,23 @@ class TwintPool:
             logger.warning('Deduplicating input tweet df had duplicates, %s -> %s', len(df), len(df2))
         df = df2
 
+        if not (hydrated_ids is None):
+            df2 = df[~hydrated_ids.contains(df['id'].values)]
+            logger.info('Hydrate check: %s of %s ids known hydrated locally', len(df) - len(df2), len(df))
+            df = df2
+            if len(df) == 0:
+                return df
+
         from .Neo4jDataAccess import Neo4jDataAccess
-        neo4j_creds = None
-        with open('/secrets/neo4jcreds.json') as json_file:
-            neo4j_creds = json.load(json_file)
+        from .Neo4jDriverPool import Neo4jDriverPool
+        neo4j_creds = Neo4jDriverPool.load_creds()
 
         # dft : df[[id:int64, hydrated: NaN | 'FULL' | 'PARTIAL'??]]
         dft = Neo4jDataAccess(neo4j_creds=neo4j_creds).get_tweet_hydrated_status_by_id(df)
         logger.debug('hydrate status res sample')
         logger.debug(dft[:3])
+        if not (hydrated_ids is None):
+            hydrated_ids.add(dft[dft['hydrated'] == 'FULL']['id'].values)
         needs_hydrate_ids = dft[dft['hydrated'] != 'FULL'][['id']]
         needs_hydrate_df = df.merge(needs_hydrate_ids, how='inner', on='id')
         logger.info('Hydrate check: df:%s -> dft:%s -> ids:%s => merged:%s', len(df), len(dft), len(needs_hydrate_ids), len(needs_hydrate_df))
@@ -159,19 +266,6 @@ class TwintPool:
             'name': 'user_screen_name'
         })
 
-        def row_to_tweet_type(row):
-            #logger.debug('type row: %s', row)
-            if row['quote_url'] is None or row['quote_url'] == '':
-                return "QUOTE_RETWEET"
-            elif ('retweet' in row) and row['retweet']:
-                return "RETWEET"
-            elif row['id'] == row['conversation_id']:
-                return "TWEET"
-            elif row['id'] != row['conversation_id']:
-                return "REPLY"
-            else:
-                raise ('wat')
-
         # def row_to_quoted_status_id(row):
         # if row['quote_url'] and len(row['quote_url']) > 0:
         # return row['quote_url'].split('/')[-1]
@@ -187,7 +281,7 @@ class TwintPool:
         logger.debug(df[:3])
 
         neo4j_df['user_location'] = None
-        neo4j_df['tweet_type_twint'] = df.apply(row_to_tweet_type, axis=1, result_type='reduce') #handle empty df
+        neo4j_df['tweet_type_twint'] = twint_tweet_types(df)
         neo4j_df['hashtags'] = df['hashtags'].apply(lambda x: [{'text': ht} for ht in x])
         neo4j_df['user_followers_count'] = None
         neo4j_df['user_friends_count'] = None
@@ -198,7 +292,9 @@ class TwintPool:
         # neo4j_df['retweet_id'] is suspiciously empty (always)
         neo4j_df['retweeted_status'] = None
         neo4j_df['conversation_id'] = df['conversation_id']  # FIXME no-op?
-        neo4j_df['created_at'] = (neo4j_df['created_at'] / 1000).apply(lambda n: datetime.fromtimestamp(n))
+        # naive local time, as datetime.fromtimestamp always gave here
+        neo4j_df['created_at'] = Timestamps.epoch_ms_to_local_datetimes(
+            Timestamps.created_at_epoch_ms(neo4j_df['created_at'], neo4j_df['status_id'])).set_axis(neo4j_df.index)
 
         # neo4j_df['quoted_status_id'] = df.apply(row_to_quoted_status_id, axis=1)
         # neo4j_df['is_quote_status'] = neo4j_df['quoted_status_id'] != None
@@ -0,0 +1,90 @@
+from modules.BackgroundWriter import BackgroundWriter
+from modules.FirehoseJob import FirehoseJob
+from .test_FirehoseJob import make_tweet
+import pyarrow as pa
+import pytest
+import threading, time
+
+
+def make_table(i):
+    return pa.table({'id': [i]})
+
+
+class TestBackgroundWriter:
+
+    def test_full_queue_blocks_producer(self):
+        release = threading.Event()
+        written = []
+
+        def sink(table, job_name):
+            release.wait()
+            written.append(table.column('id')[0].as_py())
+
+        writer = BackgroundWriter({'slow': sink}, queue_size=1)
+        submitted = []
+
+        def produce():
+            for i in range(4):
+                writer.submit(make_table(i), 'job')
+                submitted.append(i)
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        time.sleep(0.2)
+        # one table in the sink, one queued, the third submit waits for room
+        assert producer.is_alive()
+        assert submitted == [0, 1]
+
+        release.set()
+        producer.join(5)
+        writer.close()
+        assert submitted == [0, 1, 2, 3]
+        assert written == [0, 1, 2, 3]
+
+    def test_drain_and_close_wait_for_queued_writes(self):
+        written = {'a': [], 'b': []}
+
+        def sink(name):
+            def write(table, job_name):
+                time.sleep(0.02)
+                written[name].append(table.column('id')[0].as_py())
+            return write
+
+        writer = BackgroundWriter({'a': sink('a'), 'b': sink('b')}, queue_size=8)
+        for i in range(5):
+            writer.submit(make_table(i), 'job')
+        writer.drain()
+        assert written == {'a': list(range(5)), 'b': list(range(5))}
+
+        for i in range(5, 10):
+            writer.submit(make_table(i), 'job')
+        writer.close()
+        assert written == {'a': list(range(10)), 'b': list(range(10))}
+
+    def test_sink_failure_raised_on_next_process_tweets(self):
+        calls = []
+
+        def sink(table, job_name):
+            calls.append(table.num_rows)
+            if len(calls) == 1:
+                raise IOError('disk full')
+
+        fh = FirehoseJob(writers={}, write_queue_size=2)
+        fh.sinks = lambda: {'failing': sink}
+        fh.process_tweets_notify_hydrating()
+        fh.needs_to_flush = True
+        fh.process_tweets([make_tweet(i) for i in range(3)], 'job')
+        for i in range(50):
+            if len(calls) > 0:
+                break
+            time.sleep(0.02)
+        time.sleep(0.1)  # the failure is recorded right after the sink raises
+
+        with pytest.raises(IOError) as excinfo:
+            fh.process_tweets([make_tweet(3)], 'job')
+        assert 'disk full' in str(excinfo.value)
+
+        fh.needs_to_flush = True
+        fh.process_tweets([make_tweet(4)], 'job')  # reported once, later writes go on
+        fh.drain()
+        assert calls == [3, 1]
+        fh.destroy()
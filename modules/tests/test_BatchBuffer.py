@@ -0,0 +1,56 @@
+from modules.BatchBuffer import BatchBuffer
+from modules.FirehoseJob import FirehoseJob
+from .test_FirehoseJob import make_tweet
+import pyarrow as pa
+import pytest
+
+SCHEMA = pa.schema([('id', pa.int64()), ('text', pa.string())])
+
+
+def make_table(start, n):
+    return pa.table({'id': list(range(start, start + n)), 'text': ['t%s' % i for i in range(start, start + n)]},
+                    schema=SCHEMA)
+
+
+class TestBatchBuffer:
+
+    def test_append_and_drain_row_counts(self):
+        buffer = BatchBuffer()
+        buffer.append(make_table(0, 3))
+        buffer.append(make_table(3, 0))
+        buffer.append(make_table(3, 4).to_batches()[0])
+        assert len(buffer) == buffer.num_rows == 7
+        assert len(buffer.batches) == 2
+        assert buffer.nbytes > 0
+
+        table = buffer.drain()
+        assert table.schema.equals(SCHEMA)
+        assert table.column('id').to_pylist() == list(range(7))
+        assert table.column('id').num_chunks == 1
+        assert (len(buffer), buffer.nbytes, buffer.batches) == (0, 0, [])
+
+        buffer.append(make_table(7, 2))
+        assert buffer.drain().num_rows == 2
+
+    def test_schema_mismatch_rejected(self):
+        buffer = BatchBuffer(SCHEMA)
+        with pytest.raises(ValueError):
+            buffer.append(pa.table({'id': ['1'], 'text': ['a']}))
+        with pytest.raises(ValueError):
+            buffer.append(pa.table({'id': [1]}))
+        assert len(buffer) == 0
+
+        empty = buffer.drain()
+        assert empty.num_rows == 0 and empty.schema.equals(SCHEMA)
+
+    def test_empty_flush_returns_none(self):
+        fh = FirehoseJob(writers={})
+        assert fh.flush('job') is None
+
+        fh.process_tweets_notify_hydrating()
+        fh.needs_to_flush = True
+        table = fh.process_tweets([make_tweet(i) for i in range(3)], 'job')
+        assert table.num_rows == 3
+        assert len(fh.buffer) == 0
+        assert fh.flush('job') is None
+        fh.destroy()
@@ -0,0 +1,36 @@
+from modules.CheckpointStore import CheckpointStore
+from datetime import datetime
+
+
+class TestCheckpointStore:
+
+    def test_windows_offsets_and_users_survive_reopen(self, tmp_path):
+        path = str(tmp_path / 'checkpoints.sqlite')
+        store = CheckpointStore(path)
+        t0, t1 = datetime(2020, 10, 5, 17, 0, 0), datetime(2020, 10, 5, 17, 0, 30)
+        store.complete_window('covid', t0, t1, 12)
+        store.save_offset('covid', '/data/ids.txt', 4096, 200)
+        store.complete_user('covid', 'dave')
+        store.save_density('covid', 'covid OR corona', 2.5)
+
+        store = CheckpointStore(path)
+        assert store.get_density('covid', 'covid OR corona') == 2.5
+        assert store.get_density('covid', 'pfas') is None
+        assert store.window_done('covid', t0, t1)
+        assert not store.window_done('covid', t1, datetime(2020, 10, 5, 17, 1, 0))
+        assert not store.window_done('other', t0, t1)
+        assert store.completed_windows('covid') == [(str(t0), str(t1), 12)]
+        assert store.get_offset('covid', '/data/ids.txt') == (4096, 200)
+        assert store.get_offset('covid', '/data/other.txt') == (0, 0)
+        assert store.user_done('covid', 'dave')
+        assert not store.user_done('covid', 'erin')
+
+    def test_claim_task(self, tmp_path):
+        store = CheckpointStore(str(tmp_path / 'checkpoints.sqlite'))
+        assert [store.claim_task('covid') for i in range(3)] == [0, 1, 2]
+        store.complete_task('covid', 0)
+        store.release_task('covid', 1)
+        assert store.claim_task('covid') == 1
+        assert store.claim_task('covid') == 3
+        # stale claims are handed out again
+        assert store.claim_task('covid', lease_s=-1) == 1
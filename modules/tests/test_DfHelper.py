@@ -0,0 +1,72 @@
+from modules.DfHelper import DfHelper, read_parquet_batches
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def status_df(encode):
+    user = {'id': 7, 'screen_name': 'dave', 'created_at': 'Wed Oct 10 20:19:24 +0000 2018'}
+    entities = {'hashtags': [{'text': 'covid'}], 'user_mentions': [], 'urls': []}
+    retweeted = {'id': 5, 'created_at': 'Wed Oct 10 20:19:24 +0000 2018', 'user': {'id': 9}}
+    return pd.DataFrame({
+        'id': [1, 2],
+        'id_str': ['1', '2'],
+        'created_at': ['Wed Oct 10 20:19:24 +0000 2018'] * 2,
+        'is_quote_status': [False, False],
+        'in_reply_to_status_id': [0, 0],
+        'user': [encode(user), encode(user)],
+        'entities': [encode(entities), encode(entities)],
+        'retweeted_status': [encode(retweeted), encode(None)],
+        'quoted_status': [encode(None), encode(None)]
+    })
+
+
+class TestDfHelper:
+
+    def test_json_and_legacy_repr_columns_normalize_the_same(self):
+        from_json = DfHelper().normalize_parquet_dataframe(status_df(json.dumps))
+        from_repr = DfHelper().normalize_parquet_dataframe(status_df(str))
+
+        assert from_json['retweeted'].tolist() == [True, False]
+        assert from_json['retweet_id'].tolist()[0] == 5
+        assert from_json['user_screen_name'].tolist() == ['dave', 'dave']
+        assert from_json['hashtags'].tolist() == [[{'text': 'covid'}]] * 2
+        cols = ['retweeted', 'status_type', 'retweet_id', 'user_id', 'user_screen_name', 'user_created_at', 'hashtags']
+        assert from_json[cols].equals(from_repr[cols])
+
+    def test_load_json_column_falls_back_per_row(self):
+        series = pd.Series(['{"a": 1}', "{'b': 2}", 'None', 'null', 'not a dict', None])
+        assert DfHelper().load_json_column(series) == [{'a': 1}, {'b': 2}, {}, {}, {}, {}]
+
+    def test_flatten_status_col_parses_each_distinct_status_once(self):
+        retweeted = {'id': 5, 'created_at': 'Wed Oct 10 20:19:24 +0000 2018', 'user': {'id': 9}}
+        other = {'id': 6, 'created_at': 'Wed Oct 10 20:19:25 +0000 2018', 'user': {'id': 8}}
+        pdf = pd.DataFrame({
+            'status_type': ['retweet', 'retweet', 'original', 'retweet', 'retweet'],
+            'retweeted_status': [json.dumps(retweeted), json.dumps(retweeted), 'null', json.dumps(other), retweeted]
+        })
+        helper = DfHelper()
+        loaded = []
+        load_json_column = helper.load_json_column
+        helper.load_json_column = lambda series: loaded.append(len(series)) or load_json_column(series)
+
+        out = helper.flatten_status_col(pdf, 'retweeted_status', 'retweet', 'retweet_')
+        assert loaded == [3]
+        assert out['retweet_id'].tolist()[:2] == [5, 5]
+        assert pd.isna(out['retweet_id'][2])
+        assert out['retweet_id'].tolist()[3:] == [6, 5]
+        assert out['retweet_user_id'].tolist()[3] == 8
+        assert out['retweet_created_at'].tolist()[3] == 1539202765.0
+
+    def test_normalize_parquet_batches_matches_whole_frame(self, tmp_path):
+        df = pd.concat([status_df(json.dumps)] * 5, ignore_index=True)
+        df['id'] = range(len(df))
+        path = str(tmp_path / 'tweets.parquet')
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=4)
+
+        batches = list(DfHelper().normalize_parquet_batches(read_parquet_batches([path], batch_size=4), max_rows=3))
+        assert [len(b) for b in batches] == [3, 1, 3, 1, 2]
+        whole = DfHelper().normalize_parquet_dataframe(df)
+        cols = ['status_id', 'created_date', 'retweeted', 'status_type', 'retweet_id', 'user_id', 'hashtags']
+        assert pd.concat(batches, ignore_index=True)[cols].equals(whole[cols])
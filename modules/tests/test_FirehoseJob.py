@@ -0,0 +1,276 @@
+from modules.FirehoseJob import FirehoseJob
+from modules.IdFileReader import IdFileReader
+from modules.SnowflakeProber import SnowflakeProber
+import modules.FirehoseJob
+import copy, functools, gc, glob, os
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import time
+
+
+def make_tweet(i):
+    tweet = {
+        'created_at': 'Wed Oct 10 20:19:24 +0000 2018',
+        'id': 1000 + i,
+        'id_str': str(1000 + i),
+        'full_text': 'Tweet %s' % i,
+        'truncated': False,
+        'display_text_range': [0, 7],
+        'entities': {'hashtags': [{'text': 'covid', 'indices': [0, 6]}], 'user_mentions': [], 'urls': []},
+        'source': '<a href="https://mobile.twitter.com">Twitter Web App</a>',
+        'in_reply_to_status_id': 55 if i % 3 == 0 else None,
+        'in_reply_to_status_id_str': '55' if i % 3 == 0 else None,
+        'in_reply_to_user_id': None,
+        'in_reply_to_user_id_str': None,
+        'in_reply_to_screen_name': None,
+        'user': {'id': 7, 'screen_name': 'dave', 'created_at': 'Wed Oct 10 20:19:24 +0000 2018'},
+        'geo': None,
+        'coordinates': None,
+        'place': None,
+        'contributors': None,
+        'is_quote_status': i % 2 == 1,
+        'retweet_count': i,
+        'favorite_count': 2,
+        'favorited': False,
+        'retweeted': False,
+        'lang': 'en',
+        'withheld_in_countries': ['DE']
+    }
+    if i % 4 == 0:
+        tweet['retweeted_status'] = {'id': 5, 'created_at': 'Wed Oct 10 20:19:24 +0000 2018', 'user': {'id': 9}}
+    if i % 5 == 0:
+        tweet['extended_entities'] = {'media': [{'id': 1, 'type': 'photo'}]}
+        tweet['possibly_sensitive'] = True
+    if i % 2 == 1:
+        tweet['quoted_status_id'] = 77
+        tweet['quoted_status_id_str'] = '77'
+        tweet['quoted_status'] = {'id': 77, 'created_at': 'Wed Oct 10 20:19:24 +0000 2018', 'user': {'id': 8}}
+    return tweet
+
+
+class TestFirehoseJob:
+
+    @pytest.mark.parametrize('n', [1, 7, 40])
+    @pytest.mark.parametrize('schema_version', [1, 2])
+    def test_arrow_engine_matches_pandas_engine(self, n, schema_version):
+        tweets = [make_tweet(i) for i in range(n)]
+
+        fh_pandas = FirehoseJob(writers={}, engine='pandas', schema_version=schema_version)
+        fh_arrow = FirehoseJob(writers={}, engine='arrow', schema_version=schema_version)
+
+        expected = fh_pandas.df_with_schema_to_arrow(
+            fh_pandas.clean_df(fh_pandas.tweets_to_df(copy.deepcopy(tweets))), fh_pandas.schema)
+        table = fh_arrow.tweets_to_arrow(tweets)
+
+        assert table.schema.equals(expected.schema)
+        assert table.equals(expected)
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError) as excinfo:
+            FirehoseJob(writers={}, engine='polars')
+        assert "engine" in str(excinfo.value)
+
+    def test_missing_ids_skips_hydrated_blocks(self):
+
+        class StubNeo4j:
+            def __init__(self):
+                self.blocks = []
+
+            def get_fully_hydrated_tweet_ids(self, ids):
+                self.blocks.append(len(ids))
+                return ids[ids % 3 == 0]
+
+        stub = StubNeo4j()
+        fh = FirehoseJob(writers={}, STATUS_BLOCK_LEN=1000)
+        fh.neo4j = lambda: stub
+
+        missing = list(fh.missing_ids(iter(range(2500))))
+
+        assert missing == [i for i in range(2500) if i % 3 != 0]
+        assert stub.blocks == [1000, 1000, 500]
+        assert fh.hydration_stats == {'checked': 2500, 'skipped': 834, 'missing': 1666, 'cached': 0}
+
+    def test_missing_ids_consults_hydrated_id_cache(self, tmp_path):
+
+        class StubNeo4j:
+            def __init__(self):
+                self.asked = 0
+
+            def get_fully_hydrated_tweet_ids(self, ids):
+                self.asked += len(ids)
+                return ids[ids % 2 == 0]
+
+        stub = StubNeo4j()
+        fh = FirehoseJob(writers={}, STATUS_BLOCK_LEN=100, hydrated_ids_path=str(tmp_path / 'hydrated'))
+        fh.neo4j = lambda: stub
+        assert list(fh.missing_ids(range(300))) == list(range(1, 300, 2))
+        assert stub.asked == 300
+        fh.destroy()
+
+        rerun = FirehoseJob(writers={}, STATUS_BLOCK_LEN=100, hydrated_ids_path=str(tmp_path / 'hydrated'))
+        rerun.neo4j = lambda: stub
+        assert list(rerun.missing_ids(range(300))) == list(range(1, 300, 2))
+        assert stub.asked == 450
+        assert rerun.hydration_stats['cached'] == 150
+
+    def test_schema_v2_coerces_heterogeneous_tweets(self):
+        tweets = [make_tweet(i) for i in range(3)]
+        tweets[0]['user'] = {'id': '7', 'screen_name': 'dave', 'followers_count': 'lots', 'unknown': {'a': 1}}
+        tweets[1]['entities'] = 'not json'
+        tweets[2]['display_text_range'] = '[0, 9]'
+
+        fh = FirehoseJob(writers={}, engine='arrow', schema_version=2)
+        table = fh.tweets_to_arrow(tweets)
+
+        assert table.schema.field('user').type.get_field_index('screen_name') >= 0
+        users = table.column('user').to_pylist()
+        assert (users[0]['id'], users[0]['followers_count'], users[1]['id']) == (7, None, 7)
+        assert not ('unknown' in users[0])
+        assert table.column('entities').to_pylist()[1] is None
+        assert table.column('entities').to_pylist()[0]['hashtags'] == [{'text': 'covid', 'indices': [0, 6]}]
+        assert table.column('display_text_range').to_pylist() == [[0, 7], [0, 7], [0, 9]]
+
+    def test_unknown_schema_version(self):
+        with pytest.raises(ValueError):
+            FirehoseJob(writers={}, schema_version=3)
+
+    def test_search_time_range_overlaps_fetch_and_writes(self, tmp_path):
+        delay_s = 0.05
+
+        class StubPool:
+            config = type('Config', (), {'Limit': 100})
+
+            def _get_term(self, Search, Since, Until, skip_window=None, window_done=None, **kwargs):
+                for i in range(6):
+                    time.sleep(delay_s)
+                    yield pd.DataFrame({'username': ['user%s' % i]}), i, i + 1
+
+            def _get_user_info(self, username):
+                time.sleep(delay_s)
+                return pd.DataFrame({'id': [int(username[4:])], 'username': [username]})
+
+        fh = FirehoseJob(writers={}, checkpoint_path=str(tmp_path / 'checkpoints.sqlite'))
+        written = []
+
+        def write(df, write_to_disk, id, write_opts=None):
+            written.append(id)
+            if 'tweets' in id:
+                time.sleep(delay_s)
+        fh._maybe_write_batch = write
+        tic = time.perf_counter()
+        out = list(fh.search_time_range(Search='covid', job_name='covid', tp=StubPool(), fetch_profiles=True))
+        elapsed = time.perf_counter() - tic
+
+        assert [df['username'][0] for df in out] == ['user%s' % i for i in range(6)]
+        assert [t0 for t0, t1, n in fh.checkpoints.completed_windows('covid')] == [str(i) for i in range(6)]
+        for kind in ['tweets', 'profiles']:
+            assert [id for id in written if kind in id] == ['covid/%s/%s_%s' % (kind, i, i + 1) for i in range(6)]
+        assert fh.profiles.stats()['fetched'] == 6
+        assert elapsed < 6 * 3 * delay_s * 0.6  # fetch, write and profile lookup in series
+        fh.destroy()
+
+    def test_process_id_file_killed_resumes_from_durable_checkpoint(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(modules.FirehoseJob, 'IdFileReader', functools.partial(IdFileReader, block_size=50))
+        with open('ids.txt', 'w') as f:
+            f.write('\n'.join([str(1000 + i) for i in range(45)]) + '\n')
+
+        class KilledAt(Exception):
+            pass
+
+        class StubTwarcPool:
+            def __init__(self, kill_at=None):
+                self.kill_at = kill_at
+
+            def hydrate(self, ids, lookup_size=100):
+                for id in ids:
+                    if id == self.kill_at:
+                        raise KilledAt()
+                    tweet = make_tweet(int(id) - 1000)
+                    tweet['id'], tweet['id_str'] = int(id), str(id)
+                    yield tweet
+
+        class StubNeo4j:
+            def get_fully_hydrated_tweet_ids(self, ids):
+                return ids[:0]
+
+        def job(kill_at=None):
+            fh = FirehoseJob(
+                checkpoint_path='checkpoints.sqlite', CHECKPOINT_BLOCKS=2, TWEETS_PER_PROCESS=2, TWEETS_PER_ROWGROUP=2)
+            fh.twarc_pool = StubTwarcPool(kill_at)
+            fh.neo4j = lambda: StubNeo4j()
+            return fh
+
+        killed = job(kill_at=1030)
+        with pytest.raises(KilledAt):
+            for arr in killed.process_id_file('ids.txt', job_name='ids'):
+                pass
+        killed.destroy = lambda *args, **kwargs: None  # a kill never closes the open part files
+        offset, line = killed.checkpoints.get_offset('ids', 'ids.txt')
+        assert line == 20  # blocks of 10 ids, checkpointed every 2, killed in the fourth
+
+        def readable_ids():
+            ids = []
+            for path in glob.glob('firehose_data/snappy/job=ids/**/*.parquet', recursive=True):
+                try:
+                    ids.extend(pq.read_table(path, columns=['id']).column('id').to_pylist())
+                except Exception:
+                    pass  # torn by the kill
+            return ids
+
+        assert set(range(1000, 1000 + line)) <= set(readable_ids())
+
+        parts = len(glob.glob('firehose_data/snappy/job=ids/**/*.parquet', recursive=True))
+        with job() as resumed:
+            list(resumed.process_id_file('ids.txt', job_name='ids'))
+        assert set(readable_ids()) == set(range(1000, 1045))
+        # blocks 3-4 share a checkpoint, and the last 5 ids get their own: one part file each
+        assert len(glob.glob('firehose_data/snappy/job=ids/**/*.parquet', recursive=True)) == parts + 2
+        assert resumed.checkpoints.get_offset('ids', 'ids.txt') == (os.path.getsize('ids.txt'), 45)
+
+    def test_ingest_range_with_prober_defaults_to_fixed_budget(self):
+        fh = FirehoseJob(writers={}, STATUS_BLOCK_LEN=5000)
+        probed = []
+
+        def process_id_chunks(id_chunks, job_name, prober=None):
+            for ids in id_chunks:
+                probed.append(len(ids))
+                yield ids
+        fh.process_id_chunks = process_id_chunks
+        list(fh.ingest_range(1600041600000, 1600041600000 + 1000, prober=SnowflakeProber()))
+        assert sum(probed) == 1000 * len(FirehoseJob.MACHINE_IDS)
+        assert max(probed) == 5000
+
+    def test_lifecycle_closes_and_fsyncs_writers_once(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        synced = []
+        fsync = os.fsync
+
+        def record_fsync(fd):
+            synced.append(os.readlink('/proc/self/fd/%s' % fd))
+            fsync(fd)
+        monkeypatch.setattr(os, 'fsync', record_fsync)
+
+        with FirehoseJob(write_queue_size=2, hydrated_ids_path='hydrated', TWEETS_PER_ROWGROUP=2) as fh:
+            fh.process_tweets_notify_hydrating()
+            for i in range(3):
+                fh.needs_to_flush = True
+                fh.process_tweets([make_tweet(2 * i), make_tweet(2 * i + 1)], 'job')
+            fh.hydrated_ids.add([1000, 1001])
+        assert fh.writers == {'snappy': None}
+        parts = glob.glob('firehose_data/snappy/job=job/**/*.parquet', recursive=True)
+        assert len(parts) > 0
+        assert set([os.path.abspath(p) for p in parts]) <= set(synced)
+        assert sum([pq.read_table(p).num_rows for p in parts]) == 6
+        assert pq.read_metadata('firehose_data/snappy/job=job/_metadata').num_rows == 6
+        assert os.path.exists('hydrated/ids.npy')
+
+        synced.clear()
+        fh.destroy()
+        fh.destroy('job')
+        fh.__del__()
+        del fh
+        gc.collect()
+        assert synced == []
+        assert len(glob.glob('firehose_data/snappy/job=job/**/*.parquet', recursive=True)) == len(parts)
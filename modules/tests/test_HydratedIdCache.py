@@ -0,0 +1,38 @@
+from modules.HydratedIdCache import HydratedIdCache
+import numpy as np
+
+
+class TestHydratedIdCache:
+
+    def test_many_small_adds_stay_in_few_runs(self, tmp_path):
+        cache = HydratedIdCache(str(tmp_path / 'hydrated'), capacity=1 << 20)
+        cache.RUN_ROWS = 1000
+        rng = np.random.default_rng(0)
+        added = []
+        for i in range(300):
+            ids = rng.integers(0, 1 << 40, 100)
+            cache.add(ids)
+            cache.add(ids[:10])  # repeats are not counted twice
+            added.append(ids)
+            assert cache.contains(ids).all()
+        added = np.unique(np.concatenate(added))
+        assert len(cache) == len(added)
+        assert len(cache._HydratedIdCache__runs) <= np.log2(len(added) / cache.RUN_ROWS) + 2
+
+        cache.save()
+        reloaded = HydratedIdCache(str(tmp_path / 'hydrated'))
+        assert len(reloaded) == len(added)
+        assert reloaded.contains(added).all()
+
+    def test_bloom_filter_grows_on_add(self, tmp_path):
+        cache = HydratedIdCache(str(tmp_path / 'hydrated'), capacity=1000)
+        ids = np.arange(0, 10000, dtype=np.int64) * 7919
+        for start in range(0, len(ids), 500):
+            cache.add(ids[start:start + 500])
+            assert cache.capacity >= len(cache)
+        assert cache.capacity == 16000
+        assert cache.contains(ids).all()
+
+        absent = np.arange(1, 100000, 7919, dtype=np.int64)
+        assert cache.bloom.might_contain(absent).mean() < 0.05
+        assert not cache.contains(absent).any()
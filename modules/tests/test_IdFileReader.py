@@ -0,0 +1,54 @@
+from modules.CheckpointStore import CheckpointStore
+from modules.IdFileReader import IdFileReader, rechunk_ids
+import numpy as np
+import pytest
+
+
+class TestIdFileReader:
+
+    def test_streams_bounded_chunks_and_resumes(self, tmp_path):
+        ids = np.arange(1310000000000000000, 1310000000000050000, 7, dtype=np.int64)
+        path = str(tmp_path / 'ids.txt')
+        with open(path, 'w') as f:
+            f.write('\n'.join([str(id) for id in ids]))
+
+        reader = IdFileReader(path, block_size=4096)
+        chunks = list(reader)
+        assert max([len(c) for c in chunks]) <= 4096 // 20
+        assert np.array_equal(np.concatenate(chunks), ids)
+        assert reader.line == len(ids)
+
+        reader = IdFileReader(path, block_size=4096)
+        first = next(iter(reader))
+        by_offset = np.concatenate(list(IdFileReader(path, offset=reader.offset)))
+        by_line = np.concatenate(list(IdFileReader(path, line=reader.line)))
+        assert np.array_equal(np.concatenate([first, by_offset]), ids)
+        assert np.array_equal(by_offset, by_line)
+
+    def test_resumes_large_file_from_checkpoint_offset(self, tmp_path, monkeypatch):
+        ids = np.arange(1310000000000000000, 1310000000000000000 + 500000, dtype=np.int64)
+        path = str(tmp_path / 'ids.txt')
+        np.savetxt(path, ids, fmt='%d')
+        store = CheckpointStore(str(tmp_path / 'checkpoints.sqlite'))
+
+        reader = IdFileReader(path, block_size=1024 * 1024)
+        chunks = iter(reader)
+        seen = [next(chunks), next(chunks)]
+        store.save_offset('ids', path, reader.offset, reader.line)
+
+        def seek_line(*args):
+            raise AssertionError('resumed by counting newlines from the start')
+        monkeypatch.setattr(IdFileReader, '_IdFileReader__seek_line', seek_line)
+        offset, line = store.get_offset('ids', path)
+        resumed = IdFileReader(path, block_size=1024 * 1024, offset=offset, line=line)
+        rest = list(resumed)
+        assert np.array_equal(np.concatenate(seen + rest), ids)
+        assert resumed.line == len(ids)
+
+        with pytest.raises(AssertionError):
+            list(IdFileReader(path, line=line))
+
+    def test_rechunk_ids(self):
+        blocks = list(rechunk_ids([np.arange(3), np.arange(3, 13), np.arange(13, 17)], 5))
+        assert [len(b) for b in blocks] == [5, 5, 5, 2]
+        assert np.array_equal(np.concatenate(blocks), np.arange(17))
@@ -231,3 +231,112 @@ class TestNeo4jDataAccess:
 
 def setup_cleanup(self):
     print("I want to perfrom some cleanup action!")
+
+
+# The row-by-row tweet params builder save_twintdf_to_neo used before __twintdf_to_params_df,
+# with user_created_at taken from the row rather than the whole column
+def legacy_twintdf_to_params_df(dao, df, job_name, job_id=None):
+    normalize_hashtags = dao._Neo4jDataAccess__normalize_hashtags
+    params = []
+    for index, row in df.iterrows():
+        tweet_type = 'TWEET'
+        if row['tweet_type_twint']:
+            tweet_type = row['tweet_type_twint']
+        elif row["in_reply_to_status_id"] is not None and row["in_reply_to_status_id"] > 0:
+            tweet_type = "REPLY"
+        elif "quoted_status_id" in row and row["quoted_status_id"] is not None and row["quoted_status_id"] > 0:
+            tweet_type = "QUOTE_RETWEET"
+        elif "retweet_id" in row and row["retweet_id"] is not None and row["retweet_id"] > 0:
+            tweet_type = "RETWEET"
+        params.append(pd.DataFrame([{
+            'tweet_id': int(row['status_id']),
+            'text': row['full_text'],
+            'created_at': str(pd.to_datetime(row['created_at'])),
+            'favorite_count': row['favorite_count'],
+            'retweet_count': row['retweet_count'],
+            'type': tweet_type,
+            'job_id': job_id,
+            'job_name': job_name,
+            'hashtags': normalize_hashtags(row['hashtags']),
+            'user_id': row['user_id'],
+            'user_name': row['user_name'],
+            'user_location': row['user_location'] if 'user_location' in row else None,
+            'user_screen_name': row['user_screen_name'],
+            'user_followers_count': row['user_followers_count'] if 'user_followers_count' in row else None,
+            'user_friends_count': row['user_friends_count'] if 'user_friends_count' in row else None,
+            'user_created_at': pd.to_datetime(row['user_created_at']) if 'user_created_at' in row else None,
+            'user_profile_image_url': row['user_profile_image_url'] if 'user_profile_image_url' in row else None,
+            'reply_tweet_id': row['in_reply_to_status_id'] if 'in_reply_to_status_id' in row else None,
+            'conversation_id': row['conversation_id'] if 'conversation_id' in row else None,
+            'quoted_status_id': row['quoted_status_id'] if 'quoted_status_id' in row else None,
+            'retweet_id': row['retweet_id'] if 'retweet_id' in row else None,
+            'geo': row['geo'] if 'geo' in row else None,
+        }]))
+    return pd.concat(params, ignore_index=True, sort=False)
+
+
+# Cypher params as the driver receives them, with NaN / NaT as None so they compare equal
+def to_cypher_params(params_df):
+    return [
+        {k: None if (not isinstance(v, (list, dict, str)) and pd.isna(v)) else v for k, v in record.items()}
+        for record in params_df.to_dict(orient='records')
+    ]
+
+
+class TestTwintParams:
+
+    def params(self, df):
+        dao = Neo4jDataAccess(neo4j_creds=[])
+        return (
+            to_cypher_params(dao._Neo4jDataAccess__twintdf_to_params_df(df, 'covid', 7)),
+            to_cypher_params(legacy_twintdf_to_params_df(dao, df, 'covid', 7)))
+
+    def test_params_match_row_builder_for_twint_df(self):
+        from modules.TwintPool import TwintPool
+        twint_df = pd.DataFrame({
+            'id': ['1300000000000000001', '1300000000000000002', '1300000000000000003'],
+            'conversation_id': ['1300000000000000001', '1299999999999999999', '1300000000000000003'],
+            'created_at': [1598000000123, 1598000001000, 1598000002500],
+            'tweet': ['hi @erin https://a.co/x', 'reply', 'rt'],
+            'hashtags': [['#covid', '#flu'], [], ['#covid']],
+            'nlikes': [1, float('nan'), 3],
+            'nretweets': [0, 2, float('nan')],
+            'user_id': [7, 8, 9],
+            'username': ['dave', 'erin', None],
+            'name': ['Dave', 'Erin', 'Frank'],
+            'quote_url': ['', 'https://twitter.com/a/status/5', None],
+            'retweet': [False, False, True],
+            'geo': ['', None, float('nan')],
+            'user_created_at': [pd.Timestamp('2019-05-01 10:00:00'), pd.NaT, pd.Timestamp('2020-01-01')],
+        })
+        neo4j_df = TwintPool().twint_df_to_neo4j_df(twint_df)
+        params, legacy = self.params(neo4j_df)
+        assert params == legacy
+        assert [len(p['created_at']) for p in params] == [26, 19, 26]  # micros only when there are some
+        assert [p['hashtags'] for p in params] == ['#covid,#flu', None, '#covid']
+
+    def test_params_match_row_builder_for_tweet_types(self):
+        df = pd.DataFrame({
+            'status_id': [1, 2, 3, 4, 5],
+            'full_text': ['a', 'b', None, 'd', 'e'],
+            'created_at': pd.to_datetime(['2020-01-01 00:00:00', '2020-01-01 00:00:01.5', None,
+                                          '2020-01-02', '2020-01-03 12:00:00']),
+            'favorite_count': [1.0, float('nan'), 2.0, 0.0, 5.0],
+            'retweet_count': [0, 1, 2, 3, 4],
+            'tweet_type_twint': ['QUOTE_RETWEET', None, '', None, None],
+            'in_reply_to_status_id': [float('nan'), 11.0, float('nan'), 0.0, float('nan')],
+            'quoted_status_id': [None, None, 12, None, 0],
+            'retweet_id': [float('nan'), float('nan'), float('nan'), 13.0, float('nan')],
+            'hashtags': [[{'text': 'covid'}], None, [], [{'text': 'a'}, {'text': 'b'}], None],
+            'user_id': [7, 7, 8, 8, 9],
+            'user_name': ['dave', 'dave', 'erin', 'erin', None],
+            'user_screen_name': ['Dave', 'Dave', 'Erin', 'Erin', None],
+            'user_followers_count': [10, 10, float('nan'), 3, 4],
+            'user_created_at': ['2019-01-01', '2019-01-01', None, '2018-06-01 10:00', '2017-01-01'],
+            'conversation_id': [1, 1, 3, 4, 5],
+        })
+        params, legacy = self.params(df)
+        assert params == legacy
+        assert [p['type'] for p in params] == ['QUOTE_RETWEET', 'REPLY', 'QUOTE_RETWEET', 'RETWEET', 'TWEET']
+        assert params[2]['created_at'] == 'NaT'
+        assert params[0]['user_location'] is None and params[0]['geo'] is None
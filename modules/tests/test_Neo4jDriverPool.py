@@ -0,0 +1,69 @@
+from modules.Neo4jDriverPool import Neo4jDriverPool
+import modules.Neo4jDriverPool
+import os
+import pytest
+
+
+def make_creds(password='pw', host='neo4j'):
+    return [{'type': 'writer', 'creds': {'host': host, 'port': 7687, 'user': 'neo4j', 'password': password}}]
+
+
+class StubDriver:
+
+    def __init__(self, uri, **kwargs):
+        self.uri = uri
+        self.kwargs = kwargs
+        self.closed = False
+
+    def close(self):
+        if self.uri.startswith('bolt://broken'):
+            raise IOError('connection reset')
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(modules.Neo4jDriverPool.GraphDatabase, 'driver', StubDriver)
+    Neo4jDriverPool._reset_after_fork()
+    yield Neo4jDriverPool
+    Neo4jDriverPool._reset_after_fork()
+
+
+class TestNeo4jDriverPool:
+
+    def test_pools_drivers_by_credentials(self, pool, monkeypatch):
+        driver = pool.get_driver('writer', make_creds())
+        assert pool.get_driver('writer', make_creds()) is driver
+        assert driver.uri == 'bolt://neo4j:7687'
+        assert driver.kwargs['max_connection_pool_size'] == 50
+
+        monkeypatch.setattr(pool, 'max_connection_pool_size', 8)
+        other = pool.get_driver('writer', make_creds(password='rotated'))
+        assert not (other is driver)
+        assert other.kwargs['max_connection_pool_size'] == 8
+        assert pool.get_driver('writer', make_creds(host='replica')).uri == 'bolt://replica:7687'
+        assert pool.get_driver('reader', make_creds()) is None
+        assert len(pool._drivers) == 3
+        assert not any(['rotated' in str(key) for key in pool._drivers.keys()])
+
+    def test_forked_child_reconnects_without_closing_parent_drivers(self, pool, monkeypatch):
+        driver = pool.get_driver('writer', make_creds())
+        monkeypatch.setattr(pool, '_pid', -1)  # as if this process were a fork of another
+        child_driver = pool.get_driver('writer', make_creds())
+        assert not (child_driver is driver)
+        assert not driver.closed
+        assert pool._pid == os.getpid()
+
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if len(pool._drivers) == 0 else 1)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert pool.get_driver('writer', make_creds()) is child_driver
+
+    def test_close_closes_every_driver(self, pool):
+        drivers = [pool.get_driver('writer', make_creds(host=host)) for host in ['a', 'broken', 'b']]
+        pool.close()
+        assert [d.closed for d in drivers] == [True, False, True]
+        assert pool._drivers == {}
+        assert not (pool.get_driver('writer', make_creds(host='a')) is drivers[0])
+        pool.close()
@@ -0,0 +1,65 @@
+from modules.ParquetDatasetWriter import ParquetDatasetWriter, HOUR_MS
+from modules.Snowflake import SNOWFLAKE_EPOCH
+from concurrent.futures import ThreadPoolExecutor
+import glob, os
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+T0_MS = 1577836800000  # 2020-01-01 00:00:00 UTC
+SCHEMA = pa.schema([('id', pa.int64()), ('text', pa.string())])
+
+
+def make_table(hours, per_hour=3):
+    ids = [((T0_MS + hour * HOUR_MS + i - SNOWFLAKE_EPOCH) << 22) for hour in hours for i in range(per_hour)]
+    return pa.table({'id': ids, 'text': ['tweet %s' % id for id in ids]}, schema=SCHEMA)
+
+
+class TestParquetDatasetWriter:
+
+    def test_hive_partitions_by_creation_hour(self, tmp_path):
+        writer = ParquetDatasetWriter(str(tmp_path), 'covid', SCHEMA)
+        files = writer.write_table(make_table([0, 1, 25]))
+        writer.close()
+
+        assert sorted([os.path.relpath(os.path.dirname(f), str(tmp_path)) for f in files]) == [
+            'job=covid/year=2020/month=01/day=01/hour=00',
+            'job=covid/year=2020/month=01/day=01/hour=01',
+            'job=covid/year=2020/month=01/day=02/hour=01']
+        for f in files:
+            assert pq.read_table(f).num_rows == 3
+        assert writer.write_table(make_table([])) == []
+
+    def test_closes_least_recently_written_partition(self, tmp_path):
+        writer = ParquetDatasetWriter(str(tmp_path), 'covid', SCHEMA, max_open_files=2)
+        first = writer.write_table(make_table([0]))
+        writer.write_table(make_table([1]))
+        writer.write_table(make_table([0]))  # hour 0 is now the most recent
+        writer.write_table(make_table([2]))  # so hour 1 is closed, and readable
+
+        hour1 = glob.glob(str(tmp_path / 'job=covid/**/hour=01/*.parquet'), recursive=True)
+        assert pq.read_table(hour1[0]).num_rows == 3
+        assert writer.write_table(make_table([0])) == []  # still open, no new part file
+        assert writer.write_table(make_table([1])) != []  # reopened as a fresh part file
+        writer.close()
+
+        assert pq.read_table(first[0]).num_rows == 9
+        assert len(writer.files) == 4
+
+    def test_metadata_counts_rows_of_every_writer(self, tmp_path):
+        ParquetDatasetWriter(str(tmp_path), 'covid', SCHEMA).close()  # nothing written
+
+        def run(i):
+            writer = ParquetDatasetWriter(str(tmp_path), 'covid', SCHEMA)
+            writer.write_table(make_table([i, i + 1], per_hour=i + 1))
+            writer.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(run, range(16)))
+
+        metadata = pq.read_metadata(str(tmp_path / 'job=covid' / '_metadata'))
+        assert metadata.num_rows == sum([2 * (i + 1) for i in range(16)])
+        assert metadata.num_row_groups == 32
+        paths = set([metadata.row_group(i).column(0).file_path for i in range(metadata.num_row_groups)])
+        assert all([os.path.exists(str(tmp_path / 'job=covid' / path)) for path in paths])
+        assert pq.ParquetDataset(str(tmp_path / 'job=covid')).read().num_rows == metadata.num_rows
@@ -0,0 +1,92 @@
+from modules.ProfileEnricher import ProfileCache, ProfileEnricher
+from modules.FirehoseJob import FirehoseJob
+from twint.user import SuspendedUser
+import pandas as pd
+import os, threading, time
+
+
+class StubPool:
+
+    def __init__(self, delay_s=0.0, suspended=[], missing=[], failing=[]):
+        self.delay_s = delay_s
+        self.suspended = suspended
+        self.missing = missing
+        self.failing = failing
+        self.lock = threading.Lock()
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    def _get_user_info(self, username):
+        with self.lock:
+            self.calls.append(username)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay_s)
+        with self.lock:
+            self.active -= 1
+        if username in self.suspended:
+            raise SuspendedUser()
+        if username in self.failing:
+            raise IOError('proxy down')
+        if username in self.missing:
+            return pd.DataFrame()
+        return pd.DataFrame({
+            'id': [sum(map(ord, username))], 'username': [username], 'followers': [10], 'verified': [False]})
+
+
+class TestProfileEnricher:
+
+    def test_cached_and_negative_cached(self):
+        tp = StubPool(suspended=['sus'], missing=['gone'], failing=['flaky'])
+        enricher = ProfileEnricher(':memory:')
+        df = enricher.enrich(['dave', 'erin', 'sus', 'gone', 'flaky', 'dave'], tp)
+        assert sorted(df['username'].tolist()) == ['dave', 'erin']
+        assert df['followers'].tolist() == [10, 10]
+        assert sorted(tp.calls) == ['dave', 'erin', 'flaky', 'gone', 'sus']
+
+        tp.calls = []
+        assert enricher.enrich(['dave', 'sus', 'gone', 'flaky'], tp) is None
+        assert tp.calls == ['flaky']
+        stats = enricher.stats()
+        assert stats['requested'] == 9
+        assert stats['hits'] == 1 and stats['negative_hits'] == 2
+        assert stats['fetched'] == 2 and stats['missing'] == 2 and stats['errors'] == 2
+        assert stats['hit_rate'] == 3 / 9
+
+    def test_cache_persists_until_ttl(self, tmp_path):
+        path = str(tmp_path / 'checkpoints.sqlite')
+        tp = StubPool()
+        ProfileEnricher(path).enrich(['dave'], tp)
+        assert ProfileEnricher(path).enrich(['dave', 'erin'], tp)['username'].tolist() == ['erin']
+        assert tp.calls == ['dave', 'erin']
+
+        expired = ProfileEnricher(path, ttl_days=0)
+        assert expired.enrich(['dave'], tp)['username'].tolist() == ['dave']
+        assert expired.stats()['hits'] == 0
+
+    def test_bounded_concurrent_lookups(self):
+        tp = StubPool(delay_s=0.05)
+        usernames = ['user%s' % i for i in range(12)]
+        tic = time.perf_counter()
+        df = ProfileEnricher(':memory:', max_workers=4).enrich(usernames, tp)
+        elapsed = time.perf_counter() - tic
+        assert sorted(df['username'].tolist()) == sorted(usernames)
+        assert tp.max_active == 4
+        assert elapsed < 12 * tp.delay_s / 2
+
+    def test_jobs_without_cache_file_share_one_cache(self, monkeypatch):
+        monkeypatch.setattr(ProfileCache, '_shared', None)
+        tp = StubPool()
+        first = FirehoseJob(writers={})
+        assert first.profiles.enrich(['dave', 'erin'], tp)['username'].tolist() == ['dave', 'erin']
+        second = FirehoseJob(writers={}, profile_ttl_days=1)
+        assert second.profiles.enrich(['dave', 'frank'], tp)['username'].tolist() == ['frank']
+        assert tp.calls == ['dave', 'erin', 'frank']
+        assert second.profiles.stats()['hits'] == 1
+        assert ProfileEnricher(':memory:').enrich(['dave'], tp)['username'].tolist() == ['dave']
+
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if not (ProfileCache._shared is first.profiles.cache) else 1)
+        assert os.waitpid(pid, 0)[1] == 0
@@ -0,0 +1,32 @@
+from modules import Snowflake
+import numpy as np
+
+MACHINE_IDS = (375, 382, 361)
+
+
+class TestSnowflake:
+
+    def test_generate_ids_matches_scalar_layout(self):
+        begin = 1600000000000
+        ids = Snowflake.generate_ids(begin, begin + 4, MACHINE_IDS, (0, 1))
+        expected = [
+            ((t - Snowflake.SNOWFLAKE_EPOCH) << 22) + (m << 12) + s
+            for t in range(begin, begin + 4) for m in MACHINE_IDS for s in (0, 1)
+        ]
+        assert ids.dtype == np.int64
+        assert ids.tolist() == expected
+
+    def test_decode_round_trips(self):
+        begin = 1600000000000
+        ids = Snowflake.generate_ids(begin, begin + 10, MACHINE_IDS, (0, 7))
+        df = Snowflake.decode(ids)
+        assert df['created_at_ms'].tolist() == [t for t in range(begin, begin + 10) for i in range(6)]
+        assert df['machine_id'].tolist() == [m for t in range(10) for m in MACHINE_IDS for s in range(2)]
+        assert df['sequence_id'].tolist() == [0, 7] * 30
+        assert Snowflake.creation_time_ms(int(ids[-1])) == begin + 9
+
+    def test_generate_id_blocks_cover_range_in_whole_ms(self):
+        begin = 1600000000000
+        blocks = list(Snowflake.generate_id_blocks(begin, begin + 100, MACHINE_IDS, block_size=40))
+        assert [len(b) for b in blocks] == [39] * 7 + [27]
+        assert np.array_equal(np.concatenate(blocks), Snowflake.generate_ids(begin, begin + 100, MACHINE_IDS))
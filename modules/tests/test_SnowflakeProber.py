@@ -0,0 +1,70 @@
+from modules import Snowflake
+from modules.SnowflakeProber import SnowflakeProber, fixed_plan_blocks, replay
+import numpy as np
+
+MACHINE_IDS = (375, 382, 361, 372, 364, 381, 376, 365, 363, 362)
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+DAY = 1600041600000  # 2020-09-14 00:00 UTC
+
+
+# Recorded "truth": a few busy machines, low sequences far likelier than high ones
+def recorded_ids(begin_ms, end_ms, seed):
+    rng = np.random.default_rng(seed)
+    ids = Snowflake.generate_ids(begin_ms, end_ms, (375, 361, 101, 102), range(8))
+    machine = Snowflake.machine_id(ids)
+    rate = np.select([machine == 101, machine == 102, machine == 375], [0.3, 0.1, 0.05], 0.01)
+    rate = rate * 0.5 ** Snowflake.sequence_id(ids)
+    return ids[rng.random(len(ids)) < rate]
+
+
+class TestSnowflakeProber:
+
+    def test_replay_beats_fixed_enumeration(self):
+        t0, t1 = DAY + 5 * HOUR_MS, DAY + 5 * HOUR_MS + 60 * 1000
+        prober = SnowflakeProber()
+        prober.learn(recorded_ids(t0, t1, 0), t0, t1)
+
+        truth = recorded_ids(t0 + DAY_MS, t1 + DAY_MS, 1)
+        budget = 100000
+        adaptive = replay(prober.plan_blocks(t0 + DAY_MS, t1 + DAY_MS, budget), truth, prober)
+        fixed = replay(fixed_plan_blocks(t0 + DAY_MS, t1 + DAY_MS, MACHINE_IDS, budget=budget), truth)
+
+        assert adaptive['probed'] == budget
+        assert fixed['probed'] <= budget
+        assert adaptive['hit_rate'] > 10 * fixed['hit_rate']
+        assert prober.stats() == adaptive
+
+    def test_ranks_by_time_of_day(self):
+        prober = SnowflakeProber(max_sequence=4)
+        morning = Snowflake.generate_ids(DAY + 8 * HOUR_MS, DAY + 8 * HOUR_MS + 1000, [10], [0])
+        evening = Snowflake.generate_ids(DAY + 20 * HOUR_MS, DAY + 20 * HOUR_MS + 1000, [20], [1])
+        prober.learn(morning, DAY + 8 * HOUR_MS, DAY + 8 * HOUR_MS + 1000)
+        prober.learn(evening, DAY + 20 * HOUR_MS, DAY + 20 * HOUR_MS + 1000)
+
+        hours, machines, sequences, scores = prober.ranked_slots(DAY_MS + DAY + 8 * HOUR_MS, DAY_MS + DAY + 9 * HOUR_MS)
+        assert (hours[0], machines[0], sequences[0]) == (8, 10, 0)
+        hours, machines, sequences, scores = prober.ranked_slots(DAY + 20 * HOUR_MS, DAY + 21 * HOUR_MS)
+        assert (hours[0], machines[0], sequences[0]) == (20, 20, 1)
+        assert scores[0] > scores[1]
+
+    def test_plan_blocks_respects_budget(self):
+        prober = SnowflakeProber()
+        blocks = list(prober.plan_blocks(DAY, DAY + 50, budget=1234, block_size=100))
+        ids = np.concatenate(blocks)
+        assert len(ids) == 1234
+        assert len(np.unique(ids)) == 1234
+        assert ((Snowflake.creation_time_ms(ids) >= DAY) & (Snowflake.creation_time_ms(ids) < DAY + 50)).all()
+
+    def test_plan_blocks_over_long_range_stays_bounded(self):
+        prober = SnowflakeProber()
+        assert list(SnowflakeProber.hour_spans(DAY + 23 * HOUR_MS + 5, DAY + 2 * DAY_MS + 23 * HOUR_MS + 9, 23)) == [
+            (DAY + 23 * HOUR_MS + 5, DAY + DAY_MS), (DAY + DAY_MS + 23 * HOUR_MS, DAY + 2 * DAY_MS),
+            (DAY + 2 * DAY_MS + 23 * HOUR_MS, DAY + 2 * DAY_MS + 23 * HOUR_MS + 9)]
+
+        blocks = prober.plan_blocks(DAY, DAY + 30 * DAY_MS, block_size=1000)
+        first = [next(blocks) for i in range(5)]
+        assert [len(ids) for ids in first] == [1000] * 5
+        times = Snowflake.creation_time_ms(np.concatenate(first))
+        assert (np.diff(times) > 0).all()  # one slot, in time order
+        assert ((times // HOUR_MS) % 24 == 0).all()
@@ -0,0 +1,69 @@
+from modules.StagePipeline import StagePipeline
+from modules.Timer import Timer
+import pytest
+import threading, time
+
+
+def slow(delay_s, fn=lambda x: x):
+    def stage(x):
+        time.sleep(delay_s)
+        return fn(x)
+    return stage
+
+
+class TestStagePipeline:
+
+    def test_stages_overlap_and_keep_order(self):
+        timer = Timer()
+        tic = time.perf_counter()
+        out = list(StagePipeline(
+            (i for i in range(10)),
+            [('a', slow(0.03, lambda x: x * 2)), ('b', slow(0.03, lambda x: x + 1)), ('c', slow(0.03))],
+            timer=timer))
+        elapsed = time.perf_counter() - tic
+        assert out == [i * 2 + 1 for i in range(10)]
+        assert elapsed < 10 * 3 * 0.03 * 0.6
+        assert timer.counters['b']['k'] == 10 and timer.counters['source']['k'] == 10
+
+    def test_stage_failure_raises_and_stops_source(self):
+        produced = []
+
+        def source():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        def fail_on_3(x):
+            if x == 3:
+                raise ValueError('bad item')
+            return x
+
+        out = []
+        with pytest.raises(ValueError):
+            for x in StagePipeline(source(), [('check', fail_on_3), ('slow', slow(0.01))], queue_size=2):
+                out.append(x)
+        assert out == [0, 1, 2]
+        assert len(produced) < 20
+
+    def test_closing_early_closes_source(self):
+        closed = threading.Event()
+
+        def source():
+            try:
+                for i in range(1000):
+                    yield i
+            finally:
+                closed.set()
+
+        pipeline = iter(StagePipeline(source(), [('id', lambda x: x)]))
+        assert next(pipeline) == 0
+        pipeline.close()
+        assert closed.is_set()
+
+    def test_source_failure_raises(self):
+        def source():
+            yield 1
+            raise IOError('proxy down')
+
+        with pytest.raises(IOError):
+            list(StagePipeline(source(), [('id', lambda x: x)]))
@@ -0,0 +1,101 @@
+from modules import StatusType
+import numpy as np
+import pandas as pd
+import pytest
+
+SEEDS = range(20)
+
+# The per-row classifiers StatusType replaced, kept as parity references
+
+
+def update_to_type(row):
+    if row['is_quote_status']:
+        return 'retweet_quote'
+    if row['retweeted']:
+        return 'retweet'
+    if row['in_reply_to_status_id'] is not None and row['in_reply_to_status_id'] > 0:
+        return 'reply'
+    return 'original'
+
+
+def row_to_tweet_type(row):
+    if row['quote_url'] is None or row['quote_url'] == '':
+        return "QUOTE_RETWEET"
+    elif ('retweet' in row) and row['retweet']:
+        return "RETWEET"
+    elif row['id'] == row['conversation_id']:
+        return "TWEET"
+    elif row['id'] != row['conversation_id']:
+        return "REPLY"
+
+
+def row_to_neo4j_type(row):
+    tweet_type = 'TWEET'
+    if row['tweet_type_twint']:
+        tweet_type = row['tweet_type_twint']
+    elif row["in_reply_to_status_id"] is not None and row["in_reply_to_status_id"] > 0:
+        tweet_type = "REPLY"
+    elif "quoted_status_id" in row and row["quoted_status_id"] is not None and row["quoted_status_id"] > 0:
+        tweet_type = "QUOTE_RETWEET"
+    elif "retweet_id" in row and row["retweet_id"] is not None and row["retweet_id"] > 0:
+        tweet_type = "RETWEET"
+    return tweet_type
+
+
+# Random column of n values drawn from pool, as a clean numpy dtype when the draw allows it
+def draw(rng, n, pool):
+    values = [pool[i] for i in rng.integers(0, len(pool), n)]
+    return pd.Series(values, dtype=object).infer_objects() if rng.random() < 0.5 else pd.Series(values, dtype=object)
+
+
+FLAGS = [True, False, None, np.nan, 0, 1]
+IDS = [None, np.nan, 0, -1, 5, 1341241234123412341, 0.5]
+
+
+def expected(df, fn):
+    return [fn(row) for index, row in df.iterrows()]
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_parquet_status_types_match_rows(seed):
+    rng = np.random.default_rng(seed)
+    n = 200
+    df = pd.DataFrame({
+        'is_quote_status': draw(rng, n, FLAGS),
+        'retweeted': draw(rng, n, FLAGS),
+        'in_reply_to_status_id': draw(rng, n, IDS)
+    })
+    assert StatusType.parquet_status_types(df).tolist() == expected(df, update_to_type)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_twint_tweet_types_match_rows(seed):
+    rng = np.random.default_rng(seed)
+    n = 200
+    df = pd.DataFrame({
+        'quote_url': draw(rng, n, [None, '', np.nan, 'https://twitter.com/a/status/1']),
+        'id': draw(rng, n, [1, 2, 3]),
+        'conversation_id': draw(rng, n, [1, 2, '1', 3.0])
+    })
+    if seed % 2 == 0:
+        df['retweet'] = draw(rng, n, FLAGS)
+    assert StatusType.twint_tweet_types(df).tolist() == expected(df, row_to_tweet_type)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_neo4j_tweet_types_match_rows(seed):
+    rng = np.random.default_rng(seed)
+    n = 200
+    df = pd.DataFrame({
+        'tweet_type_twint': draw(rng, n, [None, '', 'TWEET', 'REPLY', 'RETWEET', 'QUOTE_RETWEET']),
+        'in_reply_to_status_id': draw(rng, n, IDS)
+    })
+    for col in ['quoted_status_id', 'retweet_id']:
+        if rng.random() < 0.7:
+            df[col] = draw(rng, n, IDS)
+    assert StatusType.neo4j_tweet_types(df).tolist() == expected(df, row_to_neo4j_type)
+
+
+def test_empty_frames():
+    df = pd.DataFrame({'is_quote_status': [], 'retweeted': [], 'in_reply_to_status_id': []})
+    assert StatusType.parquet_status_types(df).tolist() == []
@@ -0,0 +1,33 @@
+from modules import Snowflake, Timestamps
+import numpy as np
+import pandas as pd
+
+
+class TestTimestamps:
+
+    def test_twitter_strings_match_strptime(self):
+        rng = np.random.default_rng(0)
+        times = pd.Timestamp('2008-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 86400 * 365 * 14, 2000), unit='s')
+        values = pd.Series(times.strftime('%a %b %d %H:%M:%S +0000 %Y'))
+        values[0] = 'Wed Oct 10 20:19:24 -0130 2018'
+        values[1] = 'Wed Oct 10 20:19:24 +0545 2018'
+        expected = pd.to_datetime(values, format=Timestamps.TWITTER_FORMAT, utc=True)
+        ms = Timestamps.twitter_epoch_ms(values)
+        assert ms.tolist() == Timestamps.datetimes_to_epoch_ms(expected).tolist()
+        assert Timestamps.epoch_ms_to_datetimes(ms).equals(expected)
+
+    def test_other_strings_fall_back_and_missing_are_nat(self):
+        values = ['2020-01-02T03:04:05Z', 'Wed Foo 10 20:19:24 +0000 2018', 'garbage', None, np.nan, '']
+        ms = Timestamps.twitter_epoch_ms(values)
+        assert ms[0] == 1577934245000
+        assert (ms[1:] == Timestamps.NAT_MS).all()
+        assert np.isnan(Timestamps.epoch_ms_to_seconds(ms)[1:]).all()
+
+    def test_created_at_forms_and_snowflake_fallback(self):
+        ms = 1600000000123
+        tweet_id = ((ms - Snowflake.SNOWFLAKE_EPOCH) << 22) | (375 << 12)
+        assert Timestamps.created_at_epoch_ms(pd.Series([ms, np.nan])).tolist() == [ms, Timestamps.NAT_MS]
+        assert Timestamps.created_at_epoch_ms(pd.to_datetime(pd.Series([ms]), unit='ms')).tolist() == [ms]
+        assert Timestamps.created_at_epoch_ms(
+            pd.Series(['Sun Sep 13 12:26:40 +0000 2020', None, None]), [1, tweet_id, 0]
+        ).tolist() == [1600000000000, ms, Timestamps.NAT_MS]
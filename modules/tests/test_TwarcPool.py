@@ -0,0 +1,88 @@
+from modules.TwarcPool import TokenBucket, TwarcPool
+import threading, time
+import pytest
+
+
+# Stands in for twarc.Twarc: one statuses/lookup request per hydrate() call
+class StubTwarc:
+
+    def __init__(self, latency_s=0.0, fail_on=None):
+        self.latency_s = latency_s
+        self.fail_on = fail_on
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def hydrate(self, ids):
+        ids = list(ids)
+        with self.lock:
+            self.requests.append(ids)
+        if not (self.fail_on is None) and self.fail_on in ids:
+            raise RuntimeError('lookup failed')
+        time.sleep(self.latency_s)
+        for id in ids:
+            yield {'id': id, 'id_str': str(id)}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, s):
+        self.sleeps.append(s)
+        self.now += s
+
+
+class TestTwarcPool:
+
+    def test_token_bucket_waits_for_refill(self):
+        fake = FakeClock()
+        bucket = TokenBucket(capacity=3, window_s=30, clock=fake.clock, sleep=fake.sleep)
+        assert [bucket.acquire() for i in range(3)] == [0.0, 0.0, 0.0]
+        assert bucket.acquire() == pytest.approx(10.0)
+        fake.now += 25
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == pytest.approx(5.0)
+
+    def test_hydrate_all_ids_in_lookup_sized_requests(self):
+        stubs = [StubTwarc() for i in range(3)]
+        pool = TwarcPool(stubs)
+        ids = list(range(1050))
+        tweets = list(pool.hydrate(iter(ids)))
+        assert sorted([t['id'] for t in tweets]) == ids
+        requests = [r for s in stubs for r in s.requests]
+        assert len(requests) == 11
+        assert max([len(r) for r in requests]) == 100
+
+    def test_hydrate_spreads_requests_across_credentials(self):
+        stubs = [StubTwarc(latency_s=0.05) for i in range(4)]
+        pool = TwarcPool(stubs)
+        start = time.time()
+        tweets = list(pool.hydrate(range(4000)))
+        elapsed = time.time() - start
+        assert len(tweets) == 4000
+        assert min([len(s.requests) for s in stubs]) > 0
+        # 40 requests x 50ms: serial would take 2s
+        assert elapsed < 1.5
+
+    def test_hydrate_respects_per_credential_budget(self):
+        fake = FakeClock()
+        stubs = [StubTwarc()]
+        pool = TwarcPool(stubs, requests_per_window=2, window_s=10, clock=fake.clock, sleep=fake.sleep)
+        tweets = list(pool.hydrate(range(500)))
+        assert len(tweets) == 500
+        assert sum(fake.sleeps) == pytest.approx(15.0)
+
+    def test_hydrate_raises_worker_errors(self):
+        pool = TwarcPool([StubTwarc(fail_on=150) for i in range(2)])
+        with pytest.raises(RuntimeError):
+            list(pool.hydrate(range(10000)))
+
+    def test_hydrate_without_creds(self):
+        with pytest.raises(ValueError):
+            list(TwarcPool([]).hydrate(range(10)))
@@ -0,0 +1,82 @@
+from modules.TwintCollector import TwintCollector, TWEET_SCHEMA
+from modules.TwintPool import TwintPool, search_window
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import twint
+
+T0_MS = 1577836800000  # 2020-01-01 00:00:00 UTC
+
+
+def make_tweet(i, **kwargs):
+    fields = dict(
+        id=1000 + i, conversation_id=str(1000 + i), datetime=T0_MS + i * 1000, datestamp='2020-01-01',
+        timestamp='00:00:%02d' % (i % 60), timezone='+0000', place='', tweet='Tweet %s #covid' % i,
+        hashtags=['#covid'], cashtags=[], user_id=7, user_id_str='7', username='dave', name='Dave',
+        link='https://twitter.com/dave/status/%s' % (1000 + i), retweet=False, likes_count=i,
+        replies_count='2', retweets_count=0, quote_url='', near='', geo='', source='', user_rt_id='',
+        user_rt='', retweet_id='', reply_to=[{'screen_name': 'erin', 'name': 'Erin', 'id': '8'}],
+        retweet_date='', translate='', trans_src='', trans_dest='')
+    fields.update(kwargs)
+    return SimpleNamespace(**fields)
+
+
+def make_user(username):
+    return SimpleNamespace(
+        id=7, name=username.title(), username=username, bio='', url='', join_date='1 Jan 2020', join_time='1:00 PM',
+        tweets=10, location='', following=1, followers='2', likes=3, media_count=0, is_private=False,
+        is_verified=True, avatar='', background_image='')
+
+
+class TestTwintCollector:
+
+    def test_rows_pack_into_typed_batches(self):
+        collector = TwintCollector.tweets(SimpleNamespace(Search='covid'), batch_rows=4)
+        for i in range(10):
+            collector.append(make_tweet(i, place={'full_name': 'Paris'} if i == 3 else ''))
+        assert len(collector) == 10
+        assert len(collector.batches) == 2 and len(collector.rows) == 2
+
+        table = collector.to_arrow()
+        assert table.schema == TWEET_SCHEMA
+        df = table.to_pandas()
+        assert df['id'].tolist() == [str(1000 + i) for i in range(10)]
+        assert df['created_at'].dtype == 'int64'
+        assert df['nreplies'].tolist() == [2] * 10
+        assert df['search'][0] == 'covid'
+        assert df['place'][3] == '{"full_name": "Paris"}'
+        assert list(df['hashtags'][0]) == ['#covid']
+        assert df['reply_to'][0][0]['screen_name'] == 'erin'
+
+    def test_empty_collector_has_columns(self):
+        df = TwintCollector.tweets(SimpleNamespace(Search='covid')).to_df()
+        assert len(df) == 0
+        assert list(df.columns) == TWEET_SCHEMA.names
+
+    def test_concurrent_searches_stay_isolated(self, monkeypatch):
+        def search(config):
+            for i in range(int(config.Search)):
+                config.Store_object_tweets_list.append(make_tweet(i))
+        monkeypatch.setattr(twint.run, 'Search', search, raising=False)
+
+        def run(n):
+            config = twint.Config()
+            config.Search = str(n)
+            return search_window(config)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            dfs = list(pool.map(run, [3, 5, 7, 11]))
+        assert [len(df) for df in dfs] == [3, 5, 7, 11]
+        assert dfs[0]['search'].tolist() == ['3'] * 3
+
+    def test_user_info_per_call(self, monkeypatch):
+        def lookup(config):
+            assert not config.Pandas and config.Store_object_follow_list is None
+            config.Store_object_users_list.append(make_user(config.Username))
+        monkeypatch.setattr(twint.run, 'Lookup', lookup, raising=False)
+
+        tp = TwintPool()
+        dfs = [tp._get_user_info(username) for username in ['dave', 'erin']]
+        assert [df['username'].tolist() for df in dfs] == [['dave'], ['erin']]
+        assert dfs[0]['join_datetime'][0] == '1 Jan 2020 1:00 PM'
+        assert dfs[0]['followers'][0] == 2
+        assert not hasattr(tp.config, 'Store_object_users_list') or tp.config.Store_object_users_list is None
@@ -0,0 +1,223 @@
+from modules.AdaptiveStride import AdaptiveStride
+from modules.CheckpointStore import CheckpointStore
+from modules.TwintPool import TwintPool
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+import threading, time
+
+SINCE = datetime(2020, 1, 1)
+
+
+@pytest.fixture
+def new_york_time(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+class StubSearch:
+
+    def __init__(self, delay_s=0.05, hits=lambda t0: 2):
+        self.delay_s = delay_s
+        self.hits = hits
+        self.lock = threading.Lock()
+        self.configs = []
+        self.active = {}
+        self.max_active = {}
+
+    def __call__(self, config):
+        proxy = config.Proxy_host
+        with self.lock:
+            self.configs.append(config)
+            self.active[proxy] = self.active.get(proxy, 0) + 1
+            self.max_active[proxy] = max(self.max_active.get(proxy, 0), self.active[proxy])
+        time.sleep(self.delay_s)
+        with self.lock:
+            self.active[proxy] -= 1
+        t0 = datetime.strptime(config.Since, '%Y-%m-%d %H:%M:%S')
+        return pd.DataFrame({'id': range(self.hits(t0)), 'since': config.Since})
+
+
+def windows(n, **kwargs):
+    return TwintPool().twint_loop(SINCE, SINCE + timedelta(minutes=10 * n), stride_sec=600, **kwargs)
+
+
+class TestTwintPool:
+
+    def test_concurrent_windows_yield_in_time_order(self):
+        search = StubSearch(hits=lambda t0: 0 if t0.minute == 20 else 2)
+        done = []
+        tic = time.perf_counter()
+        out = list(windows(8, concurrency=4, search_fn=search, window_done=lambda t0, t1: done.append(t0)))
+        elapsed = time.perf_counter() - tic
+
+        starts = [SINCE + timedelta(minutes=10 * i) for i in range(8)]
+        assert [t0 for df, t0, t1 in out] == [t for t in starts if t.minute != 20]
+        assert [df['since'][0] for df, t0, t1 in out] == [str(t0) for df, t0, t1 in out]
+        assert done == [t for t in starts if t.minute == 20]
+        assert len(set(id(c) for c in search.configs)) == 8
+        assert elapsed < 8 * search.delay_s / 2
+
+    def test_per_proxy_limit_and_skips(self):
+        search = StubSearch()
+        proxies = [('a', 1, 'socks5'), ('b', 2, 'socks5')]
+        skipped = SINCE + timedelta(minutes=30)
+        out = list(windows(
+            9, concurrency=6, per_proxy=2, proxies=proxies, search_fn=search,
+            skip_window=lambda t0, t1: t0 == skipped))
+        assert len(out) == 8
+        assert skipped not in [t0 for df, t0, t1 in out]
+        assert search.max_active == {'a': 2, 'b': 2}
+
+    def test_closing_early_cancels_pending_searches(self, monkeypatch):
+        shutdown = ThreadPoolExecutor.shutdown
+
+        def shutdown_py38(self, wait=True):  # no cancel_futures before python 3.9
+            return shutdown(self, wait)
+        monkeypatch.setattr(ThreadPoolExecutor, 'shutdown', shutdown_py38)
+
+        search = StubSearch(delay_s=0.05)
+        loop = windows(20, concurrency=4, search_fn=search)
+        df, t0, t1 = next(loop)
+        assert t0 == SINCE
+        tic = time.perf_counter()
+        loop.close()
+        assert time.perf_counter() - tic < 4 * search.delay_s
+        started = len(search.configs)
+        time.sleep(2 * search.delay_s)
+        assert len(search.configs) == started <= 1 + 2 * 4
+
+    def test_limit_stops_early(self):
+        search = StubSearch(delay_s=0.01)
+        out = list(windows(20, concurrency=2, limit=5, search_fn=search))
+        assert len(out) == 3
+        assert len(search.configs) <= 5
+
+    def test_adaptive_stride_splits_busy_and_widens_quiet_windows(self):
+        limit = 100
+        busy = (SINCE + timedelta(hours=6), SINCE + timedelta(hours=7))
+
+        # 1 tweet / min, 10 / s in the busy hour; like twint, at most limit per search
+        def search_fn(config):
+            t0 = datetime.strptime(config.Since, '%Y-%m-%d %H:%M:%S')
+            t1 = datetime.strptime(config.Until, '%Y-%m-%d %H:%M:%S')
+            seconds = (t1 - t0).total_seconds()
+            overlap = (min(t1, busy[1]) - max(t0, busy[0])).total_seconds()
+            count = int(seconds / 60) + 10 * int(max(0, overlap))
+            return pd.DataFrame({'id': range(min(count, limit))})
+
+        stride = AdaptiveStride(limit, stride_sec=600, sparse=0.2)
+        empty = []
+        out = list(TwintPool().twint_loop(
+            SINCE, SINCE + timedelta(hours=12), limit=None, concurrency=2, search_fn=search_fn, stride=stride,
+            window_done=lambda t0, t1: empty.append((t0, t1))))
+
+        spans = sorted([(t0, t1) for df, t0, t1 in out] + empty)
+        assert spans[0][0] == SINCE and spans[-1][1] == SINCE + timedelta(hours=12)
+        assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+        assert all(len(df) < 0.9 * limit for df, t0, t1 in out)
+        assert stride.splits > 0
+        assert max((t1 - t0).total_seconds() for t0, t1 in spans) > 600
+        assert stride.tweets >= 10 * 3600
+        # outside the busy hour, fewer searches than fixed 10 minute windows
+        quiet = [(t0, t1) for t0, t1 in spans if t1 <= busy[0] or t0 >= busy[1]]
+        assert len(quiet) < 11 * 60 * 60 / 600 / 2
+
+    def test_adaptive_get_term_covers_range_past_limit(self):
+        # 1 tweet / 10s; Limit caps each search, not the whole range
+        def search_fn(config):
+            t0 = datetime.strptime(config.Since, '%Y-%m-%d %H:%M:%S')
+            t1 = datetime.strptime(config.Until, '%Y-%m-%d %H:%M:%S')
+            count = int((t1 - t0).total_seconds() / 10)
+            return pd.DataFrame({'id': range(min(count, config.Limit))})
+
+        tp = TwintPool()
+        tp.config.Limit = 100
+        stride = AdaptiveStride(tp.config.Limit, stride_sec=600)
+        out = list(tp._get_term(
+            Search='covid', Since=str(SINCE), Until=str(SINCE + timedelta(days=1)), search_fn=search_fn,
+            stride=stride))
+        assert out[-1][2] == SINCE + timedelta(days=1)
+        assert sum(len(df) for df, t0, t1 in out) == 24 * 60 * 6
+        assert all(len(df) < 90 for df, t0, t1 in out)
+
+    def test_window_tweets_splits_under_huge_limit(self):
+        stride = AdaptiveStride(10000000, stride_sec=600, window_tweets=100)
+        assert stride.limit == 100
+        assert stride.should_split(95, 600)
+        assert not AdaptiveStride(10000000, stride_sec=600).should_split(95, 600)
+        with pytest.raises(ValueError):
+            AdaptiveStride(None)
+
+    def test_adaptive_restart_resumes_from_completed_coverage(self, tmp_path):
+        limit = 100
+        busy = (SINCE + timedelta(hours=2), SINCE + timedelta(hours=3))
+        searched = []
+
+        def search_fn(config):
+            t0 = datetime.strptime(config.Since, '%Y-%m-%d %H:%M:%S')
+            t1 = datetime.strptime(config.Until, '%Y-%m-%d %H:%M:%S')
+            searched.append((t0, t1))
+            overlap = (min(t1, busy[1]) - max(t0, busy[0])).total_seconds()
+            count = int((t1 - t0).total_seconds() / 60) + int(max(0, overlap))
+            return pd.DataFrame({'id': range(min(count, limit))})
+
+        store = CheckpointStore(str(tmp_path / 'checkpoints.sqlite'))
+        until = SINCE + timedelta(hours=6)
+
+        def run(stop_after=None):
+            loop = TwintPool().twint_loop(
+                SINCE, until, search_fn=search_fn, stride=AdaptiveStride(limit, stride_sec=600),
+                covered=store.completed_ranges('job'),
+                window_done=lambda t0, t1: store.complete_window('job', t0, t1, 0))
+            for i, (df, t0, t1) in enumerate(loop):
+                if i == stop_after:
+                    loop.close()  # killed before this window was written
+                    return
+                store.complete_window('job', t0, t1, len(df))
+
+        run(stop_after=40)
+        first = list(searched)
+        assert any(t1 - t0 < timedelta(minutes=10) for t0, t1 in first)  # the busy hour was split
+        done = store.completed_ranges('job')
+        assert len(done) == 1 and done[0][0] == str(SINCE) and done[0][1] < str(until)
+
+        searched.clear()
+        run()
+        resumed_from = datetime.fromisoformat(done[0][1])
+        assert min(t0 for t0, t1 in searched) == resumed_from
+        assert store.completed_ranges('job') == [(str(SINCE), str(until))]
+
+        searched.clear()
+        run()
+        assert searched == []
+
+    def test_adaptive_stride_starts_from_density(self):
+        assert AdaptiveStride(1000, density=0.6).stride_sec == 1000
+        assert AdaptiveStride(1000, stride_sec=30).stride_sec == 30
+
+    def test_density_sizes_first_stride_against_window_budget(self):
+        # as jobs/search_historic.py runs it: a huge twint Limit, windows split at window_tweets
+        assert AdaptiveStride(10000000, window_tweets=10000, density=0.5).stride_sec == 12000
+        assert AdaptiveStride(None, window_tweets=500, density=2.0).stride_sec == 150
+        assert AdaptiveStride(None, window_tweets=500).stride_sec == 600
+
+    def test_neo4j_created_at_is_local_time(self, new_york_time):
+        # around the 2020 US spring DST switch, and a tweet with no created_at
+        ms = [1583650799000, 1583650800000, 1583679600123, None]
+        ids = ['1236778391046393856', '1236778395244892160', '1236899115140608000', '1300000000000000000']
+        df = pd.DataFrame({
+            'id': ids, 'conversation_id': ids, 'created_at': ms, 'tweet': ['a', 'b', 'c', 'd'],
+            'hashtags': [[], [], [], []], 'nlikes': [0] * 4, 'nretweets': [0] * 4, 'user_id': [7] * 4,
+            'username': ['dave'] * 4, 'name': ['Dave'] * 4, 'quote_url': [''] * 4, 'retweet': [False] * 4})
+        created_at = TwintPool().twint_df_to_neo4j_df(df)['created_at']
+        snowflake_ms = ((1300000000000000000 >> 22) + 1288834974657)
+        assert created_at.tolist() == [
+            pd.Timestamp(datetime.fromtimestamp(t / 1000)) for t in ms[:3] + [snowflake_ms]]
+        assert created_at.dt.tz is None
+        assert str(created_at[0]) == '2020-03-08 01:59:59'
+        assert str(created_at[1]) == '2020-03-08 03:00:00'